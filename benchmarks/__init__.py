@@ -0,0 +1 @@
+"""Benchmarks of the image sorting tool, run with `python -m benchmarks.run`."""
@@ -0,0 +1,174 @@
+"""Generate synthetic photo libraries of a configurable size and shape for benchmarking.
+
+Files are built from small templates encoded once, with the datetime patched into the EXIF data or the
+filename, and a unique trailer appended so every file has different contents unless it is meant to be an
+identical copy. Generating a library of a million files therefore costs little more than writing them.
+"""
+
+import io
+import os
+import random
+import struct
+from datetime import datetime, timedelta
+
+from PIL import Image
+
+EXIF_PLACEHOLDER = b"2000:01:01 00:00:00"
+EXIF_IFD_POINTER = 0x8769
+DATETIME_ORIGINAL = 0x9003
+FIRST_DATETIME = datetime(2005, 1, 1)  # noqa: DTZ001
+DATETIME_SPAN_SECONDS = 15 * 365 * 24 * 3600
+MAX_BURST_LENGTH = 10
+RECENT_FILES = 1000  # Earlier files kept to copy or reuse the datetime of, bounding memory on huge libraries
+# Share of each kind of file in a library
+DEFAULT_MIX = {
+    "jpeg_exif": 0.6,  # Camera photos named 'IMG_00001.JPG', dated by EXIF
+    "jpeg_named": 0.1,  # Messaging app photos without EXIF, dated by name such as 'IMG-20200101-WA0001.jpg'
+    "jpeg_undated": 0.05,  # Downloaded images without EXIF or a date in the name, which fail to sort
+    "png": 0.1,  # Screenshots such as 'Screenshot_2020-01-01-12-30-45.png'
+    "gif": 0.03,
+    "mp4": 0.07,  # Videos such as 'VID_20200101_123045.mp4'
+    "other": 0.05,  # Documents that are not sorted
+}
+
+
+def _encode(image_format: str, with_exif: bool = False) -> bytes:
+    """Encode a tiny image to use as the template of generated files."""
+    image = Image.new("RGB", (16, 16), (120, 80, 40))
+    buffer = io.BytesIO()
+    if with_exif:
+        exif = Image.Exif()
+        exif.get_ifd(EXIF_IFD_POINTER)[DATETIME_ORIGINAL] = EXIF_PLACEHOLDER.decode()
+        image.save(buffer, image_format, exif=exif)
+    else:
+        image.save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def _templates() -> dict[str, bytes]:
+    """Return the contents each kind of file is generated from."""
+    jpeg = _encode("JPEG")
+    return {
+        "jpeg_exif": _encode("JPEG", with_exif=True),
+        "jpeg_named": jpeg,
+        "jpeg_undated": jpeg,
+        "png": _encode("PNG"),
+        "gif": _encode("GIF"),
+        "mp4": b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom" + b"\x00" * 1000,
+        "other": b"Meeting notes\n" * 50,
+    }
+
+
+def _filename(kind: str, number: int, dtime: datetime, burst_index: int) -> str:
+    """Return the name of a generated file, which carries its datetime for the kinds dated by name."""
+    burst = f"_BURST{burst_index:03}" if burst_index else ""
+    names = {
+        "jpeg_exif": f"IMG_{number:05}.JPG",
+        "jpeg_named": f"IMG-{dtime:%Y%m%d}-WA{number:04}{burst}.jpg",
+        "jpeg_undated": f"download_{number}.jpg",
+        "png": f"Screenshot_{dtime:%Y-%m-%d-%H-%M-%S}{burst}.png",
+        "gif": f"animation_{number}.gif",
+        "mp4": f"VID_{dtime:%Y%m%d_%H%M%S}{burst}.mp4",
+        "other": f"notes_{number}.txt",
+    }
+    return names[kind]
+
+
+def _write_file(path: str, number: int, contents: bytes) -> None:
+    """Write a generated file, appending its number to the name if another file already has it."""
+    if os.path.exists(path):  # Such as two screenshots of the same second in one folder
+        stem, extension = os.path.splitext(path)
+        path = f"{stem}_{number}{extension}"
+    with open(path, "wb") as file:
+        file.write(contents)
+
+
+def _folders(root: str, depth: int, width: int) -> list[str]:
+    """Return the root and every folder of a tree `depth` levels deep with `width` subfolders each."""
+    folders = [root]
+    level = [root]
+    for depth_index in range(depth):
+        level = [os.path.join(parent, f"folder_{depth_index}_{child}") for parent in level for child in range(width)]
+        folders += level
+    return folders
+
+
+def generate_library(  # noqa: PLR0913
+    root: str,
+    *,
+    files: int = 1000,
+    depth: int = 2,
+    width: int = 4,
+    burst_ratio: float = 0.05,
+    duplicate_ratio: float = 0.1,
+    identical_ratio: float = 0.02,
+    mix: dict[str, float] | None = None,
+    seed: int = 0,
+) -> dict:
+    """Write a synthetic photo library.
+
+    Arguments:
+        root: folder to create the library in
+        files: number of files to create
+        depth: levels of subfolders below the root
+        width: subfolders in each folder
+        burst_ratio: share of files starting a burst of shots taken in the same second
+        duplicate_ratio: share of files reusing the datetime of an earlier file, with different contents
+        identical_ratio: share of files that are identical copies of an earlier file under another name
+        mix: share of each kind of file, see `DEFAULT_MIX`
+        seed: seed of the random generator, the same arguments always produce the same library
+    Returns: the arguments used and the number of files and bytes of each kind, to store with results
+    """
+    mix = DEFAULT_MIX if mix is None else mix
+    rng = random.Random(seed)  # noqa: S311 - Reproducible test data, not security related
+    templates = _templates()
+    folders = _folders(root, depth, width)
+    for folder in folders:
+        os.makedirs(folder, exist_ok=True)
+    kinds, weights = list(mix), list(mix.values())
+    counts = dict.fromkeys(kinds, 0)
+    total_bytes = 0
+    written = []  # (kind, datetime, contents) of a sample of earlier files
+    burst = []  # Remaining (kind, datetime, burst index) of the current burst
+
+    for number in range(files):
+        if burst:
+            kind, dtime, burst_index = burst.pop()
+        else:
+            kind = rng.choices(kinds, weights)[0]
+            burst_index = 0
+            if written and rng.random() < duplicate_ratio:
+                dtime = rng.choice(written)[1]
+            else:
+                dtime = FIRST_DATETIME + timedelta(seconds=rng.randrange(DATETIME_SPAN_SECONDS))
+            if rng.random() < burst_ratio:
+                length = rng.randint(2, MAX_BURST_LENGTH)
+                burst = [(kind, dtime, index) for index in range(length, 1, -1)]
+                burst_index = 1
+        if written and rng.random() < identical_ratio:
+            kind, dtime, contents = rng.choice(written)
+        else:
+            contents = templates[kind]
+            if kind == "jpeg_exif":
+                contents = contents.replace(EXIF_PLACEHOLDER, f"{dtime:%Y:%m:%d %H:%M:%S}".encode())
+            contents += struct.pack(">Q", number)  # Readers ignore data after the end of the image
+        _write_file(os.path.join(rng.choice(folders), _filename(kind, number, dtime, burst_index)), number, contents)
+        if len(written) < RECENT_FILES:
+            written.append((kind, dtime, contents))
+        else:
+            written[rng.randrange(RECENT_FILES)] = (kind, dtime, contents)
+        counts[kind] += 1
+        total_bytes += len(contents)
+
+    return {
+        "files": files,
+        "depth": depth,
+        "width": width,
+        "burst_ratio": burst_ratio,
+        "duplicate_ratio": duplicate_ratio,
+        "identical_ratio": identical_ratio,
+        "mix": mix,
+        "seed": seed,
+        "counts": counts,
+        "bytes": total_bytes,
+    }
@@ -0,0 +1,194 @@
+"""Time each phase of a sort of a synthetic photo library, and compare the results between versions.
+
+Example, storing the results of this version and then checking a later version against them:
+    python -m benchmarks.run --files 20000 --output baseline.json
+    python -m benchmarks.run --files 20000 --compare baseline.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
+
+from benchmarks.library import generate_library
+from image_sorting_tool import __version__
+from image_sorting_tool.image_sort import FILE_TYPES, ImageSort
+
+# Phases of a sort in the order they run, each is the name of an ImageSort method
+PHASES = ("_find_files", "_extract_datetimes", "_categorize_files", "_process_duplicates", "run_parallel_sorting")
+DEFAULT_THRESHOLD = 0.1  # Fractional slowdown of a phase reported as a regression
+
+logger = logging.getLogger("image-sorting-tool")
+
+
+def time_phases(source_dir: str, destination_dir: str, threads: int | None = None) -> dict[str, float]:
+    """Sort a folder once, timing each phase separately.
+
+    Arguments:
+        source_dir: folder to sort
+        destination_dir: empty folder to sort into
+        threads: datetime extraction processes, the ImageSort default if None
+    Returns: seconds taken by each phase
+    """
+    sorter = ImageSort(source_dir, destination_dir)
+    sorter.ext_to_sort = [extension for extensions in FILE_TYPES.values() for extension in extensions]
+    sorter.rename_duplicates = True
+    if threads is not None:
+        sorter.threads_to_use = threads
+    timings = {}
+    for phase in PHASES:
+        method: Callable[[], None] = getattr(sorter, phase)
+        start = time.perf_counter()
+        method()
+        timings[phase] = time.perf_counter() - start
+    return timings
+
+
+def run_benchmark(source_dir: str, work_dir: str, repeat: int = 3, threads: int | None = None) -> dict:
+    """Sort a folder several times into fresh destination folders, and summarise the time of each phase.
+
+    Arguments:
+        source_dir: folder to sort
+        work_dir: folder to create the destination folders in, each is deleted after its run
+        repeat: number of runs
+        threads: datetime extraction processes, the ImageSort default if None
+    Returns: the runs and the minimum and median seconds of each phase
+    """
+    runs = []
+    for run_index in range(repeat):
+        destination_dir = os.path.join(work_dir, f"sorted_{run_index}")
+        try:
+            runs.append(time_phases(source_dir, destination_dir, threads))
+        finally:
+            shutil.rmtree(destination_dir, ignore_errors=True)
+    phases = {
+        phase: {
+            "min": min(run[phase] for run in runs),
+            "median": statistics.median(run[phase] for run in runs),
+        }
+        for phase in PHASES
+    }
+    return {"runs": runs, "phases": phases}
+
+
+def compare_results(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list[str]:
+    """Compare the minimum time of each phase against a baseline.
+
+    The minimum of the runs is compared, as it is the least affected by other load on the machine.
+
+    Arguments:
+        results: results of `run_benchmark`
+        baseline: results of an earlier `run_benchmark`
+        threshold: fraction a phase may be slower than the baseline before it is a regression
+    Returns: a message for each phase slower than the baseline by more than the threshold
+    """
+    regressions = []
+    for phase, summary in results["phases"].items():
+        if phase not in baseline["phases"]:
+            continue
+        before, after = baseline["phases"][phase]["min"], summary["min"]
+        if before > 0 and after > before * (1 + threshold):
+            regressions.append(f"{phase} took {after:.3f}s, {after / before - 1:.0%} slower than {before:.3f}s")
+    return regressions
+
+
+def format_results(results: dict) -> str:
+    """Return a table of the minimum and median seconds and files per second of each phase."""
+    files = results["library"]["files"]
+    lines = [f"{'phase':<22}{'min (s)':>10}{'median (s)':>12}{'files/s':>12}"]
+    for phase, summary in results["phases"].items():
+        rate = files / summary["min"] if summary["min"] > 0 else float("inf")
+        lines.append(f"{phase:<22}{summary['min']:>10.3f}{summary['median']:>12.3f}{rate:>12.0f}")
+    return "\n".join(lines) + "\n"
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=5000, help="Files in the generated library")
+    parser.add_argument("--depth", type=int, default=2, help="Levels of subfolders in the generated library")
+    parser.add_argument("--width", type=int, default=4, help="Subfolders in each folder of the generated library")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1, help="Share of files reusing a datetime")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated library")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed sorts")
+    parser.add_argument("--threads", type=int, help="Datetime extraction processes, the tool's default if unset")
+    parser.add_argument(
+        "--library",
+        metavar="DIR",
+        help="Folder of the generated library, kept between benchmarks and only generated if it does not exist",
+    )
+    parser.add_argument("--output", metavar="FILE", help="Write the results as JSON to FILE")
+    parser.add_argument("--compare", metavar="FILE", help="Exit with an error if slower than the JSON results in FILE")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Fraction a phase may be slower than the compared results (default: %(default)s)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Generate a library if needed, benchmark sorting it, and store or compare the results.
+
+    Returns: the exit status, 1 if a phase regressed compared to `--compare`
+    """
+    args = parse_args(argv)
+    logger.setLevel(logging.ERROR)  # The generated library has many files that fail to sort
+    with tempfile.TemporaryDirectory(prefix="image-sorting-benchmark-") as work_dir:
+        library_dir = args.library or os.path.join(work_dir, "library")
+        spec_path = os.path.normpath(library_dir) + ".json"  # Beside the library, so it is not sorted with it
+        if os.path.exists(spec_path):
+            with open(spec_path, encoding="utf-8") as spec_file:
+                library = json.load(spec_file)
+        else:
+            sys.stdout.write(f"Generating a library of {args.files} files in {library_dir}\n")
+            library = generate_library(
+                library_dir,
+                files=args.files,
+                depth=args.depth,
+                width=args.width,
+                duplicate_ratio=args.duplicate_ratio,
+                seed=args.seed,
+            )
+            with open(spec_path, "w", encoding="utf-8") as spec_file:
+                json.dump(library, spec_file, indent=2)
+
+        results = {
+            "version": __version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "library": library,
+            **run_benchmark(library_dir, work_dir, args.repeat, args.threads),
+        }
+
+    sys.stdout.write(format_results(results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["library"] != results["library"]:
+            sys.stdout.write("Warning: the compared results are of a different library\n")
+        regressions = compare_results(results, baseline, args.threshold)
+        for regression in regressions:
+            sys.stdout.write(f"Regression: {regression}\n")
+        if regressions:
+            return 1
+        sys.stdout.write(f"No phase is more than {args.threshold:.0%} slower than {baseline['version']}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,28 @@
 """Image sorting tool module.
 
-This script launches a tkinter GUI that allows images to be sorted
-based on their date taken.
+Without a command this script launches a tkinter GUI that allows images to be sorted
+based on their date taken. The 'sort' command runs the same sorting headless from the
+command line, without importing tkinter. The 'plan' command writes the transfers a sort
+would make to a file instead, which the 'apply' command carries out later, whole or in shards.
+The 'analyse-shard' and 'merge' commands split the analysis itself across processes or machines.
+The 'watch' command keeps running, sorting the files that arrive in the input folder as they arrive.
+The 'sort' command can also run its phases at once as a pipeline with '--pipeline'.
 """
 
 import argparse
 import logging
+import os
 
-from image_sorting_tool.gui import GUI
+from image_sorting_tool.cache import MetadataCache, open_default_cache
+from image_sorting_tool.filename_dates import register_pattern
+from image_sorting_tool.image_sort import FILE_TYPES, analyse_directory, sort_directory
+from image_sorting_tool.instrumentation import RunInstrumentation
+from image_sorting_tool.pipeline import pipeline_sort_directory
+from image_sorting_tool.plan import apply_plan, write_plan
+from image_sorting_tool.reporting import Reporter, StreamReporter
+from image_sorting_tool.sharding import analyse_shard, merge_partial_indexes
+from image_sorting_tool.transfer import FSYNC_POLICIES, TRANSFER_MODES
+from image_sorting_tool.watch import POLL_INTERVAL, SETTLE_SECONDS, watch_directory
 
 # Create root logger
 LOG_FORMAT = "%(levelname)s %(asctime)s : %(message)s"
@@ -21,20 +36,319 @@ logger.addHandler(stream_handler)
 
 
 def run() -> None:
-    """Entry point of program."""
+    """Entry point of the 'image-sorting-tool' console script, running a command or launching the GUI."""
     # Set log level from command line arguments
     args = parse_args()
     stream_handler.setLevel(logging.WARNING - (args.verbosity * 10))
 
+    if args.command in COMMANDS:
+        COMMANDS[args.command](args)
+        return
+    launch_gui()
+
+
+def run_gui() -> None:
+    """Entry point of the 'image-sorting-tool-gui' script, launching the GUI without a console window on Windows.
+
+    Windows runs GUI scripts with pythonw, which has no stdout or stderr, so the commands are left to `run`.
+    """
+    launch_gui()
+
+
+def launch_gui() -> None:
+    """Launch the GUI and run it until its window is closed."""
+    # Only import the GUI when it is needed, so headless runs never load tkinter
+    from image_sorting_tool.gui import GUI  # noqa: PLC0415
+
     logger.info("Launching Image Sorting Tool")
     root = GUI()
     root.draw_main()
     root.mainloop()
 
 
-def parse_args() -> argparse.Namespace:
-    """Parse arguments from the command line."""
-    parser = argparse.ArgumentParser(description="Image sorting tool - Launches a GUI")
+def check_folders(source: str, destination: str) -> tuple[str, str]:
+    """Check the input and output folders given on the command line exist and do not overlap.
+
+    Returns: tuple of the absolute paths of the input and output folders
+    """
+    source_dir, destination_dir = os.path.abspath(source), os.path.abspath(destination)
+    if not os.path.isdir(source_dir):
+        err_msg = f"Input directory does not exist: '{source_dir}'"
+        raise SystemExit(err_msg)
+    if not os.path.isdir(destination_dir):
+        err_msg = f"Output directory does not exist: '{destination_dir}'"
+        raise SystemExit(err_msg)
+    if os.path.commonpath([source_dir, destination_dir]) == source_dir:
+        err_msg = "Output directory cannot be a child of (or same as) input directory"
+        raise SystemExit(err_msg)
+    return source_dir, destination_dir
+
+
+def analysis_options(args: argparse.Namespace) -> tuple[list[str], MetadataCache | None]:
+    """Register the filename patterns given on the command line and open the metadata cache.
+
+    Returns: tuple of the extensions to sort, and the metadata cache or None if it is disabled
+    """
+    register_patterns_from_args(args)
+    return ext_to_sort_from_args(args), metadata_cache_from_args(args)
+
+
+def register_patterns_from_args(args: argparse.Namespace) -> None:
+    """Register the filename patterns given on the command line."""
+    for pattern in args.filename_patterns or []:
+        try:
+            register_pattern(pattern)
+        except ValueError as error:
+            raise SystemExit(str(error)) from error
+
+
+def ext_to_sort_from_args(args: argparse.Namespace) -> list[str]:
+    """Return the extensions of the file types given on the command line, JPEG files if none were given."""
+    ext_to_sort = []
+    for file_type in args.types or ["jpeg"]:
+        ext_to_sort.extend(FILE_TYPES[file_type])
+    return ext_to_sort
+
+
+def metadata_cache_from_args(args: argparse.Namespace) -> MetadataCache | None:
+    """Open the metadata cache given on the command line, None if it is disabled."""
+    if args.no_cache:
+        return None
+    if args.cache_file:
+        return MetadataCache(args.cache_file)
+    return open_default_cache()
+
+
+def check_copy_workers(args: argparse.Namespace) -> None:
+    """Check the number of copy workers given on the command line."""
+    if args.copy_workers is not None and args.copy_workers < 1:
+        err_msg = f"Copy workers must be at least 1, not {args.copy_workers}"
+        raise SystemExit(err_msg)
+
+
+def run_sort(args: argparse.Namespace) -> None:
+    """Run a headless sort from the parsed command line arguments."""
+    source_dir, destination_dir = check_folders(args.source, args.destination)
+    check_copy_workers(args)
+    if args.pipeline and args.autotune:
+        err_msg = "--autotune cannot be used with --pipeline, as each stage of the pipeline has a fixed limit"
+        raise SystemExit(err_msg)
+    instrumentation = instrumentation_from_args(args)
+    ext_to_sort, metadata_cache = analysis_options(args)
+    sort_options = {
+        "ext_to_sort": ext_to_sort,
+        "rename_duplicates": args.rename_duplicates,
+        "copy_unsorted": args.copy_other_files,
+        "skip_identical": args.skip_identical,
+        "metadata_cache": metadata_cache,
+        "transfer_mode": args.mode,
+        "fsync_policy": args.fsync,
+        "preserve_times": args.preserve_times,
+        "resume": args.resume,
+        "copy_workers": args.copy_workers,
+        "instrumentation": instrumentation,
+        "reporter": Reporter() if args.quiet else StreamReporter(),
+    }
+
+    logger.info("Sorting %s into %s", source_dir, destination_dir)
+    try:
+        if args.pipeline:
+            pipeline_sort_directory(source_dir, destination_dir, **sort_options)
+        else:
+            sort_directory(source_dir, destination_dir, autotune=args.autotune, **sort_options)
+    finally:
+        if metadata_cache is not None:
+            metadata_cache.close()
+
+
+def run_plan(args: argparse.Namespace) -> None:
+    """Analyse a directory and write its sort plan from the parsed command line arguments."""
+    source_dir, destination_dir = check_folders(args.source, args.destination)
+    instrumentation = instrumentation_from_args(args)
+    ext_to_sort, metadata_cache = analysis_options(args)
+
+    logger.info("Planning the sort of %s into %s", source_dir, destination_dir)
+    reporter = Reporter() if args.quiet else StreamReporter()
+    try:
+        sorter = analyse_directory(
+            source_dir,
+            destination_dir,
+            ext_to_sort=ext_to_sort,
+            rename_duplicates=args.rename_duplicates,
+            copy_unsorted=args.copy_other_files,
+            skip_identical=args.skip_identical,
+            metadata_cache=metadata_cache,
+            autotune=args.autotune,
+            instrumentation=instrumentation,
+            reporter=reporter,
+        )
+    finally:
+        if metadata_cache is not None:
+            metadata_cache.close()
+    files = write_plan(args.plan, sorter)
+    reporter.write(f"Wrote a plan of {files} files to {args.plan}\n")
+
+
+def run_apply(args: argparse.Namespace) -> None:
+    """Transfer the files of a sort plan from the parsed command line arguments."""
+    if not os.path.isfile(args.plan):
+        err_msg = f"Plan file does not exist: '{args.plan}'"
+        raise SystemExit(err_msg)
+    check_copy_workers(args)
+    instrumentation = instrumentation_from_args(args)
+    shard, shard_count = args.shard or (None, 1)
+
+    try:
+        apply_plan(
+            args.plan,
+            shard=shard,
+            shard_count=shard_count,
+            transfer_mode=args.mode,
+            fsync_policy=args.fsync,
+            preserve_times=args.preserve_times,
+            resume=args.resume,
+            copy_workers=args.copy_workers,
+            autotune=args.autotune,
+            instrumentation=instrumentation,
+            reporter=Reporter() if args.quiet else StreamReporter(),
+        )
+    except ValueError as error:
+        raise SystemExit(str(error)) from error
+
+
+def run_analyse_shard(args: argparse.Namespace) -> None:
+    """Analyse one shard of a directory into a partial index from the parsed command line arguments."""
+    source_dir, destination_dir = check_folders(args.source, args.destination)
+    instrumentation = instrumentation_from_args(args)
+    register_patterns_from_args(args)
+    metadata_cache = metadata_cache_from_args(args)
+    shard, shard_count = args.shard
+
+    logger.info("Analysing shard %i/%i of %s", shard + 1, shard_count, source_dir)
+    try:
+        analyse_shard(
+            source_dir,
+            destination_dir,
+            args.index,
+            shard=shard,
+            shard_count=shard_count,
+            metadata_cache=metadata_cache,
+            autotune=args.autotune,
+            instrumentation=instrumentation,
+            reporter=Reporter() if args.quiet else StreamReporter(),
+        )
+    finally:
+        if metadata_cache is not None:
+            metadata_cache.close()
+
+
+def run_merge(args: argparse.Namespace) -> None:
+    """Merge the partial indexes of every shard into a sort plan from the parsed command line arguments."""
+    for path in args.indexes:
+        if not os.path.isfile(path):
+            err_msg = f"Partial index file does not exist: '{path}'"
+            raise SystemExit(err_msg)
+    instrumentation = instrumentation_from_args(args)
+    metadata_cache = metadata_cache_from_args(args)
+    reporter = Reporter() if args.quiet else StreamReporter()
+    try:
+        sorter = merge_partial_indexes(
+            args.indexes,
+            ext_to_sort=ext_to_sort_from_args(args),
+            rename_duplicates=args.rename_duplicates,
+            copy_unsorted=args.copy_other_files,
+            skip_identical=args.skip_identical,
+            metadata_cache=metadata_cache,
+            autotune=args.autotune,
+            instrumentation=instrumentation,
+            reporter=reporter,
+        )
+    except ValueError as error:
+        raise SystemExit(str(error)) from error
+    finally:
+        if metadata_cache is not None:
+            metadata_cache.close()
+    files = write_plan(args.plan, sorter)
+    reporter.write(f"Wrote a plan of {files} files to {args.plan}\n")
+
+
+def run_watch(args: argparse.Namespace) -> None:
+    """Sort the files arriving in a directory until interrupted, from the parsed command line arguments."""
+    source_dir, destination_dir = check_folders(args.source, args.destination)
+    check_copy_workers(args)
+    if args.settle < 0 or args.poll_interval <= 0:
+        err_msg = "--settle must not be negative and --poll-interval must be positive"
+        raise SystemExit(err_msg)
+    register_patterns_from_args(args)
+
+    logger.info("Watching %s to sort into %s", source_dir, destination_dir)
+    watcher = watch_directory(
+        source_dir,
+        destination_dir,
+        ext_to_sort=ext_to_sort_from_args(args),
+        rename_duplicates=args.rename_duplicates,
+        copy_unsorted=args.copy_other_files,
+        skip_identical=args.skip_identical,
+        transfer_mode=args.mode,
+        fsync_policy=args.fsync,
+        preserve_times=args.preserve_times,
+        copy_workers=args.copy_workers,
+        settle_seconds=args.settle,
+        poll_interval=args.poll_interval,
+        polling=args.polling,
+        reporter=Reporter() if args.quiet else StreamReporter(),
+    )
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.sorter.reporter.write(f"Stopped watching, sorted {watcher.sorted_count} files.\n")
+
+
+COMMANDS = {
+    "sort": run_sort,
+    "plan": run_plan,
+    "apply": run_apply,
+    "analyse-shard": run_analyse_shard,
+    "merge": run_merge,
+    "watch": run_watch,
+}
+
+
+def instrumentation_from_args(args: argparse.Namespace) -> RunInstrumentation | None:
+    """Return the instrumentation requested by the command line arguments, None if no report was requested."""
+    if args.report is None:
+        if args.profile or args.trace_memory:
+            err_msg = "--profile and --trace-memory are written to the run report, so they require --report"
+            raise SystemExit(err_msg)
+        return None
+    return RunInstrumentation(args.report, profile=args.profile, trace_memory=args.trace_memory)
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse a shard given as 'I/N' on the command line.
+
+    Returns: tuple of the 0-based shard index and the number of shards
+    """
+    try:
+        shard, shard_count = (int(part) for part in value.split("/"))
+    except ValueError as error:
+        err_msg = f"Shard must be given as I/N, such as 1/4, not '{value}'"
+        raise argparse.ArgumentTypeError(err_msg) from error
+    if not 1 <= shard <= shard_count:
+        err_msg = f"Shard must be between 1 and the number of shards, not '{value}'"
+        raise argparse.ArgumentTypeError(err_msg)
+    return shard - 1, shard_count
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Parse arguments from the command line.
+
+    Arguments:
+        argv: arguments to parse instead of `sys.argv`
+    """
+    parser = argparse.ArgumentParser(
+        description="Image sorting tool - Launches a GUI, or sorts headless with the 'sort' command"
+    )
 
     parser.add_argument(
         "-v",
@@ -43,7 +357,201 @@ def parse_args() -> argparse.Namespace:
         default=0,
         help="Increase verbosity of log messages. -v will give info level, -vv will give debug level",
     )
-    return parser.parse_args()
+    subparsers = parser.add_subparsers(dest="command")
+
+    folders_parser = argparse.ArgumentParser(add_help=False)
+    folders_parser.add_argument("source", help="Input folder to search for files to sort")
+    folders_parser.add_argument("destination", help="Output folder to copy the sorted files into")
+
+    categorize_parser = argparse.ArgumentParser(add_help=False)
+    categorize_parser.add_argument(
+        "-t",
+        "--type",
+        dest="types",
+        action="append",
+        choices=list(FILE_TYPES),
+        help="File type to sort, can be given multiple times. Defaults to jpeg only",
+    )
+    categorize_parser.add_argument(
+        "--rename-duplicates",
+        action="store_true",
+        help="Rename files with duplicate 'date taken' times to '<date_taken>_001.jpg', '<date_taken>_002.jpg'...",
+    )
+    categorize_parser.add_argument(
+        "--copy-other-files",
+        action="store_true",
+        help="Copy all other files (documents, binaries, etc) to an 'other_files' folder in the output folder",
+    )
+    categorize_parser.add_argument(
+        "--skip-identical",
+        action="store_true",
+        help="Compare file contents and only sort one copy of identical files. Files with duplicate "
+        "'date taken' times that are not identical are then always renamed",
+    )
+    extraction_parser = argparse.ArgumentParser(add_help=False)
+    extraction_parser.add_argument(
+        "--filename-pattern",
+        dest="filename_patterns",
+        action="append",
+        metavar="REGEX",
+        help="Extra filename scheme to extract datetimes from, using the named groups "
+        "'year', 'month', 'day' and optionally 'hour', 'minute', 'second'. Can be given multiple times",
+    )
+    cache_parser = argparse.ArgumentParser(add_help=False)
+    cache_parser.add_argument(
+        "--cache-file",
+        help="Location of the metadata cache that stores the datetimes of previously analysed files",
+    )
+    cache_parser.add_argument("--no-cache", action="store_true", help="Analyse every file without using the cache")
+
+    transfer_parser = argparse.ArgumentParser(add_help=False)
+    transfer_parser.add_argument(
+        "--mode",
+        choices=TRANSFER_MODES,
+        default="copy",
+        help="How files are transferred into the output folder. hardlink, reflink, move and symlink avoid "
+        "copying the data when both folders are on the same drive, and fall back to copy when unsupported. "
+        "move removes the files from the input folder. Defaults to copy",
+    )
+    transfer_parser.add_argument(
+        "--fsync",
+        choices=FSYNC_POLICIES,
+        default="none",
+        help="When copies are synced to the disk: after each file, in batches per folder, or once at the end. "
+        "Defaults to none, leaving it to the operating system",
+    )
+    transfer_parser.add_argument(
+        "--preserve-times",
+        action="store_true",
+        help="Copies keep the access and modification times of the original files",
+    )
+    transfer_parser.add_argument(
+        "--copy-workers",
+        type=int,
+        metavar="N",
+        help="Number of files to copy in parallel. Defaults to a number suited to the input and output drives, "
+        "such as 1 within a single hard disk and 16 on NVMe drives",
+    )
+    resume_parser = argparse.ArgumentParser(add_help=False)
+    resume_parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted sort into the same output folder, skipping the files it already transferred",
+    )
+
+    run_parser = argparse.ArgumentParser(add_help=False)
+    run_parser.add_argument(
+        "--autotune",
+        action="store_true",
+        help="Tune the number of files analysed, hashed and copied in parallel from the throughput measured on "
+        "the first files, and again whenever it drops. --copy-workers still fixes the copies",
+    )
+    run_parser.add_argument(
+        "--report",
+        metavar="FILE",
+        help="Write a JSON report of the run to FILE, with the time taken by each phase, the latency of analysing "
+        "and copying files, the slowest files and the bytes transferred",
+    )
+    run_parser.add_argument("--profile", action="store_true", help="Add a cProfile profile of the run to the report")
+    run_parser.add_argument(
+        "--trace-memory", action="store_true", help="Add the peak memory use and its top sources to the report"
+    )
+    run_parser.add_argument("-q", "--quiet", action="store_true", help="Do not print progress messages")
+
+    sort_parser = subparsers.add_parser(
+        "sort",
+        parents=[
+            folders_parser,
+            categorize_parser,
+            extraction_parser,
+            cache_parser,
+            transfer_parser,
+            resume_parser,
+            run_parser,
+        ],
+        help="Sort a directory without launching the GUI",
+    )
+    sort_parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Search, analyse and transfer files at once as a pipeline, instead of one phase after another. "
+        "Transfers start before the search ends, unless duplicates are renamed or identical files skipped",
+    )
+    plan_parser = subparsers.add_parser(
+        "plan",
+        parents=[folders_parser, categorize_parser, extraction_parser, cache_parser, run_parser],
+        help="Analyse a directory and write the transfers a sort would make to a plan file, without transferring",
+    )
+    plan_parser.add_argument(
+        "plan", help="Plan file to write, as JSON lines with one file per line. Compressed if it ends in '.gz'"
+    )
+    apply_parser = subparsers.add_parser(
+        "apply",
+        parents=[transfer_parser, resume_parser, run_parser],
+        help="Transfer the files of a plan written by the 'plan' command",
+    )
+    apply_parser.add_argument("plan", help="Plan file to apply")
+    apply_parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        metavar="I/N",
+        help="Only transfer shard I of the plan split into N shards, such as 2/4. Every shard can be applied at "
+        "once by a separate process or machine sharing the output folder",
+    )
+    shard_parser = subparsers.add_parser(
+        "analyse-shard",
+        parents=[folders_parser, extraction_parser, cache_parser, run_parser],
+        help="Analyse the files of one shard of a directory into a partial index, for the 'merge' command",
+    )
+    shard_parser.add_argument(
+        "index",
+        help="Partial index file to write, as JSON lines with one file per line. Compressed if it ends in '.gz'",
+    )
+    shard_parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        metavar="I/N",
+        required=True,
+        help="Analyse shard I of the input folder split into N shards by folder, such as 2/4. Every shard can be "
+        "analysed at once by a separate process or machine",
+    )
+    merge_parser = subparsers.add_parser(
+        "merge",
+        parents=[categorize_parser, cache_parser, run_parser],
+        help="Merge the partial indexes of every shard into a plan, numbering duplicates across all shards",
+    )
+    merge_parser.add_argument(
+        "plan", help="Plan file to write, to transfer with the 'apply' command. Compressed if it ends in '.gz'"
+    )
+    merge_parser.add_argument("indexes", nargs="+", metavar="index", help="Partial index of each shard")
+    watch_parser = subparsers.add_parser(
+        "watch",
+        parents=[folders_parser, categorize_parser, extraction_parser, transfer_parser],
+        help="Keep sorting the files that arrive in the input folder, until interrupted with Ctrl+C",
+    )
+    watch_parser.add_argument(
+        "--settle",
+        type=float,
+        default=SETTLE_SECONDS,
+        metavar="SECONDS",
+        help=f"Seconds a file must stay unchanged before it is sorted, so files still being written are left "
+        f"alone. Defaults to {SETTLE_SECONDS:g}",
+    )
+    watch_parser.add_argument(
+        "--polling",
+        action="store_true",
+        help="Poll the input folder for new files instead of using inotify, such as for network drives. "
+        "Polling is always used where inotify is not available",
+    )
+    watch_parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=POLL_INTERVAL,
+        metavar="SECONDS",
+        help=f"Seconds between polls of the input folder. Defaults to {POLL_INTERVAL:g}",
+    )
+    watch_parser.add_argument("-q", "--quiet", action="store_true", help="Do not print progress messages")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
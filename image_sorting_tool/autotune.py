@@ -0,0 +1,155 @@
+"""Choose the number of workers of each phase from the throughput measured while the phase runs.
+
+The best number of extraction processes, hashing threads and copy threads depends on the CPU and the drives
+of each machine, so any fixed default is a guess. Instead a phase starts a pool of the largest number of
+workers it may use, and a `WorkerTuner` limits how many of them work at once. During a warm-up the limit
+climbs through candidate counts, each running for a sample of files, and settles on the count with the
+highest throughput. Throughput keeps being measured afterwards, and if it falls well below what the chosen
+count achieved, such as when the write cache of a drive fills up, the warm-up is repeated around it.
+"""
+
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterable
+
+logger = logging.getLogger("image-sorting-tool")
+
+MAX_IO_WORKERS = 32  # Most threads tried for hashing and copying, beyond this even NVMe drives stop gaining
+DEFAULT_SAMPLE_SIZE = 64  # Files completed at each count before its throughput is measured
+CLIMB_TOLERANCE = 0.05  # The warm-up stops climbing once a count is this fraction slower than the best
+DEGRADE_RATIO = 0.6  # Warm up again if throughput falls below this fraction of what the chosen count achieved
+
+
+def candidate_counts(maximum: int) -> list[int]:
+    """Return the worker counts tried during a warm-up, the powers of two below `maximum` and `maximum` itself."""
+    counts = []
+    count = 1
+    while count < maximum:
+        counts.append(count)
+        count *= 2
+    counts.append(max(1, maximum))
+    return counts
+
+
+class WorkerTuner:
+    """Limits how many workers of a pool work at once, tuning the limit from the measured throughput.
+
+    Every unit of work is wrapped in `acquire` and `release`, from any thread. For process pools the thread
+    feeding the pool acquires before handing over each file and the thread collecting the results releases,
+    with `per_worker` set to the chunksize so each busy worker can hold a whole chunk.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        name: str,
+        candidates: Iterable[int],
+        *,
+        per_worker: int = 1,
+        unit: str = "files",
+        sample_size: int = DEFAULT_SAMPLE_SIZE,
+        degrade_ratio: float = DEGRADE_RATIO,
+    ) -> None:
+        """Initialize WorkerTuner object.
+
+        Arguments:
+            name: name of the phase, for the log messages
+            candidates: worker counts to try, the pool must have at least as many workers as the largest
+            per_worker: units of work each worker may hold at once
+            unit: what the amounts given to `release` count, for the log messages
+            sample_size: minimum units of work completed at each count before its throughput is measured
+            degrade_ratio: warm up again if throughput falls below this fraction of the chosen count's
+        """
+        self.name = name
+        self.candidates = sorted(set(candidates))
+        self.max_workers = self.candidates[-1]
+        self.per_worker = per_worker
+        self.unit = unit
+        self.sample_size = sample_size
+        self.degrade_ratio = degrade_ratio
+        self.history = []  # (workers, throughput) of every measured sample
+        self.chosen_throughput = None  # Throughput of the chosen count, None during a warm-up
+        self._trials = list(self.candidates)  # Counts left to try in the current warm-up
+        self._results = {}  # Throughput of each count tried in the current warm-up
+        self.workers = self._trials.pop(0)
+        self._in_flight = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._start_sample()
+
+    def _start_sample(self) -> None:
+        """Start measuring the throughput of the current count."""
+        self._sample_start = time.perf_counter()
+        self._sample_completed = 0
+        self._sample_amount = 0
+
+    def acquire(self) -> None:
+        """Wait until fewer units of work are in flight than the current count allows, then take one."""
+        with self._condition:
+            while self._in_flight >= self.workers * self.per_worker and not self._closed:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, amount: float = 1) -> None:
+        """Complete a unit of work, such as a file, measuring throughput in `amount`, such as its bytes."""
+        with self._condition:
+            self._in_flight -= 1
+            self._sample_completed += 1
+            self._sample_amount += amount
+            if self._sample_completed >= max(self.sample_size, 2 * self.workers * self.per_worker):
+                elapsed = time.perf_counter() - self._sample_start
+                self._measured(self._sample_amount / max(elapsed, 1e-9))
+                self._start_sample()
+            self._condition.notify_all()
+
+    def wrap(self, function: Callable, amount: Callable[[object], float] | None = None) -> Callable:
+        """Return a function calling `function` within `acquire` and `release`, to map over a thread pool.
+
+        Arguments:
+            function: function doing a unit of work
+            amount: returns the amount of work done from the result of `function`, each call counts as 1 if None
+        """
+
+        def tuned(*args: object) -> object:
+            self.acquire()
+            done = 0  # A call that raises did no work
+            try:
+                result = function(*args)
+                done = 1 if amount is None else amount(result)
+                return result
+            finally:
+                self.release(done)
+
+        return tuned
+
+    def close(self) -> None:
+        """Stop limiting, so a thread feeding a pool that has stopped is never left waiting."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def _measured(self, throughput: float) -> None:
+        """Choose the next count from the throughput of the current one."""
+        self.history.append((self.workers, throughput))
+        if self.chosen_throughput is not None:
+            if throughput < self.chosen_throughput * self.degrade_ratio:
+                logger.info(
+                    "Throughput of %s fell to %.1f %s/s, tuning the number of workers again",
+                    self.name,
+                    throughput,
+                    self.unit,
+                )
+                self._trials = [count for count in self.candidates if self.workers / 2 <= count <= self.workers * 2]
+                self._results = {}
+                self.chosen_throughput = None
+                self.workers = self._trials.pop(0)
+            return
+
+        self._results[self.workers] = throughput
+        best = max(self._results, key=self._results.get)
+        if self._trials and throughput >= self._results[best] * (1 - CLIMB_TOLERANCE):
+            self.workers = self._trials.pop(0)
+            return
+        self.workers = best
+        self.chosen_throughput = self._results[best]
+        logger.info("Tuned %s to %i workers, at %.1f %s/s", self.name, best, self.chosen_throughput, self.unit)
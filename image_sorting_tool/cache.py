@@ -0,0 +1,224 @@
+"""Persistent on-disk cache of the datetimes extracted from files, and of their content hashes.
+
+Extracting a datetime means opening and parsing every file, while checking whether a file changed only
+needs a `stat` call. The cache stores the extraction result of each file keyed by its path, size,
+modification time and inode, so unchanged files never need to be opened again. Datetimes may be parsed from
+filenames, so results are also keyed by the filename patterns registered when they were extracted. Content
+hashes used to find identical files are cached the same way, without the patterns.
+"""
+
+import logging
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+from image_sorting_tool.filename_dates import default_parser
+
+logger = logging.getLogger("image-sorting-tool")
+
+# Bump whenever the datetime extraction changes, so results from older versions are discarded
+CACHE_VERSION = 7
+DEFAULT_MAX_ENTRIES = 2_000_000
+EPOCH = datetime(1970, 1, 1)  # noqa: DTZ001
+
+
+def datetime_to_seconds(dtime: datetime) -> int:
+    """Convert a naive datetime to whole seconds since the unix epoch, without any timezone conversion."""
+    return int((dtime.replace(tzinfo=None) - EPOCH).total_seconds())
+
+
+def seconds_to_datetime(seconds: int) -> datetime:
+    """Convert whole seconds since the unix epoch back to a naive datetime."""
+    return EPOCH + timedelta(seconds=seconds)
+
+
+def default_cache_path() -> str:
+    """Return the path of the cache file in the platform's user cache directory."""
+    if sys.platform == "win32":
+        base_dir = os.environ.get("LOCALAPPDATA") or os.path.expanduser(r"~\AppData\Local")
+    elif sys.platform == "darwin":
+        base_dir = os.path.expanduser("~/Library/Caches")
+    else:
+        base_dir = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base_dir, "image-sorting-tool", "metadata.sqlite3")
+
+
+class MetadataCache:
+    """SQLite backed cache of extracted datetimes and content hashes.
+
+    Entries below a directory are loaded into memory with `load` before a run, so lookups are dictionary
+    accesses. New results and the usage of existing entries are written back in one transaction by `save`,
+    which also evicts the least recently used entries once the cache holds more than `max_entries`.
+    """
+
+    def __init__(self, path: str | None = None, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        """Initialize MetadataCache object.
+
+        Arguments:
+            path: location of the SQLite database, defaults to `default_cache_path()`
+            max_entries: number of files to keep in the cache before evicting the least recently used
+        """
+        self.path = path if path is not None else default_cache_path()
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # The cache is only used by one thread at a time, but that may not be the one that created it
+        self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._create_schema()
+        self.entries = {}  # fullpath -> (size, mtime_ns, inode, patterns digest, seconds or None)
+        self.pending = {}  # fullpath -> entry to write on the next save
+        self.pending_hashes = {}  # (fullpath, kind) -> hash entry to write on the next save
+        self.used = set()  # fullpaths of the entries that produced a hit
+        self.hits = 0
+        self.misses = 0
+
+    def _create_schema(self) -> None:
+        """Create the cache table, discarding the contents of caches written by other versions."""
+        with self.connection:
+            if self.connection.execute("PRAGMA user_version").fetchone()[0] != CACHE_VERSION:
+                logger.info("Discarding metadata cache from a different version: %s", self.path)
+                self.connection.execute("DROP TABLE IF EXISTS datetimes")
+                self.connection.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS datetimes ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, "
+                "patterns TEXT, datetime INTEGER, last_used INTEGER)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS datetimes_last_used ON datetimes (last_used)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS hashes ("
+                "path TEXT, kind TEXT, size INTEGER, mtime_ns INTEGER, inode INTEGER, digest TEXT, "
+                "PRIMARY KEY (path, kind))"
+            )
+
+    def load(self, directory: str) -> None:
+        """Load all cache entries of files inside the directory into memory.
+
+        Arguments:
+            directory: the folder about to be analysed
+        """
+        prefix = os.path.join(os.path.abspath(directory), "")
+        # All paths starting with the prefix sort between the prefix and the prefix with its separator incremented
+        upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        rows = self.connection.execute(
+            "SELECT path, size, mtime_ns, inode, patterns, datetime FROM datetimes WHERE path >= ? AND path < ?",
+            (prefix, upper_bound),
+        )
+        for path, *entry in rows:
+            self.entries[path] = tuple(entry)
+        logger.debug("Loaded %i metadata cache entries for %s", len(self.entries), directory)
+
+    def lookup(self, input_file: object) -> tuple[bool, datetime | None]:
+        """Look up the cached datetime of a file.
+
+        Arguments:
+            input_file: File object with its stat attributes populated
+        Returns: tuple of whether the cache held a valid entry, and the cached datetime which is None for
+            files that previously failed to have a datetime extracted. Entries extracted with other filename
+            patterns registered are not valid
+        """
+        entry = self.entries.get(input_file.fullpath)
+        key = (input_file.size, input_file.mtime_ns, input_file.inode, default_parser.patterns_digest)
+        if entry is None or entry[:4] != key:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self.used.add(input_file.fullpath)
+        return True, None if entry[4] is None else seconds_to_datetime(entry[4])
+
+    def store(self, input_file: object) -> None:
+        """Store the extracted datetime of a file, replacing any existing entry.
+
+        Arguments:
+            input_file: File object with its stat attributes and datetime populated
+        """
+        seconds = None if input_file.datetime is None else datetime_to_seconds(input_file.datetime)
+        entry = (input_file.size, input_file.mtime_ns, input_file.inode, default_parser.patterns_digest, seconds)
+        self.entries[input_file.fullpath] = entry
+        self.pending[input_file.fullpath] = entry
+
+    def lookup_hash(self, input_file: object, kind: str) -> str | None:
+        """Look up a cached content hash of a file.
+
+        Arguments:
+            input_file: File object with its stat attributes populated
+            kind: the type of hash, such as 'partial' or 'full'
+        Returns: the hex digest, or None if it is not cached or the file changed since
+        """
+        key = (input_file.fullpath, kind)
+        entry = self.pending_hashes.get(key)
+        if entry is None:
+            entry = self.connection.execute(
+                "SELECT size, mtime_ns, inode, digest FROM hashes WHERE path = ? AND kind = ?", key
+            ).fetchone()
+        if entry is None or tuple(entry[:3]) != (input_file.size, input_file.mtime_ns, input_file.inode):
+            return None
+        return entry[3]
+
+    def store_hash(self, input_file: object, kind: str, digest: str) -> None:
+        """Store a content hash of a file, replacing any existing entry of the same kind."""
+        entry = (input_file.size, input_file.mtime_ns, input_file.inode, digest)
+        self.pending_hashes[input_file.fullpath, kind] = entry
+
+    def invalidate(self, path: str) -> None:
+        """Remove the entry of a single file from the cache."""
+        path = os.path.abspath(path)
+        self.entries.pop(path, None)
+        self.pending.pop(path, None)
+        self.pending_hashes = {key: entry for key, entry in self.pending_hashes.items() if key[0] != path}
+        with self.connection:
+            self.connection.execute("DELETE FROM datetimes WHERE path = ?", (path,))
+            self.connection.execute("DELETE FROM hashes WHERE path = ?", (path,))
+
+    def clear(self) -> None:
+        """Remove all entries from the cache."""
+        self.entries.clear()
+        self.pending.clear()
+        self.pending_hashes.clear()
+        self.used.clear()
+        with self.connection:
+            self.connection.execute("DELETE FROM datetimes")
+            self.connection.execute("DELETE FROM hashes")
+
+    def save(self) -> None:
+        """Write new entries and usage times to disk, then evict entries beyond `max_entries`."""
+        now = int(time.time())
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO datetimes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(path, *entry, now) for path, entry in self.pending.items()],
+            )
+            self.connection.executemany(
+                "UPDATE datetimes SET last_used = ? WHERE path = ?",
+                [(now, path) for path in self.used - self.pending.keys()],
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)",
+                [(*key, *entry) for key, entry in self.pending_hashes.items()],
+            )
+            excess = self.connection.execute("SELECT COUNT(*) FROM datetimes").fetchone()[0] - self.max_entries
+            if excess > 0:
+                logger.info("Evicting %i least recently used entries from the metadata cache", excess)
+                self.connection.execute(
+                    "DELETE FROM datetimes WHERE path IN (SELECT path FROM datetimes ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                self.connection.execute("DELETE FROM hashes WHERE path NOT IN (SELECT path FROM datetimes)")
+        logger.debug("Saved %i new metadata cache entries, %i hits", len(self.pending), self.hits)
+        self.pending.clear()
+        self.pending_hashes.clear()
+        self.used.clear()
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self.connection.close()
+
+
+def open_default_cache() -> MetadataCache | None:
+    """Open the cache at its default location, or return None if it cannot be used on this machine."""
+    try:
+        return MetadataCache()
+    except (OSError, sqlite3.Error) as error:
+        logger.warning("Metadata cache is unavailable, all files will be analysed: %s", error)
+        return None
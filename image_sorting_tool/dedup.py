@@ -0,0 +1,150 @@
+"""Find files with identical contents, such as the same photo imported twice under different names.
+
+Comparing the contents of every file would mean reading all of them, so candidates are narrowed down in
+tiers. Only files of the same size can be identical, only those whose first and last few kilobytes also
+hash the same have their full contents hashed. Hashing runs on a thread pool, as both reading files and
+`hashlib` release the GIL. Hashes can be stored in the `MetadataCache` so unchanged files are not reread.
+"""
+
+import hashlib
+import logging
+from collections import defaultdict
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+from image_sorting_tool.autotune import WorkerTuner
+from image_sorting_tool.cache import MetadataCache
+
+logger = logging.getLogger("image-sorting-tool")
+
+# Bytes hashed from both the start and end of a file when checking if it can be identical to another
+PARTIAL_HASH_BYTES = 16 * 1024
+FULL_HASH_CHUNK = 1024 * 1024
+DEFAULT_HASH_WORKERS = 8
+
+
+def partial_hash(path: str, size: int) -> str:
+    """Hash the first and last `PARTIAL_HASH_BYTES` of a file, which covers the whole of small files.
+
+    Arguments:
+        path: path of the file
+        size: size of the file in bytes
+    Returns: hex digest of the hash
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        digest.update(file.read(PARTIAL_HASH_BYTES))
+        if size > PARTIAL_HASH_BYTES:
+            file.seek(max(PARTIAL_HASH_BYTES, size - PARTIAL_HASH_BYTES))
+            digest.update(file.read(PARTIAL_HASH_BYTES))
+    return digest.hexdigest()
+
+
+def full_hash(path: str, size: int) -> str:  # noqa: ARG001
+    """Hash the entire contents of a file.
+
+    Arguments:
+        path: path of the file
+        size: size of the file in bytes, unused but accepted so both hash functions are interchangeable
+    Returns: hex digest of the hash
+    """
+    digest = hashlib.blake2b()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(FULL_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+HASH_FUNCTIONS = {"partial": partial_hash, "full": full_hash}
+
+
+def find_identical_files(
+    files: Sequence[object],
+    workers: int = DEFAULT_HASH_WORKERS,
+    metadata_cache: MetadataCache | None = None,
+    tuner: WorkerTuner | None = None,
+) -> list[list[int]]:
+    """Group files with identical contents.
+
+    Arguments:
+        files: File objects to compare, their stat attributes are read if not already populated
+        workers: number of threads hashing files, ignored if `tuner` is given
+        metadata_cache: MetadataCache to reuse the hashes of unchanged files from previous runs
+        tuner: WorkerTuner choosing how many threads hash files at once, up to its `max_workers`
+    Returns: groups of two or more index positions of `files` with identical contents, each group sorted by
+        the path of its files and the groups sorted by their first path
+    """
+    by_size = defaultdict(list)
+    for position, input_file in enumerate(files):
+        if input_file.size is None:
+            try:
+                input_file.read_stat()
+            except OSError as error:
+                logger.warning("Failed to stat %s: %s", input_file.fullpath, error)
+                continue
+        by_size[input_file.size].append(position)
+    groups = [group for group in by_size.values() if len(group) > 1]
+
+    with ThreadPoolExecutor(max_workers=max(1, workers if tuner is None else tuner.max_workers)) as executor:
+
+        def hash_map(hash_file: Callable[[int], str | None], positions: list[int]) -> Iterator[str | None]:
+            return executor.map(hash_file if tuner is None else tuner.wrap(hash_file), positions)
+
+        groups = _split_by_hash(files, groups, "partial", hash_map, metadata_cache)
+        # The partial hash already covered all of a small file
+        complete = [group for group in groups if files[group[0]].size <= 2 * PARTIAL_HASH_BYTES]
+        large = [group for group in groups if files[group[0]].size > 2 * PARTIAL_HASH_BYTES]
+        complete += _split_by_hash(files, large, "full", hash_map, metadata_cache)
+
+    identical = [sorted(group, key=lambda position: files[position].fullpath) for group in complete]
+    identical.sort(key=lambda group: files[group[0]].fullpath)
+    logger.info("Found %i groups of identical files", len(identical))
+    return identical
+
+
+def _split_by_hash(
+    files: Sequence[object],
+    groups: list[list[int]],
+    kind: str,
+    hash_map: Callable[[Callable[[int], str | None], list[int]], Iterator[str | None]],
+    metadata_cache: MetadataCache | None,
+) -> list[list[int]]:
+    """Split each group of candidate files into groups sharing the same hash, dropping files left on their own.
+
+    Files that cannot be read are left out, so they are never treated as identical to anything. The files are
+    hashed by `hash_map`, which maps a function over index positions of `files` on the hashing threads.
+    """
+    hash_function = HASH_FUNCTIONS[kind]
+    digests = {}
+    to_hash = []
+    for group in groups:
+        for position in group:
+            cached = None if metadata_cache is None else metadata_cache.lookup_hash(files[position], kind)
+            if cached is None:
+                to_hash.append(position)
+            else:
+                digests[position] = cached
+    cached_count = len(digests)
+
+    def hash_file(position: int) -> str | None:
+        try:
+            return hash_function(files[position].fullpath, files[position].size)
+        except OSError as error:
+            logger.warning("Failed to read %s: %s", files[position].fullpath, error)
+            return None
+
+    for position, digest in zip(to_hash, hash_map(hash_file, to_hash), strict=True):
+        if digest is not None:
+            digests[position] = digest
+            if metadata_cache is not None:
+                metadata_cache.store_hash(files[position], kind, digest)
+    logger.debug("Computed %i %s hashes, reused %i cached ones", len(to_hash), kind, cached_count)
+
+    split_groups = []
+    for group in groups:
+        by_digest = defaultdict(list)
+        for position in group:
+            if position in digests:
+                by_digest[digests[position]].append(position)
+        split_groups += [same for same in by_digest.values() if len(same) > 1]
+    return split_groups
@@ -0,0 +1,145 @@
+"""Detect the kind of storage device a folder is on, to pick how many files to copy in parallel.
+
+Spinning disks slow down when several files are read or written at once, as the heads seek between them,
+while NVMe drives and network shares only reach full speed with many requests in flight. On Linux the
+device is found through `/proc/self/mountinfo` and whether it rotates is read from sysfs. Other platforms
+report an unknown device, which gets a moderate concurrency.
+"""
+
+import logging
+import os
+import re
+from typing import NamedTuple
+
+logger = logging.getLogger("image-sorting-tool")
+
+MOUNTINFO_PATH = "/proc/self/mountinfo"
+SYS_DEV_BLOCK = "/sys/dev/block"
+SYS_CLASS_BLOCK = "/sys/class/block"
+NETWORK_FILESYSTEMS = {
+    "nfs",
+    "nfs4",
+    "cifs",
+    "smb3",
+    "smbfs",
+    "9p",
+    "afs",
+    "ceph",
+    "glusterfs",
+    "lustre",
+    "fuse.sshfs",
+    "fuse.rclone",
+    "fuse.s3fs",
+}
+# Files copied in parallel for each kind of device
+DEVICE_CONCURRENCY = {"hdd": 2, "ssd": 8, "nvme": 16, "network": 16, "unknown": 4}
+OCTAL_ESCAPE = re.compile(r"\\([0-7]{3})")
+
+
+class Mount(NamedTuple):
+    """A mounted filesystem, as listed in `/proc/self/mountinfo`."""
+
+    mount_point: str
+    device_number: str  # 'major:minor'
+    fstype: str
+    source: str
+
+
+def parse_mountinfo(content: str) -> list[Mount]:
+    """Parse the contents of a mountinfo file.
+
+    Arguments:
+        content: text in the format of `/proc/self/mountinfo`
+    Returns: the mounts in the order they are listed
+    """
+    mounts = []
+    for line in content.splitlines():
+        fields = line.split()
+        if "-" not in fields:
+            continue
+        separator = fields.index("-")
+        mount_point = OCTAL_ESCAPE.sub(lambda match: chr(int(match.group(1), 8)), fields[4])
+        mounts.append(Mount(mount_point, fields[2], fields[separator + 1], fields[separator + 2]))
+    return mounts
+
+
+def find_mount(path: str) -> Mount | None:
+    """Return the mount holding a path, or None if it cannot be determined on this platform."""
+    try:
+        with open(MOUNTINFO_PATH, encoding="utf-8") as file:
+            mounts = parse_mountinfo(file.read())
+    except OSError:
+        return None
+    path = os.path.realpath(path)
+    best = None
+    for mount in mounts:
+        if os.path.commonpath([path, mount.mount_point]) == mount.mount_point and (
+            best is None or len(mount.mount_point) >= len(best.mount_point)
+        ):
+            best = mount
+    return best
+
+
+def block_device_dir(mount: Mount) -> str | None:
+    """Return the sysfs folder of the whole disk holding a mount, or None if it has no block device."""
+    device_dir = os.path.join(SYS_DEV_BLOCK, mount.device_number)
+    if not os.path.exists(device_dir):
+        # Filesystems such as btrfs report an anonymous device number, fall back to the mounted device node
+        device_dir = os.path.join(SYS_CLASS_BLOCK, os.path.basename(mount.source))
+        if not mount.source.startswith("/dev/") or not os.path.exists(device_dir):
+            return None
+    device_dir = os.path.realpath(device_dir)
+    # Partitions do not have a queue of their own, it belongs to the disk holding them
+    if not os.path.exists(os.path.join(device_dir, "queue")) and os.path.exists(os.path.join(device_dir, "partition")):
+        device_dir = os.path.dirname(device_dir)
+    return device_dir
+
+
+def device_kind(path: str) -> str:
+    """Return the kind of device a path is stored on.
+
+    Arguments:
+        path: file or folder on the device
+    Returns: one of the keys of `DEVICE_CONCURRENCY`
+    """
+    mount = find_mount(path)
+    if mount is None:
+        return "unknown"
+    if mount.fstype in NETWORK_FILESYSTEMS:
+        return "network"
+    device_dir = block_device_dir(mount)
+    if device_dir is None:
+        return "unknown"
+    try:
+        with open(os.path.join(device_dir, "queue", "rotational"), encoding="utf-8") as file:
+            rotational = file.read().strip() == "1"
+    except OSError:
+        return "unknown"
+    if rotational:
+        return "hdd"
+    return "nvme" if os.path.basename(device_dir).startswith("nvme") else "ssd"
+
+
+def copy_concurrency(source_dir: str, destination_dir: str) -> int:
+    """Return how many files to copy in parallel between two folders.
+
+    The slower of the two devices sets the concurrency. Copying within a single spinning disk uses one
+    thread, as its heads would otherwise seek between the reads and the writes of several files.
+
+    Arguments:
+        source_dir: the folder files are read from
+        destination_dir: the folder files are written to
+    """
+    source_kind, destination_kind = device_kind(source_dir), device_kind(destination_dir)
+    concurrency = min(DEVICE_CONCURRENCY[source_kind], DEVICE_CONCURRENCY[destination_kind])
+    if source_kind == destination_kind == "hdd":
+        source_mount, destination_mount = find_mount(source_dir), find_mount(destination_dir)
+        if block_device_dir(source_mount) == block_device_dir(destination_mount):
+            concurrency = 1
+    logger.info(
+        "Copying with %i threads, input folder is on %s storage and output folder is on %s storage",
+        concurrency,
+        source_kind,
+        destination_kind,
+    )
+    return concurrency
@@ -0,0 +1,174 @@
+"""Minimal EXIF reader that extracts the DateTimeOriginal tag straight from the file headers.
+
+Only the JPEG segment headers, the TIFF header, and the two IFDs leading to the tag are read. Other
+metadata such as MakerNotes and thumbnails are skipped entirely, so only a few KB of each file are read
+and no image objects are created.
+"""
+
+import struct
+from typing import BinaryIO
+
+JPEG_SOI = b"\xff\xd8"
+EXIF_HEADER = b"Exif\x00\x00"
+APP1 = 0xE1
+SOS = 0xDA
+EOI = 0xD9
+# Markers without a length field: TEM and the restart markers RST0-RST7
+STANDALONE_MARKERS = {0x01, *range(0xD0, 0xD8)}
+
+EXIF_IFD_POINTER = 0x8769
+DATETIME_ORIGINAL = 0x9003
+ASCII_TYPE = 2
+TIFF_MAGIC = 42
+IFD_ENTRY_SIZE = 12
+INLINE_VALUE_SIZE = 4
+MAX_IFD_ENTRIES = 1000
+
+
+class ExifError(ValueError):
+    """Raised when the EXIF data of a file is malformed."""
+
+
+def read_jpeg_datetime_original(filepath: str) -> str | None:
+    """Read the raw DateTimeOriginal string from the EXIF data of a JPEG.
+
+    Arguments:
+        filepath: path to the JPEG file
+    Returns: the DateTimeOriginal string such as '2013:04:07 13:21:35', or None if the file has no EXIF
+        data or the EXIF data has no DateTimeOriginal tag
+    Raises:
+        ExifError: if the file is not a JPEG or its segments or EXIF data are malformed
+    """
+    with open(filepath, "rb") as file_obj:
+        exif_segment = find_jpeg_exif(file_obj)
+        if exif_segment is None:
+            return None
+        return read_tiff_datetime_original(file_obj, *exif_segment)
+
+
+def find_jpeg_exif(file_obj: BinaryIO) -> tuple[int, int] | None:
+    """Walk the JPEG segment headers until the EXIF APP1 segment is found.
+
+    Arguments:
+        file_obj: binary file positioned at the start of the JPEG
+    Returns: tuple of the file offset and size of the TIFF data inside the EXIF segment, or None if the
+        image data starts before an EXIF segment is found
+    Raises:
+        ExifError: if the file is not a JPEG or its segments are malformed
+    """
+    if file_obj.read(2) != JPEG_SOI:
+        err_msg = "Not a JPEG file"
+        raise ExifError(err_msg)
+    while True:
+        if file_obj.read(1) != b"\xff":
+            err_msg = f"Expected a JPEG marker at offset {file_obj.tell() - 1}"
+            raise ExifError(err_msg)
+        marker = file_obj.read(1)
+        while marker == b"\xff":  # Markers may be preceded by any number of fill bytes
+            marker = file_obj.read(1)
+        if not marker:
+            err_msg = "Unexpected end of file in JPEG segment headers"
+            raise ExifError(err_msg)
+        if marker[0] in STANDALONE_MARKERS:
+            continue
+        if marker[0] in {SOS, EOI}:
+            return None
+        length_bytes = file_obj.read(2)
+        if len(length_bytes) != 2:  # noqa: PLR2004
+            err_msg = "Unexpected end of file in JPEG segment headers"
+            raise ExifError(err_msg)
+        length = struct.unpack(">H", length_bytes)[0] - 2
+        if length < 0:
+            err_msg = f"Invalid JPEG segment length at offset {file_obj.tell() - 2}"
+            raise ExifError(err_msg)
+        if marker[0] == APP1 and length >= len(EXIF_HEADER):
+            if file_obj.read(len(EXIF_HEADER)) == EXIF_HEADER:
+                return file_obj.tell(), length - len(EXIF_HEADER)
+            length -= len(EXIF_HEADER)
+        file_obj.seek(length, 1)
+
+
+def read_tiff_datetime_original(file_obj: BinaryIO, tiff_offset: int, tiff_size: int) -> str | None:
+    """Read the raw DateTimeOriginal string from TIFF structured EXIF data embedded in a file.
+
+    Follows the Exif IFD pointer in IFD0 to the DateTimeOriginal tag, reading only the entries needed.
+
+    Arguments:
+        file_obj: binary file containing the EXIF data
+        tiff_offset: file offset of the TIFF header, all EXIF offsets are relative to it
+        tiff_size: number of bytes of EXIF data, offsets beyond it are treated as malformed
+    Returns: the DateTimeOriginal string, or None if the tag is not present
+    Raises:
+        ExifError: if the EXIF data is malformed
+    """
+    reader = _TiffReader(file_obj, tiff_offset, tiff_size)
+    exif_ifd = reader.find_entry(reader.first_ifd, EXIF_IFD_POINTER)
+    if exif_ifd is None:
+        return None
+    entry = reader.find_entry(reader.value_offset(exif_ifd), DATETIME_ORIGINAL)
+    if entry is None:
+        return None
+    return reader.ascii_value(entry)
+
+
+class _TiffReader:
+    """Reads individual IFD entries of TIFF data at an offset within a file."""
+
+    def __init__(self, file_obj: BinaryIO, tiff_offset: int, tiff_size: int) -> None:
+        """Initialize _TiffReader object by parsing the TIFF header."""
+        self.file_obj = file_obj
+        self.tiff_offset = tiff_offset
+        self.tiff_size = tiff_size
+        header = self.read(0, 8)
+        if header[:2] == b"II":
+            self.byte_order = "<"
+        elif header[:2] == b"MM":
+            self.byte_order = ">"
+        else:
+            err_msg = f"Invalid TIFF byte order {header[:2]!r}"
+            raise ExifError(err_msg)
+        magic, self.first_ifd = struct.unpack(self.byte_order + "HI", header[2:])
+        if magic != TIFF_MAGIC:
+            err_msg = f"Invalid TIFF magic number {magic}"
+            raise ExifError(err_msg)
+
+    def read(self, offset: int, size: int) -> bytes:
+        """Read bytes at an offset relative to the TIFF header."""
+        if offset + size > self.tiff_size:
+            err_msg = f"EXIF offset {offset} is outside of the EXIF data"
+            raise ExifError(err_msg)
+        self.file_obj.seek(self.tiff_offset + offset)
+        data = self.file_obj.read(size)
+        if len(data) != size:
+            err_msg = "Unexpected end of file in EXIF data"
+            raise ExifError(err_msg)
+        return data
+
+    def find_entry(self, ifd_offset: int, tag: int) -> tuple[int, int, bytes] | None:
+        """Find a tag in an IFD.
+
+        Returns: tuple of the tag's type, count and raw 4 byte value field, or None if the tag is not present
+        """
+        (count,) = struct.unpack(self.byte_order + "H", self.read(ifd_offset, 2))
+        if count > MAX_IFD_ENTRIES:
+            err_msg = f"Implausible number of IFD entries: {count}"
+            raise ExifError(err_msg)
+        entries = self.read(ifd_offset + 2, count * IFD_ENTRY_SIZE)
+        for entry_offset in range(0, len(entries), IFD_ENTRY_SIZE):
+            entry_tag, entry_type, entry_count = struct.unpack_from(self.byte_order + "HHI", entries, entry_offset)
+            if entry_tag == tag:
+                return entry_type, entry_count, entries[entry_offset + 8 : entry_offset + IFD_ENTRY_SIZE]
+        return None
+
+    def value_offset(self, entry: tuple[int, int, bytes]) -> int:
+        """Interpret the value field of an entry as an offset."""
+        return struct.unpack(self.byte_order + "I", entry[2])[0]
+
+    def ascii_value(self, entry: tuple[int, int, bytes]) -> str:
+        """Read the string value of an ASCII entry."""
+        entry_type, count, value = entry
+        if entry_type != ASCII_TYPE:
+            err_msg = f"Expected an ASCII EXIF value but found type {entry_type}"
+            raise ExifError(err_msg)
+        data = value[:count] if count <= INLINE_VALUE_SIZE else self.read(self.value_offset(entry), count)
+        return data.split(b"\x00", 1)[0].decode("ascii", errors="replace")
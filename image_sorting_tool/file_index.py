@@ -0,0 +1,301 @@
+"""Columnar index of the files found in the source folder.
+
+A source folder may hold millions of files, and a Python object per file with a handful of attributes costs
+hundreds of bytes each. The index instead keeps one compact `array` per attribute, with the folders and
+extensions interned in tables so each is stored once. Datetimes are stored as epoch seconds, and the
+category and flags of each file as small integers, so categorising and counting duplicates are passes over
+whole columns. `FileView` gives the familiar attribute access of a `File` onto a row of the index.
+"""
+
+import os
+from array import array
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+
+from image_sorting_tool.cache import datetime_to_seconds, seconds_to_datetime
+
+NO_VALUE = -(2**63)  # Missing value in the signed columns, such as a file without a datetime
+NO_INODE = 2**64 - 1  # Missing value in the inode column
+
+# Categories of files
+CATEGORY_UNSORTED = 0  # Not categorised yet
+CATEGORY_SORT = 1  # Has a datetime and a requested extension, sorted into '<year>/<month>'
+CATEGORY_FAILED = 2  # Has a requested extension but no datetime, copied to 'failed_to_sort'
+CATEGORY_OTHER = 3  # Not a requested extension, optionally copied to 'other_files'
+CATEGORY_FOLDERS = {CATEGORY_UNSORTED: None, CATEGORY_FAILED: "failed_to_sort", CATEGORY_OTHER: "other_files"}
+
+# Bit flags of files
+FLAG_SORT = 1  # The file will be transferred to the output folder
+FLAG_DUPLICATE = 2  # Another sorted file has the same datetime
+FLAG_RENAMED = 4  # The sorted filename has the duplicate postfix appended
+FLAG_IDENTICAL = 8  # Skipped as an identical copy of another file
+
+
+def format_sorted_filename(dtime: datetime, extension: str, duplicate_idx: int | None = None) -> str:
+    """Return the output filename of a sorted file, such as '20200114_135312.jpg' or '20200114_135312_002.jpg'."""
+    postfix = f"_{duplicate_idx:0>3}" if duplicate_idx else ""
+    return (
+        f"{dtime.year:0>4}{dtime.month:0>2}{dtime.day:0>2}"
+        f"_{dtime.hour:0>2}{dtime.minute:0>2}{dtime.second:0>2}{postfix}{extension}"
+    )
+
+
+class FileIndex:
+    """Compact columnar store of files, addressed by row number.
+
+    Rows are appended as files are found and never removed, so row numbers stay valid for the index's life.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty FileIndex object."""
+        self.directories = []  # Interned folder paths
+        self.extensions = []  # Interned extensions
+        self._directory_ids = {}
+        self._extension_ids = {}
+        self.names = []
+        self.directory_ids = array("I")
+        self.extension_ids = array("I")
+        self.datetimes = array("q")  # Epoch seconds
+        self.sizes = array("q")
+        self.mtimes = array("q")  # Nanoseconds
+        self.inodes = array("Q")
+        self.categories = array("B")
+        self.flags = array("B")
+        self.duplicate_indexes = array("I")  # 0 if not a duplicate
+
+    def append(self, path: str) -> int:
+        """Add a file to the index.
+
+        Arguments:
+            path: path of the file
+        Returns: the row of the file
+        """
+        directory, name = os.path.split(os.path.abspath(path))
+        extension = os.path.splitext(name)[1]
+        directory_id = self._directory_ids.get(directory)
+        if directory_id is None:
+            directory_id = self._directory_ids[directory] = len(self.directories)
+            self.directories.append(directory)
+        extension_id = self._extension_ids.get(extension)
+        if extension_id is None:
+            extension_id = self._extension_ids[extension] = len(self.extensions)
+            self.extensions.append(extension)
+        self.names.append(name)
+        self.directory_ids.append(directory_id)
+        self.extension_ids.append(extension_id)
+        self.datetimes.append(NO_VALUE)
+        self.sizes.append(NO_VALUE)
+        self.mtimes.append(NO_VALUE)
+        self.inodes.append(NO_INODE)
+        self.categories.append(CATEGORY_UNSORTED)
+        self.flags.append(0)
+        self.duplicate_indexes.append(0)
+        return len(self.names) - 1
+
+    def __len__(self) -> int:
+        """Number of files in the index."""
+        return len(self.names)
+
+    def __getitem__(self, row: int) -> "FileView":
+        """Return a view onto a row of the index."""
+        if not -len(self.names) <= row < len(self.names):
+            err_msg = f"Row {row} is out of range for an index of {len(self.names)} files"
+            raise IndexError(err_msg)
+        return FileView(self, row % len(self.names))
+
+    def __iter__(self) -> Iterator["FileView"]:
+        """Iterate over views onto every row of the index."""
+        for row in range(len(self.names)):
+            yield FileView(self, row)
+
+    def fullpath(self, row: int) -> str:
+        """Return the absolute path of the file in a row."""
+        return os.path.join(self.directories[self.directory_ids[row]], self.names[row])
+
+    def categorize(self, ext_to_sort: Iterable[str], copy_unsorted: bool) -> None:
+        """Set the category and sort flag of every file.
+
+        Arguments:
+            ext_to_sort: extensions of the files to sort
+            copy_unsorted: also transfer the files not matching `ext_to_sort`
+        """
+        suffixes = tuple(ext_to_sort)
+        requested = [extension.lower().endswith(suffixes) for extension in self.extensions]
+        self.categories = array(
+            "B",
+            [
+                (CATEGORY_SORT if seconds != NO_VALUE else CATEGORY_FAILED)
+                if requested[extension_id]
+                else CATEGORY_OTHER
+                for extension_id, seconds in zip(self.extension_ids, self.datetimes, strict=True)
+            ],
+        )
+        other_flag = FLAG_SORT if copy_unsorted else 0
+        self.flags = array(
+            "B", [other_flag if category == CATEGORY_OTHER else FLAG_SORT for category in self.categories]
+        )
+        self.duplicate_indexes = array("I", bytes(self.duplicate_indexes.itemsize * len(self.names)))
+
+    def categorize_rows(self, rows: Iterable[int], ext_to_sort: Iterable[str], copy_unsorted: bool) -> None:
+        """Set the category and sort flag of some files, as `categorize` does for every file.
+
+        Arguments:
+            rows: rows of the files to categorise, such as files analysed since the others were categorised
+            ext_to_sort: extensions of the files to sort
+            copy_unsorted: also transfer the files not matching `ext_to_sort`
+        """
+        suffixes = tuple(ext_to_sort)
+        for row in rows:
+            if not self.extensions[self.extension_ids[row]].lower().endswith(suffixes):
+                self.categories[row] = CATEGORY_OTHER
+                self.flags[row] = FLAG_SORT if copy_unsorted else 0
+            else:
+                self.categories[row] = CATEGORY_SORT if self.datetimes[row] != NO_VALUE else CATEGORY_FAILED
+                self.flags[row] = FLAG_SORT
+            self.duplicate_indexes[row] = 0
+
+    def rows(self, category: int | None = None, flag: int | None = None) -> list[int]:
+        """Return the rows of a category, having a flag, or both, excluding files skipped as identical copies."""
+        return [
+            row
+            for row, (row_category, row_flags) in enumerate(zip(self.categories, self.flags, strict=True))
+            if (category is None or row_category == category)
+            and (flag is None or row_flags & flag)
+            and (flag == FLAG_IDENTICAL or not row_flags & FLAG_IDENTICAL)
+        ]
+
+    def skip_identical(self, rows: Iterable[int]) -> None:
+        """Stop files from being transferred as they are identical copies of other files."""
+        for row in rows:
+            self.flags[row] = (self.flags[row] & ~FLAG_SORT) | FLAG_IDENTICAL
+
+    def number_duplicates(self, rename: bool) -> None:
+        """Number the sorted files sharing a datetime, in order of their path.
+
+        Arguments:
+            rename: append the duplicate postfix to the sorted filenames, so all duplicates are kept
+        """
+        sorted_rows = self.rows(CATEGORY_SORT)
+        counts = Counter(self.datetimes[row] for row in sorted_rows)
+        duplicate_rows = [row for row in sorted_rows if counts[self.datetimes[row]] > 1]
+        duplicate_rows.sort(key=self.fullpath)
+        numbering = Counter()
+        flags = FLAG_DUPLICATE | (FLAG_RENAMED if rename else 0)
+        for row in duplicate_rows:
+            numbering[self.datetimes[row]] += 1
+            self.duplicate_indexes[row] = numbering[self.datetimes[row]]
+            self.flags[row] |= flags
+
+
+class FileView:
+    """A row of a `FileIndex`, with the attributes of a `File`.
+
+    The destination folder and sorted filename are derived from the category, datetime and flags of the row.
+    """
+
+    __slots__ = ("index", "row")
+
+    def __init__(self, index: FileIndex, row: int) -> None:
+        """Initialize FileView object.
+
+        Arguments:
+            index: the index holding the file
+            row: row of the file in the index
+        """
+        self.index = index
+        self.row = row
+
+    def __repr__(self) -> str:
+        """String to generate when __repr__ or __str__ methods are called."""
+        return (
+            f"File('{self.fullpath}','{self.filename}','{self.extension}', {self.datetime}, "
+            f"'{self.destination_relative_path}', '{self.sorted_filename}', {self.duplicate_idx})"
+        )
+
+    @property
+    def fullpath(self) -> str:
+        """Absolute path of the file."""
+        return self.index.fullpath(self.row)
+
+    @property
+    def filename(self) -> str:
+        """Name of the file."""
+        return self.index.names[self.row]
+
+    @property
+    def extension(self) -> str:
+        """Extension of the file, including the leading dot."""
+        return self.index.extensions[self.index.extension_ids[self.row]]
+
+    @property
+    def datetime(self) -> datetime | None:
+        """Datetime the file was taken, None if it is unknown."""
+        seconds = self.index.datetimes[self.row]
+        return None if seconds == NO_VALUE else seconds_to_datetime(seconds)
+
+    @datetime.setter
+    def datetime(self, dtime: "datetime | None") -> None:
+        self.index.datetimes[self.row] = NO_VALUE if dtime is None else datetime_to_seconds(dtime)
+
+    @property
+    def size(self) -> int | None:
+        """Size of the file in bytes, None until its stat has been read."""
+        size = self.index.sizes[self.row]
+        return None if size == NO_VALUE else size
+
+    @property
+    def mtime_ns(self) -> int | None:
+        """Modification time of the file in nanoseconds, None until its stat has been read."""
+        mtime_ns = self.index.mtimes[self.row]
+        return None if mtime_ns == NO_VALUE else mtime_ns
+
+    @property
+    def inode(self) -> int | None:
+        """Inode of the file, None until its stat has been read."""
+        inode = self.index.inodes[self.row]
+        return None if inode == NO_INODE else inode
+
+    @property
+    def sort_flag(self) -> bool:
+        """Whether the file will be transferred to the output folder."""
+        return bool(self.index.flags[self.row] & FLAG_SORT)
+
+    @sort_flag.setter
+    def sort_flag(self, sort_flag: bool) -> None:
+        if sort_flag:
+            self.index.flags[self.row] |= FLAG_SORT
+        else:
+            self.index.flags[self.row] &= ~FLAG_SORT
+
+    @property
+    def duplicate_idx(self) -> int | None:
+        """Position of the file among the files sharing its datetime, None if no other file shares it."""
+        return self.index.duplicate_indexes[self.row] or None
+
+    @property
+    def destination_relative_path(self) -> str | None:
+        """Folder the file is transferred into, relative to the output folder. None until categorised."""
+        category = self.index.categories[self.row]
+        if category != CATEGORY_SORT:
+            return CATEGORY_FOLDERS[category]
+        dtime = self.datetime
+        return os.path.join(str(dtime.year).zfill(4), str(dtime.month).zfill(2))
+
+    @property
+    def sorted_filename(self) -> str | None:
+        """Name the file is transferred under. None until categorised."""
+        category = self.index.categories[self.row]
+        if category == CATEGORY_UNSORTED:
+            return None
+        if category != CATEGORY_SORT:
+            return self.filename
+        renamed = self.index.flags[self.row] & FLAG_RENAMED
+        return format_sorted_filename(self.datetime, self.extension, self.duplicate_idx if renamed else None)
+
+    def read_stat(self) -> None:
+        """Populate the size, modification time and inode of the file from the filesystem."""
+        stat_result = os.stat(self.fullpath)
+        self.index.sizes[self.row] = stat_result.st_size
+        self.index.mtimes[self.row] = stat_result.st_mtime_ns
+        self.index.inodes[self.row] = stat_result.st_ino
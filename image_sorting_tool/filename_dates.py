@@ -0,0 +1,140 @@
+"""Recognise the datetimes that cameras, phones and apps embed in filenames.
+
+Filenames are matched against precompiled patterns for the common naming schemes, such as
+'IMG_20190101_120000.jpg', 'PXL_20210101_123456789.jpg', 'Screenshot_2020-01-01-12-30-45.png' or
+'VID-20200101-WA0001.mp4'. Only names matching none of them are handed to `dateutil`, as a last resort.
+Extra naming schemes can be added with `register_pattern`.
+"""
+
+import hashlib
+import logging
+import os
+import re
+from collections.abc import Iterable
+from datetime import datetime
+
+from dateutil import parser
+
+logger = logging.getLogger("image-sorting-tool")
+
+MAX_DATETIME_DIGITS = 14
+REQUIRED_GROUPS = {"year", "month", "day"}
+
+_SEP = r"[-_.: ]?"
+# A date of 'yyyy?mm?dd', optionally followed by a time of 'HH?MM?SS', where '?' is an optional separator
+DATETIME_PATTERN = (
+    r"(?<!\d)(?P<year>19[7-9]\d|20\d\d)" + _SEP + r"(?P<month>0[1-9]|1[0-2])" + _SEP + r"(?P<day>0[1-9]|[12]\d|3[01])"
+    r"(?:(?:[-_.: Tt]| at )?(?P<hour>[01]\d|2[0-3])" + _SEP + r"(?P<minute>[0-5]\d)" + _SEP + r"(?P<second>[0-5]\d))?"
+)
+YEAR_PATTERN = re.compile(r"19[7-9]\d|20\d\d")
+NON_DIGIT_PATTERN = re.compile(r"\D")
+# Fills the fields `dateutil` finds no digits for, which would otherwise be taken from today's date
+DIGITS_DEFAULT = datetime(2000, 1, 1)
+
+
+class FilenameDateParser:
+    """Extracts datetimes from filenames using precompiled patterns, with `dateutil` as a fallback."""
+
+    def __init__(self) -> None:
+        """Initialize FilenameDateParser object with the default naming schemes."""
+        self.user_patterns = []  # Patterns added with `register`, in the order they were added
+        self.patterns = [re.compile(DATETIME_PATTERN)]
+        self.patterns_digest = ""  # Identifies the user patterns, so results parsed without them are not reused
+
+    def register(self, pattern: str) -> None:
+        """Add a naming scheme, which is tried before the default ones.
+
+        Arguments:
+            pattern: regular expression with the named groups 'year', 'month' and 'day', and optionally
+                'hour', 'minute' and 'second'
+        Raises:
+            ValueError: if the pattern is invalid or is missing a required group
+        """
+        if pattern in self.user_patterns:
+            return
+        try:
+            compiled = re.compile(pattern)
+        except re.error as error:
+            err_msg = f"Invalid filename pattern '{pattern}': {error}"
+            raise ValueError(err_msg) from error
+        missing_groups = REQUIRED_GROUPS - compiled.groupindex.keys()
+        if missing_groups:
+            err_msg = f"Filename pattern '{pattern}' is missing the groups: {', '.join(sorted(missing_groups))}"
+            raise ValueError(err_msg)
+        self.user_patterns.append(pattern)
+        self.patterns.insert(len(self.user_patterns) - 1, compiled)
+        self.patterns_digest = hashlib.sha256("\n".join(self.user_patterns).encode()).hexdigest()[:16]
+
+    def parse(self, filename: str, fallback: bool = True) -> datetime:
+        """Extract the datetime from a filename.
+
+        Arguments:
+            filename: name of the file, a full path is also accepted
+            fallback: hand names matching none of the patterns to `dateutil`, which guesses at any digits
+        Returns: the datetime found in the filename
+        Raises:
+            ValueError: if no datetime could be found in the filename
+        """
+        stem = os.path.splitext(os.path.basename(filename))[0]
+        for pattern in self.patterns:
+            for match in pattern.finditer(stem):
+                groups = match.groupdict()
+                try:
+                    return datetime(
+                        int(groups["year"]),
+                        int(groups["month"]),
+                        int(groups["day"]),
+                        int(groups.get("hour") or 0),
+                        int(groups.get("minute") or 0),
+                        int(groups.get("second") or 0),
+                    )
+                except ValueError:
+                    continue  # Such as the 30th of February, try the next match
+        if not fallback:
+            err_msg = f"No naming scheme matches {stem}"
+            raise ValueError(err_msg)
+        return self._parse_digits(stem)
+
+    @staticmethod
+    def _parse_digits(stem: str) -> datetime:
+        """Last resort that lets `dateutil` interpret all the digits in the filename."""
+        if YEAR_PATTERN.search(stem) is None:
+            err_msg = f"No year found in {stem}"
+            raise ValueError(err_msg)
+        # Truncate to 14 digits (YYYYMMDDHHMMSS) to prevent dateutil OverflowError on burst shots
+        numbers = NON_DIGIT_PATTERN.sub("", stem)[:MAX_DATETIME_DIGITS]
+        return parser.parse(numbers, default=DIGITS_DEFAULT)
+
+    def parse_many(self, filenames: Iterable[str]) -> list[datetime | None]:
+        """Extract the datetimes from many filenames at once.
+
+        The sorting tool itself parses each name as its file is found, this is for callers dating a list of names.
+
+        Arguments:
+            filenames: names of the files, full paths are also accepted
+        Returns: the datetime found in each filename, or None for filenames without a datetime
+        """
+        parse = self.parse
+        results = []
+        for filename in filenames:
+            try:
+                results.append(parse(filename))
+            except Exception as error:
+                logger.warning("Failed to get datetime for: %s from error: %s", filename, error)
+                results.append(None)
+        return results
+
+
+# Parser shared by the sorting tool, patterns registered on it are also installed in the worker processes
+default_parser = FilenameDateParser()
+
+
+def register_pattern(pattern: str) -> None:
+    """Add a naming scheme to the default parser, see `FilenameDateParser.register`."""
+    default_parser.register(pattern)
+
+
+def register_patterns(patterns: Iterable[str]) -> None:
+    """Add several naming schemes to the default parser, used to initialise worker processes."""
+    for pattern in patterns:
+        default_parser.register(pattern)
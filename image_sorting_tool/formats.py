@@ -0,0 +1,333 @@
+"""Registry of the file formats whose date taken can be read from their metadata, detected by their magic bytes.
+
+Each format registers the magic bytes that start its files, and a reader that parses only the metadata from the
+start of the file, stopping before the image data, so only a few KB of each file are read. The format is
+detected from the contents rather than the extension, so files with the wrong extension, such as HEIC photos
+renamed to '.jpg', are still read. Readers return None when a file has no date, and raise a `ValueError`
+subclass when its metadata is malformed.
+
+- JPEG: the EXIF DateTimeOriginal, see `exif`.
+- PNG: the EXIF data of the 'eXIf' chunk, then the XMP or 'Creation Time' text chunks. Chunks after the first
+  'IDAT' are not read. The 'tIME' chunk is the time the image was last modified rather than taken, so it is only
+  read by `read_modified_datetime`, as a last resort once the filename has no date either.
+- GIF: XMP and comment extensions before the first image.
+- ISO-BMFF: the EXIF item of HEIF images, or the creation time of MP4 and MOV videos, see `isobmff`.
+"""
+
+import email.utils
+import re
+import struct
+import zlib
+from collections.abc import Callable, Iterator
+from datetime import datetime, timezone
+from typing import BinaryIO, NamedTuple
+
+from image_sorting_tool.exif import find_jpeg_exif, read_tiff_datetime_original
+from image_sorting_tool.isobmff import (
+    HEIF_BRANDS,
+    HEIF_EXTENSIONS,
+    VIDEO_EXTENSIONS,
+    find_heif_exif,
+    parse_date_text,
+    read_brands,
+    read_movie_creation_time,
+)
+
+MAGIC_BYTES = 16  # Bytes read from the start of each file to detect its format
+MAX_TEXT_BYTES = 64 * 1024  # Larger text chunks and extensions are skipped, or truncated once decompressed
+MAX_BLOCKS = 1000  # Bounds the walk of malformed files made of tiny chunks or extensions
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_CHUNK_HEADER = struct.Struct(">I4s")
+PNG_CRC_SIZE = 4
+PNG_TIME = struct.Struct(">HBBBBB")
+PNG_CREATION_KEYWORDS = {b"Creation Time", b"date:create"}
+XMP_KEYWORD = b"XML:com.adobe.xmp"
+
+GIF_SCREEN_DESCRIPTOR = struct.Struct("<6sHHBBB")
+GIF_EXTENSION = 0x21
+GIF_COMMENT = 0xFE
+GIF_APPLICATION = 0xFF
+GIF_COLOR_TABLE_FLAG = 0x80
+XMP_APPLICATION = b"XMP DataXMP"
+
+# XMP properties of the date taken, in order of preference, as attributes or elements
+XMP_DATE_PATTERNS = [
+    re.compile(rf"{name}(?:\s*=\s*[\"']|>)\s*([^\"'<]+)")
+    for name in ("exif:DateTimeOriginal", "photoshop:DateCreated", "xmp:CreateDate")
+]
+
+
+class FormatError(ValueError):
+    """Raised when the metadata of a file is malformed."""
+
+
+class ImageFormat(NamedTuple):
+    """A file format whose date taken can be read from its metadata."""
+
+    name: str
+    magic: bytes  # Bytes every file of the format has at `offset`
+    offset: int
+    extensions: tuple[str, ...]  # Extensions files of the format usually have, in lower case
+    read_datetime: Callable[[BinaryIO], datetime | None]  # Reads the date taken from a file opened in binary mode
+    read_modified: Callable[[BinaryIO], datetime | None] | None = None  # Reads the time it was last modified
+
+
+FORMATS = []
+
+
+def register_format(image_format: ImageFormat) -> None:
+    """Register a format, replacing any registered format of the same name.
+
+    Arguments:
+        image_format: the format to register, its magic bytes must fit in the first `MAGIC_BYTES` of files
+    Raises:
+        ValueError: if the magic bytes extend past the first `MAGIC_BYTES` of files
+    """
+    if image_format.offset + len(image_format.magic) > MAGIC_BYTES:
+        err_msg = f"Magic bytes of {image_format.name} must be within the first {MAGIC_BYTES} bytes of files"
+        raise ValueError(err_msg)
+    FORMATS[:] = [registered for registered in FORMATS if registered.name != image_format.name]
+    FORMATS.append(image_format)
+
+
+def detect_format(header: bytes) -> ImageFormat | None:
+    """Return the registered format of a file from its first `MAGIC_BYTES`, or None if it is not registered."""
+    for image_format in FORMATS:
+        if header[image_format.offset : image_format.offset + len(image_format.magic)] == image_format.magic:
+            return image_format
+    return None
+
+
+def metadata_extensions() -> tuple[str, ...]:
+    """Return the extensions of the registered formats, whose files are worth opening to read their metadata."""
+    return tuple(extension for image_format in FORMATS for extension in image_format.extensions)
+
+
+def read_metadata_datetime(filepath: str) -> datetime | None:
+    """Read the date taken of a file from its metadata, detecting its format from its magic bytes.
+
+    Arguments:
+        filepath: path to the file
+    Returns: the date taken as a naive local datetime, or None if the format is not registered or the file
+        records no date
+    Raises:
+        ValueError: if the metadata of the file is malformed
+        OSError: if the file cannot be read
+    """
+    with open(filepath, "rb") as file_obj:
+        image_format = detect_format(file_obj.read(MAGIC_BYTES))
+        if image_format is None:
+            return None
+        file_obj.seek(0)
+        return image_format.read_datetime(file_obj)
+
+
+def read_modified_datetime(filepath: str) -> datetime | None:
+    """Read the time a file was last modified from its metadata, for the formats that record it.
+
+    Arguments:
+        filepath: path to the file
+    Returns: the time as a naive local datetime, or None if the format records no such time
+    Raises:
+        ValueError: if the metadata of the file is malformed
+        OSError: if the file cannot be read
+    """
+    with open(filepath, "rb") as file_obj:
+        image_format = detect_format(file_obj.read(MAGIC_BYTES))
+        if image_format is None or image_format.read_modified is None:
+            return None
+        file_obj.seek(0)
+        return image_format.read_modified(file_obj)
+
+
+def parse_exif_datetime(date_taken: str | None) -> datetime | None:
+    """Parse an EXIF datetime such as '2013:04:07 13:21:35', None if it is missing or blank such as '0000:00:00'."""
+    if date_taken is None:
+        return None
+    try:
+        return datetime.strptime(date_taken.strip(), "%Y:%m:%d %H:%M:%S")  # noqa: DTZ007
+    except ValueError:
+        return None
+
+
+def parse_xmp_datetime(xmp: str) -> datetime | None:
+    """Read the date taken from an XMP packet, ignoring its UTC offset. None if it records no date."""
+    for pattern in XMP_DATE_PATTERNS:
+        match = pattern.search(xmp)
+        if match is not None:
+            dtime = parse_date_text(match.group(1))
+            if dtime is not None:
+                return dtime
+    return None
+
+
+def parse_text_datetime(text: str) -> datetime | None:
+    """Parse a free form date, such as ISO 8601 or the RFC 1123 format of the PNG 'Creation Time' keyword."""
+    dtime = parse_date_text(text)
+    if dtime is not None:
+        return dtime
+    try:
+        dtime = email.utils.parsedate_to_datetime(text.strip())
+    except (TypeError, ValueError, IndexError):
+        return None
+    return dtime.replace(tzinfo=None)
+
+
+def read_jpeg_datetime(file_obj: BinaryIO) -> datetime | None:
+    """Read the date taken of a JPEG from its EXIF data."""
+    exif_segment = find_jpeg_exif(file_obj)
+    if exif_segment is None:
+        return None
+    return parse_exif_datetime(read_tiff_datetime_original(file_obj, *exif_segment))
+
+
+def read_png_datetime(file_obj: BinaryIO) -> datetime | None:
+    """Read the date taken of a PNG from the chunks before its image data."""
+    text_date = None
+    for chunk_type, start, length in _png_chunks(file_obj):
+        if chunk_type == b"eXIf":
+            dtime = parse_exif_datetime(read_tiff_datetime_original(file_obj, start, length))
+            if dtime is not None:
+                return dtime
+        elif chunk_type in {b"tEXt", b"zTXt", b"iTXt"} and length <= MAX_TEXT_BYTES and text_date is None:
+            keyword, text = _read_png_text(file_obj.read(length), chunk_type)
+            if keyword == XMP_KEYWORD:
+                text_date = parse_xmp_datetime(text)
+            elif keyword in PNG_CREATION_KEYWORDS:
+                text_date = parse_text_datetime(text)
+    return text_date
+
+
+def read_png_modified_time(file_obj: BinaryIO) -> datetime | None:
+    """Read the UTC 'tIME' chunk of a PNG, the time it was last modified, as a naive local datetime."""
+    for chunk_type, _, length in _png_chunks(file_obj):
+        if chunk_type == b"tIME" and length == PNG_TIME.size:
+            try:
+                modified = datetime(*PNG_TIME.unpack(file_obj.read(length)), tzinfo=timezone.utc)
+            except (ValueError, struct.error):
+                return None
+            return modified.astimezone().replace(tzinfo=None)
+    return None
+
+
+def _png_chunks(file_obj: BinaryIO) -> Iterator[tuple[bytes, int, int]]:
+    """Yield the type, offset and length of the chunks of a PNG before its image data."""
+    file_obj.seek(len(PNG_SIGNATURE))
+    for _ in range(MAX_BLOCKS):
+        header = file_obj.read(PNG_CHUNK_HEADER.size)
+        if len(header) != PNG_CHUNK_HEADER.size:
+            return
+        length, chunk_type = PNG_CHUNK_HEADER.unpack(header)
+        if chunk_type in {b"IDAT", b"IEND"}:
+            return
+        start = file_obj.tell()
+        yield chunk_type, start, length
+        file_obj.seek(start + length + PNG_CRC_SIZE)
+
+
+def _read_png_text(data: bytes, chunk_type: bytes) -> tuple[bytes, str]:
+    """Split the contents of a PNG text chunk into its keyword and text, decompressing the text if needed."""
+    keyword, _, rest = data.partition(b"\x00")
+    try:
+        if chunk_type == b"tEXt":
+            return keyword, rest.decode("latin-1")
+        if chunk_type == b"zTXt":  # A compression method byte, then the compressed text
+            return keyword, _decompress(rest[1:]).decode("latin-1")
+        # iTXt has a compression flag and method, then a language tag and translated keyword before the text
+        compressed = rest[:1] == b"\x01"
+        _, _, rest = rest[2:].partition(b"\x00")
+        _, _, text = rest.partition(b"\x00")
+        return keyword, (_decompress(text) if compressed else text).decode("utf-8", errors="replace")
+    except zlib.error as error:
+        err_msg = f"Invalid compressed text in a PNG {chunk_type.decode()} chunk"
+        raise FormatError(err_msg) from error
+
+
+def _decompress(data: bytes) -> bytes:
+    """Decompress zlib data, truncated to `MAX_TEXT_BYTES`."""
+    return zlib.decompressobj().decompress(data, MAX_TEXT_BYTES)
+
+
+def read_gif_datetime(file_obj: BinaryIO) -> datetime | None:
+    """Read the date taken of a GIF from the XMP and comment extensions before its first image."""
+    header = file_obj.read(GIF_SCREEN_DESCRIPTOR.size)
+    if len(header) != GIF_SCREEN_DESCRIPTOR.size:
+        err_msg = "The GIF header is truncated"
+        raise FormatError(err_msg)
+    flags = GIF_SCREEN_DESCRIPTOR.unpack(header)[3]
+    if flags & GIF_COLOR_TABLE_FLAG:
+        file_obj.seek(3 * 2 ** ((flags & 0x7) + 1), 1)
+    comment_date = None
+    for _ in range(MAX_BLOCKS):
+        introducer = file_obj.read(2)
+        if len(introducer) != 2 or introducer[0] != GIF_EXTENSION:  # noqa: PLR2004
+            break  # The first image, the trailer, or the end of the file
+        if introducer[1] == GIF_APPLICATION:
+            application = _read_gif_sub_block(file_obj)
+            if application == XMP_APPLICATION:
+                # XMP is stored raw rather than in sub-blocks, the length bytes are part of the packet
+                xmp = _read_gif_sub_blocks(file_obj, keep_lengths=True).decode("utf-8", errors="replace")
+                dtime = parse_xmp_datetime(xmp)
+                if dtime is not None:
+                    return dtime
+                continue
+        elif introducer[1] == GIF_COMMENT and comment_date is None:
+            comment = _read_gif_sub_blocks(file_obj, keep_lengths=False).decode("latin-1")
+            comment_date = parse_text_datetime(comment)
+            continue
+        _read_gif_sub_blocks(file_obj, keep_lengths=False, skip=True)
+    return comment_date
+
+
+def _read_gif_sub_block(file_obj: BinaryIO) -> bytes:
+    """Read a single GIF data sub-block."""
+    length = file_obj.read(1)
+    if not length:
+        err_msg = "Unexpected end of file in a GIF extension"
+        raise FormatError(err_msg)
+    return file_obj.read(length[0])
+
+
+def _read_gif_sub_blocks(file_obj: BinaryIO, keep_lengths: bool, skip: bool = False) -> bytes:
+    """Read GIF data sub-blocks up to their terminator, keeping at most `MAX_TEXT_BYTES` of them.
+
+    Arguments:
+        file_obj: binary file positioned at the length of the first sub-block
+        keep_lengths: keep the length bytes of the sub-blocks in the data returned
+        skip: seek over the sub-blocks without keeping any of their data
+    Returns: the data of the sub-blocks
+    """
+    data = bytearray()
+    while True:
+        length = file_obj.read(1)
+        if not length:
+            err_msg = "Unexpected end of file in a GIF extension"
+            raise FormatError(err_msg)
+        if length == b"\x00":
+            return bytes(data)
+        if skip or len(data) >= MAX_TEXT_BYTES:
+            file_obj.seek(length[0], 1)
+            continue
+        if keep_lengths:
+            data += length
+        data += file_obj.read(length[0])
+
+
+def read_isobmff_datetime(file_obj: BinaryIO) -> datetime | None:
+    """Read the date taken of a HEIF image from its EXIF item, or the creation time of an MP4 or MOV video."""
+    if read_brands(file_obj) & HEIF_BRANDS:
+        tiff_data = find_heif_exif(file_obj)
+        if tiff_data is None:
+            return None
+        return parse_exif_datetime(read_tiff_datetime_original(file_obj, *tiff_data))
+    return read_movie_creation_time(file_obj)
+
+
+register_format(
+    ImageFormat("JPEG", b"\xff\xd8\xff", 0, (".jpg", ".jpeg", ".jpe", ".jif", ".jfif", ".jfi"), read_jpeg_datetime)
+)
+register_format(ImageFormat("PNG", PNG_SIGNATURE, 0, (".png",), read_png_datetime, read_png_modified_time))
+register_format(ImageFormat("GIF87a", b"GIF87a", 0, (".gif",), read_gif_datetime))
+register_format(ImageFormat("GIF89a", b"GIF89a", 0, (".gif",), read_gif_datetime))
+register_format(ImageFormat("ISO-BMFF", b"ftyp", 4, tuple(HEIF_EXTENSIONS + VIDEO_EXTENSIONS), read_isobmff_datetime))
@@ -1,18 +1,182 @@
 """Image sorting tool tkinter GUI module."""
 
+import collections
 import logging
 import os
 import sys
 import threading
-import time
 import tkinter as tk
+from collections.abc import Callable
 from tkinter import filedialog, messagebox, scrolledtext, ttk
 
 from image_sorting_tool import __version__
-from image_sorting_tool.image_sort import JPEG_EXTENSIONS, ImageSort
+from image_sorting_tool.cache import open_default_cache
+from image_sorting_tool.image_sort import FILE_TYPES, ImageSort
+from image_sorting_tool.reporting import Progress, Reporter
+from image_sorting_tool.transfer import TRANSFER_MODES
 
 logger = logging.getLogger("image-sorting-tool")
 
+PUMP_INTERVAL_MS = 100
+MAX_SCROLLBACK_LINES = 5000
+MAX_PENDING_MESSAGES = 10000
+# Batches with more 'Processed' lines than this are shown as a single summary line
+COLLAPSE_THRESHOLD = 50
+PROGRESS_STEP = 5
+
+
+class TextReporter(Reporter):
+    """Reporter that renders the sorting messages into a tkinter text widget.
+
+    Tk widgets may only be touched from the main thread, so `write` and `clear` just queue the messages.
+    A pump running on the main thread with `after` drains the queue in batches, collapses long runs of
+    per file messages into a summary line, and caps the widget at `max_lines` of scrollback. The pump also
+    renders the latest progress into an optional progress bar and label.
+    """
+
+    def __init__(
+        self,
+        text_widget: tk.Text,
+        progress_bar: ttk.Progressbar | None = None,
+        progress_text: tk.StringVar | None = None,
+        max_lines: int = MAX_SCROLLBACK_LINES,
+    ) -> None:
+        """Initialize TextReporter object and start its pump, must be called from the main thread.
+
+        Arguments:
+            text_widget: read only text widget to display the messages in
+            progress_bar: progress bar showing the fraction of the running phase that is done
+            progress_text: variable of a label showing the progress summary, such as the throughput and ETA
+            max_lines: number of lines kept in the widget, older lines are removed
+        """
+        self.text_widget = text_widget
+        self.progress_bar = progress_bar
+        self.progress_text = progress_text
+        self.max_lines = max_lines
+        self.collapse_threshold = COLLAPSE_THRESHOLD
+        self.pending = collections.deque()  # Queued messages and callbacks, deques are thread-safe
+        self.dropped = 0
+        self.latest_progress = None
+        self.text_widget.after(PUMP_INTERVAL_MS, self.pump)
+
+    def clear(self) -> None:
+        """Queue the removal of all text from the widget."""
+        self.pending.clear()
+        self.pending.append(None)
+
+    def write(self, message: str) -> None:
+        """Queue the message to be appended to the widget.
+
+        Once `MAX_PENDING_MESSAGES` are queued, the per file 'Processed' lines are dropped and only counted,
+        while errors and all other lines are still queued, so they are never lost from the display.
+        """
+        if len(self.pending) >= MAX_PENDING_MESSAGES:
+            lines = message.splitlines(keepends=True)
+            kept = [line for line in lines if not line.startswith("Processed : ")]
+            self.dropped += len(lines) - len(kept)
+            if not kept:
+                return
+            message = "".join(kept)
+        self.pending.append(message)
+
+    def progress(self, progress: Progress) -> None:
+        """Keep the progress to be rendered by the next pump."""
+        self.latest_progress = progress
+
+    def run_on_main_thread(self, callback: Callable[[], None]) -> None:
+        """Queue a callback to be run by the pump, after all messages written before it are rendered.
+
+        Arguments:
+            callback: function that may update widgets, as it runs on the main thread
+        """
+        self.pending.append(callback)
+
+    def pump(self) -> None:
+        """Render all queued messages in one update of the widget, then reschedule itself."""
+        try:
+            if self.latest_progress is not None:
+                self._render_progress(self.latest_progress)
+                self.latest_progress = None
+            if self.pending:
+                self._render()
+            self.text_widget.after(PUMP_INTERVAL_MS, self.pump)
+        except tk.TclError:
+            logger.debug("Text widget destroyed, stopping the reporter pump")
+
+    def _render(self) -> None:
+        """Drain the queued messages into the widget, running queued callbacks in order."""
+        clear = False
+        messages = []
+        while self.pending:
+            item = self.pending.popleft()
+            if item is None:
+                clear, messages = True, []
+            elif callable(item):
+                self._insert(clear, messages)
+                clear, messages = False, []
+                item()
+            else:
+                messages.append(item)
+        self._insert(clear, messages)
+
+    def _insert(self, clear: bool, messages: list[str]) -> None:
+        """Append the messages to the widget in a single insert, trimming the scrollback."""
+        if self.dropped:
+            messages.append(f"Processed {self.dropped} more files, not shown individually\n")
+            self.dropped = 0
+        if not (clear or messages):
+            return
+        text = collapse_processed_lines("".join(messages), self.collapse_threshold)
+
+        self.text_widget.configure(state="normal")  # Make writable
+        if clear:
+            self.text_widget.delete("1.0", tk.END)
+        self.text_widget.insert(tk.END, text)
+        excess_lines = int(self.text_widget.index("end-1c").split(".")[0]) - self.max_lines
+        if excess_lines > 0:
+            self.text_widget.delete("1.0", f"{excess_lines + 1}.0")
+        self.text_widget.yview(tk.END)
+        self.text_widget.configure(state="disabled")  # Read Only
+
+    def _render_progress(self, progress: Progress) -> None:
+        """Show the progress in the progress bar and label."""
+        if self.progress_text is not None:
+            self.progress_text.set(progress.summary())
+        if self.progress_bar is not None:
+            fraction = progress.fraction_done
+            if fraction is None:
+                # The amount of work is not known yet, so only show that something is happening
+                self.progress_bar.configure(mode="indeterminate")
+                self.progress_bar.step(PROGRESS_STEP)
+            else:
+                self.progress_bar.configure(mode="determinate", value=fraction * 100)
+
+
+def collapse_processed_lines(text: str, threshold: int) -> str:
+    """Replace runs of more than `threshold` 'Processed' lines with a summary line, keeping all other lines.
+
+    Arguments:
+        text: newline separated messages
+        threshold: longest run of 'Processed' lines to show in full
+    Returns: the text with long runs of 'Processed' lines collapsed
+    """
+    lines = text.splitlines(keepends=True)
+    if sum(line.startswith("Processed : ") for line in lines) <= threshold:
+        return text
+    collapsed = []
+    processed = 0
+    for line in lines:
+        if line.startswith("Processed : "):
+            processed += 1
+            continue
+        if processed:
+            collapsed.append(f"Processed {processed} files\n")
+            processed = 0
+        collapsed.append(line)
+    if processed:
+        collapsed.append(f"Processed {processed} files\n")
+    return "".join(collapsed)
+
 
 class GUI(tk.Tk):
     """Tkinter GUI object."""
@@ -33,8 +197,12 @@ class GUI(tk.Tk):
         self.png_sort = tk.IntVar()
         self.gif_sort = tk.IntVar()
         self.mp4_sort = tk.IntVar()
+        self.heic_sort = tk.IntVar()
         self.rename_duplicates = tk.IntVar()
         self.copy_other_files = tk.IntVar()
+        self.skip_identical = tk.IntVar()
+        self.resume = tk.IntVar()
+        self.transfer_mode = tk.StringVar(value="copy")
         self.textbox_width = 100
         self.scroll_width = 100
         self.scroll_height = 40
@@ -59,7 +227,8 @@ class GUI(tk.Tk):
         source_dir_row = 5
         description_dir_row = 6
         button_row = 7
-        scroll_text_row = 8
+        progress_row = 8
+        scroll_text_row = 9
 
         # Allow middle column to grow when window is resized
         self.columnconfigure(1, weight=1, minsize=self.textbox_width * 5)
@@ -133,6 +302,15 @@ class GUI(tk.Tk):
         )
         mp4_checkbox.pack(anchor="w")
 
+        # Checkbox for HEIC
+        heic_checkbox = ttk.Checkbutton(
+            file_type_options_frame,
+            text="HEIC: Default photo format of iPhones",
+            variable=self.heic_sort,
+            state="normal",
+        )
+        heic_checkbox.pack(anchor="w")
+
         # Extra options frame
         extra_options_frame = ttk.LabelFrame(self, text="Extra Options:")
         extra_options_frame.grid(column=1, row=extra_options_row, sticky="EW")
@@ -163,6 +341,43 @@ class GUI(tk.Tk):
         )
         unsortable_checkbox.pack(anchor="w")
 
+        # Checkbox for skipping files with identical contents
+        identical_checkbox_text = (
+            "Only sort one copy of identical files (compares file contents, files with duplicate 'date taken' "
+            "times that differ are then always renamed)"
+        )
+        identical_checkbox = ttk.Checkbutton(
+            extra_options_frame,
+            text=identical_checkbox_text,
+            variable=self.skip_identical,
+            state="normal",
+        )
+        identical_checkbox.pack(anchor="w")
+
+        # Checkbox for resuming an interrupted sort
+        resume_checkbox = ttk.Checkbutton(
+            extra_options_frame,
+            text="Resume an interrupted sort into the same output folder, skipping files it already sorted",
+            variable=self.resume,
+            state="normal",
+        )
+        resume_checkbox.pack(anchor="w")
+
+        # Dropdown for how files are transferred into the output folder
+        transfer_mode_frame = ttk.Frame(extra_options_frame)
+        transfer_mode_frame.pack(anchor="w")
+        ttk.Label(
+            transfer_mode_frame,
+            text="Transfer mode (hardlink, reflink, move and symlink avoid copying data on the same drive):",
+        ).pack(side="left")
+        ttk.Combobox(
+            transfer_mode_frame,
+            textvariable=self.transfer_mode,
+            values=TRANSFER_MODES,
+            state="readonly",
+            width=10,
+        ).pack(side="left", padx=5)
+
         # Source Directory Widgets
         ttk.Label(self, text="Input Folder").grid(column=0, row=source_dir_row, padx=5, sticky="W")
         self.source_textbox = ttk.Entry(self, textvariable=self.source_dir_var, width=self.textbox_width)
@@ -195,6 +410,12 @@ class GUI(tk.Tk):
         quit_button = ttk.Button(self, text="Quit", command=self._quit)
         quit_button.grid(column=0, row=button_row, padx=5, pady=5, sticky="EW")
 
+        # Progress bar and summary of the running phase
+        self.progress_text = tk.StringVar()
+        self.progress_bar = ttk.Progressbar(self, mode="determinate", maximum=100)
+        self.progress_bar.grid(column=0, row=progress_row, columnspan=2, padx=5, pady=(0, 5), sticky="EW")
+        ttk.Label(self, textvariable=self.progress_text).grid(column=2, row=progress_row, padx=5, sticky="W")
+
         # Scrolled Text Widget
         self.scroll = scrolledtext.ScrolledText(self, width=self.scroll_width, height=self.scroll_height, wrap=tk.WORD)
         self.scroll.grid(
@@ -211,18 +432,21 @@ class GUI(tk.Tk):
             ('Welcome, Enter a source and destination directory, then click "Analyse Source Directory"\n',),
         )
         self.scroll.configure(state="disabled")  # Read Only
+        self.reporter = TextReporter(self.scroll, self.progress_bar, self.progress_text)
 
     def get_extensions_to_sort(self) -> None:
         """Checks the state of all the file type checkboxes and updates the list accordingly."""
         self.ext_to_sort = []
         if self.jpeg_sort.get():
-            self.ext_to_sort.extend(JPEG_EXTENSIONS)
+            self.ext_to_sort.extend(FILE_TYPES["jpeg"])
         if self.png_sort.get():
-            self.ext_to_sort.append(".png")
+            self.ext_to_sort.extend(FILE_TYPES["png"])
         if self.gif_sort.get():
-            self.ext_to_sort.append(".gif")
+            self.ext_to_sort.extend(FILE_TYPES["gif"])
         if self.mp4_sort.get():
-            self.ext_to_sort.append(".mp4")
+            self.ext_to_sort.extend(FILE_TYPES["mp4"])
+        if self.heic_sort.get():
+            self.ext_to_sort.extend(FILE_TYPES["heic"])
         logger.debug("Extensions to sort: %s", self.ext_to_sort)
 
     def find_images(self) -> None:
@@ -234,8 +458,8 @@ class GUI(tk.Tk):
             self.after(100, self._find_images)
 
     def _find_images(self) -> None:
-        """Run the image finding function from the image sorting tool."""
-        self.sorting_tool = ImageSort(self.source_dir_var.get(), self.destination_dir_var.get(), self.scroll)
+        """Run the image finding function from the image sorting tool in a seperate thread."""
+        self.sorting_tool = ImageSort(self.source_dir_var.get(), self.destination_dir_var.get(), self.reporter)
         self.sorting_tool.ext_to_sort = self.ext_to_sort
         if self.copy_other_files.get():
             logger.info("Copy 'other files' has been selected")
@@ -243,9 +467,33 @@ class GUI(tk.Tk):
         if self.rename_duplicates.get():
             logger.info("Rename duplicates has been selected")
             self.sorting_tool.rename_duplicates = True
-        self.sorting_tool.find_images()
-        self.find_button.config(text="Finished Analysing Input Folder", state="normal")
-        self.find_flag = True
+        if self.skip_identical.get():
+            logger.info("Skip identical files has been selected")
+            self.sorting_tool.skip_identical = True
+        threading.Thread(target=self._run_find_images, daemon=True).start()
+
+    def _run_find_images(self) -> None:
+        """Analyse the source directory, runs on a background thread so the GUI keeps responding."""
+        succeeded = False
+        self.sorting_tool.metadata_cache = open_default_cache()
+        try:
+            self.sorting_tool.find_images()
+            succeeded = True
+        except Exception as error:
+            logger.exception("Analysing the input folder failed")
+            self.reporter.write(f"\nERROR analysing the input folder: {error}\n")
+        finally:
+            if self.sorting_tool.metadata_cache is not None:
+                self.sorting_tool.metadata_cache.close()
+            self.reporter.run_on_main_thread(lambda: self._find_images_complete(succeeded))
+
+    def _find_images_complete(self, succeeded: bool) -> None:
+        """Update the buttons once analysing has finished, runs on the main thread."""
+        if succeeded:
+            self.find_button.config(text="Finished Analysing Input Folder", state="normal")
+            self.find_flag = True
+        else:
+            self.find_button.config(text="Analyse Source Directory", state="normal")
         self.enable_buttons()
 
     def sort_images(self) -> None:
@@ -253,29 +501,37 @@ class GUI(tk.Tk):
         logger.debug("Sorting has been called from GUI")
         if self.assert_paths_are_valid():
             self.sorting_tool.destination_dir = self.destination_dir_var.get()
+            self.sorting_tool.transfer_mode = self.transfer_mode.get()
+            self.sorting_tool.resume = bool(self.resume.get())
+            if self.sorting_tool.transfer_mode == "move":
+                if not messagebox.askokcancel(
+                    "Move Files",
+                    "Moving removes the sorted files from the input folder.\nDo you want to continue?",
+                    icon=messagebox.WARNING,
+                ):
+                    logger.info("Moving the files was cancelled")
+                    return
+                logger.info("Move has been selected, files will be removed from the input folder")
             self.start_button.config(text="Processing", state="disabled")
             self.find_button.config(state="disabled")
             self.after(100, self._sort_images)
 
     def _sort_images(self) -> None:
         """Run the image sorting tool in a seperate thread so the GUI will continue functioning."""
-        threading.Thread(target=self.sorting_tool.run_parallel_sorting, daemon=True).start()
-        threading.Thread(target=self._reset_buttons, daemon=True).start()
+        threading.Thread(
+            target=self.sorting_tool.run_parallel_sorting,
+            kwargs={"on_complete": lambda: self.reporter.run_on_main_thread(self._reset_buttons)},
+            daemon=True,
+        ).start()
 
     def _reset_buttons(self) -> None:
-        """Waits for sorting process to finish and then reactivates the start button and prints.
+        """Reactivate the start button and print a message to the text window once sorting has finished.
 
-        A message to the text window.
+        Called on the main thread as soon as the sorting thread signals completion.
         """
-        while not self.sorting_tool.sorting_complete:
-            time.sleep(1)
-        # Sorting has finished, display message to GUI
         self.start_button.config(text="Finished Sorting!", state="normal")
         self.find_button.config(state="normal")
-        self.scroll.configure(state="normal")  # Make writable
-        self.scroll.insert(tk.INSERT, "<<<<< SORTING FINISHED >>>>>\n")
-        self.scroll.yview(tk.END)
-        self.scroll.configure(state="disabled")  # Read Only
+        self.reporter.write("<<<<< SORTING FINISHED >>>>>\n")
 
     def _quit(self) -> None:
         """Quit the program."""
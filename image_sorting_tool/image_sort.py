@@ -1,25 +1,82 @@
 """Image sorting tool code that performs the parallel sorting operation."""
 
+import collections
+import contextlib
+import functools
 import logging
 import multiprocessing
+import multiprocessing.pool
 import os
-import shutil
 import threading
 import time
-import tkinter as tk
+from collections.abc import Callable, Iterable, Iterator
 from datetime import datetime
 
-from dateutil import parser
 from PIL import Image
 
+from image_sorting_tool.autotune import MAX_IO_WORKERS, WorkerTuner, candidate_counts
+from image_sorting_tool.cache import MetadataCache, datetime_to_seconds
+from image_sorting_tool.dedup import find_identical_files
+from image_sorting_tool.devices import copy_concurrency
+from image_sorting_tool.exif import DATETIME_ORIGINAL, ExifError, read_jpeg_datetime_original
+from image_sorting_tool.file_index import (
+    CATEGORY_FAILED,
+    CATEGORY_OTHER,
+    CATEGORY_SORT,
+    FLAG_DUPLICATE,
+    FLAG_IDENTICAL,
+    FLAG_SORT,
+    NO_VALUE,
+    FileIndex,
+    FileView,
+    format_sorted_filename,
+)
+from image_sorting_tool.filename_dates import default_parser, register_patterns
+from image_sorting_tool.formats import metadata_extensions, read_metadata_datetime, read_modified_datetime
+from image_sorting_tool.instrumentation import RunInstrumentation
+from image_sorting_tool.isobmff import HEIF_EXTENSIONS, VIDEO_EXTENSIONS, read_mp4_creation_time
+from image_sorting_tool.journal import JOURNAL_FILENAME, SortJournal
+from image_sorting_tool.reporting import Progress, Reporter
+from image_sorting_tool.transfer import CopyOptions, create_folders, transfer_file
+
 JPEG_EXTENSIONS = [".jpg", ".jpeg", ".jif", ".jpe", ".jfif", ".jfi", ".jp2", ".jpx"]
-MAX_DATETIME_DIGITS = 14
+# Extensions selected by each of the file type options in the GUI and CLI
+FILE_TYPES = {
+    "jpeg": JPEG_EXTENSIONS,
+    "png": [".png"],
+    "gif": [".gif"],
+    "mp4": [".mp4"],
+    "heic": HEIF_EXTENSIONS,
+}
+# Files per task sent to the extraction workers, large enough to amortise the IPC of each task but small
+# enough that workers start while the source directory is still being searched
+EXTRACT_CHUNKSIZE = 16
+# Files per task sent to the copy workers, each chunk of results returns in one message
+COPY_CHUNKSIZE = 8
 
 logger = logging.getLogger("image-sorting-tool")
 
 
 class File:
-    """File class for custom file metadata."""
+    """File class for custom file metadata.
+
+    This is a standalone record of a single file, such as one being analysed by a worker. The files found by
+    `ImageSort` are stored in a `FileIndex`, which returns `FileView` objects with the same attributes.
+    """
+
+    __slots__ = (
+        "datetime",
+        "destination_relative_path",
+        "duplicate_idx",
+        "extension",
+        "filename",
+        "fullpath",
+        "inode",
+        "mtime_ns",
+        "size",
+        "sort_flag",
+        "sorted_filename",
+    )
 
     def __init__(self, fullpath: str) -> None:
         """Initialize File object."""
@@ -31,6 +88,26 @@ class File:
         self.sorted_filename = None
         self.duplicate_idx = None
         self.sort_flag = False  # only sort this file if True
+        # Identity of the file contents, only populated when the metadata cache is in use
+        self.size = None
+        self.mtime_ns = None
+        self.inode = None
+
+    @classmethod
+    def from_view(cls, view: FileView) -> "File":
+        """Return a standalone copy of a row of a `FileIndex`, such as to hand to a thread while the index changes.
+
+        Arguments:
+            view: categorised row of the index
+        """
+        input_file = cls(view.fullpath)
+        input_file.datetime = view.datetime
+        input_file.destination_relative_path = view.destination_relative_path
+        input_file.sorted_filename = view.sorted_filename
+        input_file.duplicate_idx = view.duplicate_idx
+        input_file.sort_flag = view.sort_flag
+        input_file.size, input_file.mtime_ns, input_file.inode = view.size, view.mtime_ns, view.inode
+        return input_file
 
     def __repr__(self) -> str:
         """String to generate when __repr__ or __str__ methods are called."""
@@ -39,6 +116,13 @@ class File:
             f"'{self.destination_relative_path}', '{self.sorted_filename}', {self.duplicate_idx})"
         )
 
+    def read_stat(self) -> None:
+        """Populate the size, modification time and inode of the file from the filesystem."""
+        stat_result = os.stat(self.fullpath)
+        self.size = stat_result.st_size
+        self.mtime_ns = stat_result.st_mtime_ns
+        self.inode = stat_result.st_ino
+
     def generate_output_filename(self, sort_filename: bool) -> None:
         """Generate the output filename.
 
@@ -46,11 +130,7 @@ class File:
             sort_filename: if filename should be modified to the sorting structure or not
         """
         if sort_filename:
-            self.sorted_filename = (
-                f"{self.datetime.year:0>4}{self.datetime.month:0>2}{self.datetime.day:0>2}"
-                f"_{self.datetime.hour:0>2}{self.datetime.minute:0>2}{self.datetime.second:0>2}"
-                f"{self.extension}"
-            )
+            self.sorted_filename = format_sorted_filename(self.datetime, self.extension)
         else:
             self.sorted_filename = self.filename
 
@@ -68,182 +148,388 @@ class File:
 class ImageSort:
     """Image sorting tool."""
 
-    def __init__(self, source_dir: str, destination_dir: str, tk_text_object: object) -> None:
-        """Initialize ImageSort object."""
+    def __init__(self, source_dir: str, destination_dir: str, reporter: Reporter | None = None) -> None:
+        """Initialize ImageSort object.
+
+        Arguments:
+            source_dir: the folder to search for files to sort
+            destination_dir: the output folder to copy the sorted files into
+            reporter: receives the user facing progress messages, they are discarded if not provided
+        """
         self.source_dir = source_dir
         self.destination_dir = destination_dir
-        self.tk_text_object = tk_text_object
-        self.threads_to_use = max(1, int(multiprocessing.cpu_count() / 2))
-        self.manager = multiprocessing.Manager()
-        self.message_queue = self.manager.Queue()
-        threading.Thread(target=self.read_queue, daemon=True).start()
-        self.files_list = []  # Master list of files
-        self.sort_list = []  # Index positions of self.files_list
-        self.other_list = []  # Index positions of self.files_list
-        self.failed_list = []  # Index positions of self.files_list
-        self.duplicates_list = []  # Index positions of self.files_list
+        self.reporter = reporter if reporter is not None else Reporter()
+        self.threads_to_use = max(1, int(multiprocessing.cpu_count() / 2))  # Datetime extraction processes
+        self.copy_workers = None  # Files copied in parallel, chosen from the kind of storage devices if None
+        self.chunksize = EXTRACT_CHUNKSIZE
+        self.files_list = FileIndex()  # Master index of files, indexing it returns a File like view of a row
         self.ext_to_sort = []
         self.rename_duplicates = False
         self.copy_unsorted = False
+        self.skip_identical = False  # Only sort one copy of files with identical contents
+        self.metadata_cache = None  # Optional MetadataCache to reuse datetimes from previous runs
+        self.transfer_mode = "copy"  # One of transfer.TRANSFER_MODES
+        self.fsync_policy = "none"  # When copies are synced to the disk, one of transfer.FSYNC_POLICIES
+        self.preserve_times = False  # Copies keep the access and modification times of their source
+        self.resume = False  # Skip the files an interrupted run already transferred, according to its journal
+        self.journal_filename = JOURNAL_FILENAME  # Runs sorting into one output folder at once need their own
+        self.instrumentation = None  # Optional RunInstrumentation timing the phases and files of a run
+        self.autotune = False  # Tune the workers of each phase from their throughput, instead of the fixed counts
+        self.folder_filter = None  # Optional function of a folder path, only files in folders it accepts are found
         self.sorting_complete = False
+        self.sorting_done = threading.Event()
+
+    @property
+    def sort_list(self) -> list[int]:
+        """Index positions of self.files_list that will be sorted into the dated folders."""
+        return self.files_list.rows(CATEGORY_SORT)
+
+    @property
+    def failed_list(self) -> list[int]:
+        """Index positions of self.files_list with a requested extension but without a datetime."""
+        return self.files_list.rows(CATEGORY_FAILED)
+
+    @property
+    def other_list(self) -> list[int]:
+        """Index positions of self.files_list not matching the requested extensions."""
+        return self.files_list.rows(CATEGORY_OTHER)
+
+    @property
+    def duplicates_list(self) -> list[int]:
+        """Index positions of self.files_list sharing their datetime with another sorted file."""
+        return self.files_list.rows(flag=FLAG_DUPLICATE)
+
+    @property
+    def identical_list(self) -> list[int]:
+        """Index positions of self.files_list skipped as identical copies of other files."""
+        return self.files_list.rows(flag=FLAG_IDENTICAL)
 
     def find_images(self) -> None:
         """The image finding function.
 
         Searches for all `self.ext_to_sort` in the source directory, including all subfolders.
         Returns a log message of the number of images found as well as storing the paths for later.
+
+        Finding and datetime extraction run as a stream, so files are analysed while the rest of the source
+        directory is still being searched. Categorisation then runs as passes over the whole index.
+        """
+        self.analyse_files()
+        self.categorize_found_files()
+
+    def analyse_files(self) -> None:
+        """Search the source directory and extract the datetime of every file found, into a new index.
+
+        Only files in the folders accepted by `self.folder_filter` are added, if it is set.
         """
-        # Clear the category lists in case they were populated from a previous run
-        self.sort_list = []
-        self.other_list = []
-        self.failed_list = []
-        self.duplicates_list = []
-
-        self._find_files()
-        self._extract_datetimes()
-        duplicate_hashmap = self._categorize_files()
-        self._process_duplicates(duplicate_hashmap)
+        # Clear the index in case it was populated from a previous run
+        self.files_list = FileIndex()
+
+        self.reporter.clear()
+        self.reporter.write("Searching the input folder and analysing the files found...\n")
+        progress = Progress("Analysing")
+        with self._phase("search_and_analyse"):
+            found_files = self._scan_new_files()
+            if self.instrumentation is not None:
+                found_files = self.instrumentation.time_iterator("search", found_files)
+            for _ in self._stream_datetimes(found_files):
+                progress.update()
+                if progress.report_due():
+                    self.reporter.progress(progress)
+        self.reporter.progress(progress)
+        logger.info("Found %i files in %s", len(self.files_list), self.source_dir)
+        self.reporter.write(f"Found {len(self.files_list)} files in the input folder.\n")
+
+    def categorize_found_files(self) -> None:
+        """Categorise the analysed files of self.files_list, then skip identical copies and number duplicates."""
+        with self._phase("categorize"):
+            self._categorize_files()
+        if self.skip_identical:
+            self.reporter.write("Comparing the contents of files to find identical copies...\n")
+            with self._phase("identical_files"):
+                self._skip_identical_files()
+        with self._phase("duplicates"):
+            self._process_duplicates()
         self._log_find_stats()
-        self._update_gui_after_find()
+        self._report_find_results()
+
+    def _phase(self, name: str) -> contextlib.AbstractContextManager:
+        """Return a context manager timing a phase of the run if it is instrumented."""
+        if self.instrumentation is None:
+            return contextlib.nullcontext()
+        return self.instrumentation.phase(name)
 
     def _extract_datetimes(self) -> None:
         """Extract datetimes for all found files using multiprocessing."""
-        logger.info("Extracting datetimes in a process pool")
-        with multiprocessing.Pool(processes=self.threads_to_use) as pool:
-            self.files_list = pool.map(self.get_datetime, self.files_list)
-        logger.debug(
-            "Extracted datetimes :\n%s\n",
-            "\n".join([f"{i.fullpath}:{i.datetime}" for i in self.files_list]),
-        )
+        for _ in self._stream_datetimes(enumerate(self.files_list)):
+            pass
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Extracted datetimes :\n%s\n",
+                "\n".join([f"{i.fullpath}:{i.datetime}" for i in self.files_list]),
+            )
+
+    def _stream_datetimes(self, indexed_files: Iterable[tuple[int, FileView]]) -> Iterator[int]:
+        """Extract the datetimes of files as they are produced, yielding each file once its datetime is set.
 
-    def _categorize_files(self) -> dict:
-        """Categorize files into sortable, failed, or other, and return duplicate counts."""
-        duplicate_hashmap = {}
-        for index, input_file in enumerate(self.files_list):
-            requested_sort = input_file.extension.lower().endswith(tuple(self.ext_to_sort))
-            if input_file.datetime and requested_sort:
-                duplicate_hashmap[input_file.datetime] = duplicate_hashmap.get(input_file.datetime, 0) + 1
-                input_file.generate_output_filename(sort_filename=True)
-                input_file.destination_relative_path = os.path.join(
-                    str(input_file.datetime.year).zfill(4),
-                    str(input_file.datetime.month).zfill(2),
-                )
-                self.sort_list.append(index)
-                input_file.sort_flag = True
-            elif (not input_file.datetime) and requested_sort:
-                input_file.generate_output_filename(sort_filename=False)
-                input_file.destination_relative_path = "failed_to_sort"
-                self.failed_list.append(index)
-                input_file.sort_flag = True
+        Files in the metadata cache and files that only need their name parsing are resolved by the thread
+        feeding the process pool, so only files that need opening are sent to the workers. Workers only
+        receive the index position and path of each file, and return the datetime as epoch seconds. If the run is
+        instrumented, workers also return the seconds they took to extract each datetime.
+
+        Arguments:
+            indexed_files: index positions and File objects of self.files_list, may be a lazy generator
+        Returns: generator of the index positions of self.files_list in the order they are resolved
+        """
+        if self.metadata_cache is not None:
+            self.metadata_cache.load(self.source_dir)
+        resolved = collections.deque()  # Index positions resolved by the feeder thread, deques are thread-safe
+        tuner = None
+        if self.autotune:
+            tuner = WorkerTuner(
+                "datetime extraction", candidate_counts(multiprocessing.cpu_count()), per_worker=self.chunksize
+            )
+
+        def paths_for_workers() -> Iterator[tuple[int, str]]:
+            for index, input_file in indexed_files:
+                if self.resolve_datetime_locally(input_file):
+                    resolved.append(index)
+                else:
+                    if tuner is not None:
+                        tuner.acquire()
+                    yield index, input_file.fullpath
+
+        with (
+            multiprocessing.Pool(
+                processes=self.threads_to_use if tuner is None else tuner.max_workers,
+                initializer=register_patterns,
+                initargs=(default_parser.user_patterns,),
+            ) as pool,
+            contextlib.closing(tuner) if tuner is not None else contextlib.nullcontext(),
+        ):
+            worker = self._get_indexed_seconds if self.instrumentation is None else self._time_indexed_seconds
+            results = pool.imap_unordered(worker, paths_for_workers(), chunksize=self.chunksize)
+            for index, seconds, *elapsed in results:
+                if tuner is not None:
+                    tuner.release()
+                self.files_list.datetimes[index] = NO_VALUE if seconds is None else seconds
+                if elapsed:
+                    self.instrumentation.record("get_datetime", self.files_list.fullpath(index), elapsed[0])
+                input_file = self.files_list[index]
+                if self.metadata_cache is not None and input_file.size is not None:
+                    self.metadata_cache.store(input_file)
+                while resolved:
+                    yield resolved.popleft()
+                yield index
+        while resolved:
+            yield resolved.popleft()
+
+        if self.metadata_cache is not None:
+            logger.info("Reused %i cached datetimes", self.metadata_cache.hits)
+            self.metadata_cache.save()
+
+    def resolve_datetime_locally(self, input_file: FileView) -> bool:
+        """Set the datetime of a file if it is cached or can be parsed from the filename.
+
+        Returns: True if the datetime was set, False if the file needs to be opened by a worker
+        """
+        if self.metadata_cache is not None:
+            try:
+                if input_file.size is None:
+                    input_file.read_stat()
+            except OSError as error:
+                logger.warning("Failed to stat %s: %s", input_file.fullpath, error)
             else:
-                input_file.generate_output_filename(sort_filename=False)
-                input_file.destination_relative_path = "other_files"
-                self.other_list.append(index)
-                if self.copy_unsorted:
-                    input_file.sort_flag = True
-        return duplicate_hashmap
-
-    def _process_duplicates(self, duplicate_hashmap: dict) -> None:
-        """Identify duplicate datetimes and update filenames if requested."""
-        duplicate_idx_hashmap = {}
-        for index in self.sort_list:
-            input_file = self.files_list[index]
-            if duplicate_hashmap.get(input_file.datetime, 0) > 1:
-                self.duplicates_list.append(index)
-                duplicate_idx_hashmap[input_file.datetime] = duplicate_idx_hashmap.get(input_file.datetime, 0) + 1
-                input_file.duplicate_idx = duplicate_idx_hashmap[input_file.datetime]
-                if self.rename_duplicates:
-                    input_file.update_filename_with_duplicate_postfix()
+                cached, input_file.datetime = self.metadata_cache.lookup(input_file)
+                if cached:
+                    return True
+        extension = input_file.extension.lower()
+        if extension.endswith(tuple(JPEG_EXTENSIONS)):
+            return False
+        if extension.endswith(metadata_extensions()) and not extension.endswith(tuple(VIDEO_EXTENSIONS)):
+            # PNG, GIF and HEIC files have their metadata read first, which is left to the workers
+            return False
+        # Files without EXIF data only need their name parsing, which is cheaper than sending them to a worker
+        start = time.perf_counter()
+        if extension.endswith(tuple(VIDEO_EXTENSIONS)):
+            # Videos not following a naming scheme need their headers reading, which is left to the workers
+            try:
+                input_file.datetime = self._get_datetime_from_filename(input_file.fullpath, fallback=False)
+            except ValueError:
+                return False
+        else:
+            self.get_datetime(input_file)
+        if self.instrumentation is not None:
+            self.instrumentation.record("parse_filename", input_file.fullpath, time.perf_counter() - start)
+        if self.metadata_cache is not None and input_file.size is not None:
+            self.metadata_cache.store(input_file)
+        return True
 
-    def _log_find_stats(self) -> None:
-        """Log statistics about the categorized files."""
-        logger.info("Found %i files to sort in %s", len(self.sort_list), self.source_dir)
-        logger.debug(
-            "Sortable files :\n%s\n",
-            "\n".join([i.fullpath for i in [self.files_list[j] for j in self.sort_list]]),
-        )
-        logger.info("Found %i files that will Fail to sort in %s", len(self.failed_list), self.source_dir)
-        logger.debug(
-            "Failed sorting files : \n%s\n",
-            "\n".join([i.fullpath for i in [self.files_list[j] for j in self.failed_list]]),
-        )
-        logger.info("Found %i files not matching sort options in %s", len(self.other_list), self.source_dir)
-        logger.debug(
-            "Sortable files not matching sort options :\n%s\n",
-            "\n".join([i.fullpath for i in [self.files_list[j] for j in self.other_list]]),
-        )
-        logger.info("Found %i files with duplicate timestamps in %s", len(self.duplicates_list), self.source_dir)
-        logger.debug(
-            "Duplicate timestamp files : \n%s\n",
-            "\n".join(
-                [
-                    f"{i.fullpath}:{i.datetime} idx_{i.duplicate_idx}"
-                    for i in [self.files_list[j] for j in self.duplicates_list]
-                ]
-            ),
+    @staticmethod
+    def _get_indexed_seconds(indexed_path: tuple[int, str]) -> tuple[int, int | None]:
+        """Worker function that extracts the datetime of a file while keeping track of its index position.
+
+        Returns: tuple of the index position, and the datetime as epoch seconds or None if it failed
+        """
+        index, path = indexed_path
+        dtime = ImageSort.get_datetime(File(path)).datetime
+        return index, None if dtime is None else datetime_to_seconds(dtime)
+
+    @staticmethod
+    def _time_indexed_seconds(indexed_path: tuple[int, str]) -> tuple[int, int | None, float]:
+        """Worker function like `_get_indexed_seconds`, that also returns the seconds taken to extract the datetime."""
+        start = time.perf_counter()
+        index, seconds = ImageSort._get_indexed_seconds(indexed_path)
+        return index, seconds, time.perf_counter() - start
+
+    def _categorize_files(self) -> None:
+        """Categorize all files into sortable, failed, or other, setting which of them will be transferred."""
+        self.files_list.categorize(self.ext_to_sort, self.copy_unsorted)
+
+    def _skip_identical_files(self) -> None:
+        """Stop all but one copy of files with identical contents from being sorted.
+
+        The copy kept is the one that sorts best, preferring a file with a datetime over one that fails to
+        sort, and then the first by path.
+        """
+        to_sort = self.files_list.rows(flag=FLAG_SORT)
+        categories = self.files_list.categories
+
+        def preference(index: int) -> tuple[int, str]:
+            return categories[index], self.files_list.fullpath(index)
+
+        tuner = WorkerTuner("hashing", candidate_counts(MAX_IO_WORKERS)) if self.autotune else None
+        groups = find_identical_files(
+            [self.files_list[index] for index in to_sort],
+            metadata_cache=self.metadata_cache,
+            tuner=tuner,
         )
+        for group in groups:
+            self.files_list.skip_identical(sorted((to_sort[position] for position in group), key=preference)[1:])
+        if self.metadata_cache is not None:
+            self.metadata_cache.save()
+
+    def _process_duplicates(self) -> None:
+        """Identify duplicate datetimes and update filenames if requested.
+
+        Duplicates are numbered in order of their path, so the numbering does not depend on the order
+        the files were found and analysed in. Once identical copies have been skipped, the remaining
+        duplicates are known to be different shots taken in the same second, so they are always renamed.
+        """
+        self.files_list.number_duplicates(rename=self.rename_duplicates or self.skip_identical)
 
-    def _update_gui_after_find(self) -> None:
-        """Update the GUI text object with find results."""
-        if self.tk_text_object is None:
-            return
+    def _log_find_stats(self) -> None:
+        """Log statistics about the categorized files."""
+        debug = logger.isEnabledFor(logging.DEBUG)
+        for description, rows in (
+            ("files to sort", self.sort_list),
+            ("files that will Fail to sort", self.failed_list),
+            ("files not matching sort options", self.other_list),
+            ("identical copies of other files", self.identical_list),
+        ):
+            logger.info("Found %i %s in %s", len(rows), description, self.source_dir)
+            if debug:
+                logger.debug("%s :\n%s\n", description, "\n".join([self.files_list.fullpath(j) for j in rows]))
+        duplicates = self.duplicates_list
+        logger.info("Found %i files with duplicate timestamps in %s", len(duplicates), self.source_dir)
+        if debug:
+            logger.debug(
+                "Duplicate timestamp files : \n%s\n",
+                "\n".join(
+                    [
+                        f"{i.fullpath}:{i.datetime} idx_{i.duplicate_idx}"
+                        for i in [self.files_list[j] for j in duplicates]
+                    ]
+                ),
+            )
 
-        self.tk_text_object.configure(state="normal")  # Make writable
-        self.tk_text_object.insert(
-            tk.INSERT,
-            f"\nFound {len(self.sort_list)} images/videos meeting the above criteria "
+    def _report_find_results(self) -> None:
+        """Report the find results to the user."""
+        sort_count, failed_count, other_count = len(self.sort_list), len(self.failed_list), len(self.other_list)
+        identical_count, duplicates_count = len(self.identical_list), len(self.duplicates_list)
+        self.reporter.write(
+            f"\nFound {sort_count} images/videos meeting the above criteria "
             f"that will successfully sort in {self.source_dir}\n",
         )
 
-        if self.failed_list:
-            self.tk_text_object.insert(
-                tk.INSERT,
-                f"\nWARNING: Found {len(self.failed_list)} files meeting the above criteria that won't be sorted "
+        if failed_count:
+            self.reporter.write(
+                f"\nWARNING: Found {failed_count} files meeting the above criteria that won't be sorted "
                 "due to no date-taken data being available, "
                 "these files will go into a 'failed_to_sort' folder during sorting\n",
             )
 
-        if self.other_list:
-            self.tk_text_object.insert(
-                tk.INSERT,
-                f"\nWARNING: Found {len(self.other_list)} files that won't be sorted (videos, docs, etc), "
+        if other_count:
+            self.reporter.write(
+                f"\nWARNING: Found {other_count} files that won't be sorted (videos, docs, etc), "
                 "tick the 'Copy all other files' box above "
                 "if you want them copied to the destination "
                 "folder during sorting\n",
             )
 
-        if self.duplicates_list:
-            duplicate_ratio = len(self.duplicates_list) / len(self.sort_list)
-            self.tk_text_object.insert(
-                tk.INSERT,
-                f"\nWARNING: Found {len(self.duplicates_list)}({duplicate_ratio:.0%}) files "
+        if identical_count:
+            self.reporter.write(
+                f"\nFound {identical_count} identical copies of other files, only one copy of each will be sorted\n",
+            )
+
+        if duplicates_count and self.skip_identical:
+            self.reporter.write(
+                f"\nFound {duplicates_count} different files with duplicate timestamps, "
+                "they will be renamed so they are all kept.\n",
+            )
+        elif duplicates_count:
+            duplicate_ratio = duplicates_count / sort_count
+            self.reporter.write(
+                f"\nWARNING: Found {duplicates_count}({duplicate_ratio:.0%}) files "
                 "with duplicate timestamps.\n"
                 "You can enable 'Rename' option above to keep all duplicates "
                 " or ignore this warning to filter out all duplicates.\n",
             )
-        self.tk_text_object.insert(tk.INSERT, "\nPress 'Start' to begin sorting them....\n")
-        self.tk_text_object.yview(tk.END)
-        self.tk_text_object.configure(state="disabled")  # Read Only
+        self.reporter.write("\nPress 'Start' to begin sorting them....\n")
 
     def _find_files(self) -> None:
         """Generate a list of files found in the source_dir."""
-        for root_path, __, files in os.walk(self.source_dir):
-            for file_name in files:
-                self.files_list.append(File(os.path.join(root_path, file_name)))
+        self.files_list = FileIndex()
+        for path in self.scan_files():
+            self.files_list.append(path)
 
         # Log info about the number of files found
         logger.info("Found %i files in %s", len(self.files_list), self.source_dir)
-        logger.debug("Found files :\n%s", "\n".join([str(i) for i in self.files_list]))
-        if self.tk_text_object is not None:
-            # Only run if a GUI object is provided
-            self.tk_text_object.configure(state="normal")  # Make writable
-            self.tk_text_object.delete("1.0", tk.END)
-            self.tk_text_object.insert(
-                tk.INSERT,
-                f"Found {len(self.files_list)} files in the input folder. Running analysis on them now...\n",
-            )
-            self.tk_text_object.yview(tk.END)
-            self.tk_text_object.configure(state="disabled")  # Read Only
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Found files :\n%s", "\n".join([str(i) for i in self.files_list]))
+        self.reporter.clear()
+        self.reporter.write(
+            f"Found {len(self.files_list)} files in the input folder. Running analysis on them now...\n",
+        )
+
+    def _scan_new_files(self) -> Iterator[tuple[int, FileView]]:
+        """Append every file found in the source_dir to self.files_list, yielding them as they are found."""
+        for path in self.scan_files():
+            index = self.files_list.append(path)
+            yield index, self.files_list[index]
+
+    def scan_files(self) -> Iterator[str]:
+        """Yield the paths of all files in the source_dir, including all subfolders, as they are found.
+
+        Like `os.walk`, symbolic links to folders are not followed and unreadable folders are skipped. Folders
+        rejected by `self.folder_filter` are still searched for subfolders, but their files are not yielded.
+        """
+        directories = [self.source_dir]
+        while directories:
+            directory = directories.pop()
+            list_files = self.folder_filter is None or self.folder_filter(directory)
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            is_directory = entry.is_dir() and not entry.is_symlink()
+                        except OSError:
+                            is_directory = False
+                        if is_directory:
+                            directories.append(entry.path)
+                        elif list_files:
+                            yield entry.path
+            except OSError as error:
+                logger.warning("Failed to search folder %s: %s", directory, error)
 
     @staticmethod
     def get_datetime(input_file: File) -> File:
@@ -254,9 +540,14 @@ class ImageSort:
         Returns: File object with datetime modified
         """
         try:
-            if input_file.extension.lower().endswith(tuple(JPEG_EXTENSIONS)):
+            extension = input_file.extension.lower()
+            if extension.endswith(tuple(JPEG_EXTENSIONS)):
                 # the file is JPEG so try extract datetime from EXIF
                 input_file.datetime = ImageSort._get_datetime_from_exif(input_file.fullpath)
+            elif extension.endswith(tuple(VIDEO_EXTENSIONS)):
+                input_file.datetime = ImageSort._get_datetime_from_video(input_file.fullpath)
+            elif extension.endswith(metadata_extensions()):
+                input_file.datetime = ImageSort._get_datetime_from_metadata(input_file.fullpath)
             else:
                 input_file.datetime = ImageSort._get_datetime_from_filename(input_file.fullpath)
 
@@ -271,9 +562,22 @@ class ImageSort:
 
     @staticmethod
     def _get_datetime_from_exif(filepath: str) -> object:
-        """Attempt to get the datetime an image was taken from the EXIF data."""
+        """Attempt to get the datetime an image was taken from the EXIF data.
+
+        The EXIF headers are parsed directly, Pillow is only used if they turn out to be malformed.
+        """
         try:
-            date_taken = Image.open(filepath)._getexif()[36867]
+            try:
+                date_taken = read_jpeg_datetime_original(filepath)
+            except ExifError as error:
+                # The file may be another format with the wrong extension, such as a HEIC photo named '.jpg'
+                with contextlib.suppress(ValueError):
+                    dtime = read_metadata_datetime(filepath)
+                    if dtime is not None:
+                        return dtime
+                logger.debug("Parsing EXIF headers of %s failed, retrying with Pillow: %s", filepath, error)
+                with Image.open(filepath) as image:
+                    date_taken = image._getexif()[DATETIME_ORIGINAL]
             dtime = datetime.strptime(date_taken, "%Y:%m:%d %H:%M:%S")
             return dtime
         except (ValueError, TypeError, KeyError, AttributeError, OSError):
@@ -281,80 +585,323 @@ class ImageSort:
             return ImageSort._get_datetime_from_filename(filepath)
 
     @staticmethod
-    def _get_datetime_from_filename(filepath: str) -> object:
-        """Attempt to get the datetime of a file from it's filename."""
-        filename = os.path.split(filepath)[1]
-        # See if the years from 1970-2099 exist in the filename
-        valid_years = [str(year) for year in range(1970, 2100)]
-        in_years = [year in filename for year in valid_years]
-        if sum(in_years) == 0:
-            err_msg = f"No year found in {filename}"
-            raise ValueError(err_msg)
-        # Extract only numbers from the filename
-        filename = os.path.splitext(filename)[0]
-        numbers = [char for char in filename if char.isdigit()]
-        numbers = "".join(numbers)
-        # Truncate to 14 digits (YYYYMMDDHHMMSS) to prevent dateutil OverflowError on burst shots
-        if len(numbers) > MAX_DATETIME_DIGITS:
-            numbers = numbers[:MAX_DATETIME_DIGITS]
-        # Extract datetime from numbers
-        dtime = parser.parse(numbers)
-        return dtime
-
-    def run_parallel_sorting(self) -> None:
-        """Creates a pool of workers and runs the image sorting across multiple threads.
-
-        The pool size is equal to half the number of available threads the machine has.
-        SSD's benifit from multithreading while HDD's will generally be the bottleneck.
+    def _get_datetime_from_video(filepath: str) -> object:
+        """Attempt to get the datetime a video was recorded, from its filename or else its 'moov' header.
+
+        Phones and cameras name most videos after the local time they were recorded, which is cheaper to parse
+        than the headers, so the headers are only read for videos whose name follows no naming scheme, such as
+        'MOV_0001.mp4' or 'IMG_2047.MOV'. Guessing at the digits of such names is left as the last resort, as
+        it would date 'GOPR2015.MP4' to some day of 2015.
+        """
+        try:
+            return ImageSort._get_datetime_from_filename(filepath, fallback=False)
+        except ValueError:
+            pass
+        try:
+            dtime = read_mp4_creation_time(filepath)
+        except (ValueError, OSError) as error:
+            logger.debug("Reading the headers of %s failed: %s", filepath, error)
+            dtime = None
+        if dtime is not None:
+            return dtime
+        try:
+            return ImageSort._get_datetime_from_filename(filepath)
+        except (ValueError, OverflowError) as error:
+            err_msg = f"No datetime in the filename or headers: {error}"
+            raise ValueError(err_msg) from error
+
+    @staticmethod
+    def _get_datetime_from_metadata(filepath: str) -> object:
+        """Attempt to get the datetime an image was taken from its metadata, see `formats`, or else its filename.
+
+        The time the image was last modified, such as the 'tIME' chunk of a PNG, is only used if the filename
+        has no date either, as re-saving a screenshot would otherwise move it to the day it was edited.
+        """
+        try:
+            dtime = read_metadata_datetime(filepath)
+        except (ValueError, OSError) as error:
+            logger.debug("Reading the metadata of %s failed: %s", filepath, error)
+            dtime = None
+        if dtime is not None:
+            return dtime
+        try:
+            return ImageSort._get_datetime_from_filename(filepath)
+        except (ValueError, OverflowError):
+            try:
+                modified = read_modified_datetime(filepath)
+            except (ValueError, OSError) as error:
+                logger.debug("Reading the modification time of %s failed: %s", filepath, error)
+                modified = None
+            if modified is None:
+                raise
+            return modified
+
+    @staticmethod
+    def _get_datetime_from_filename(filepath: str, fallback: bool = True) -> object:
+        """Attempt to get the datetime of a file from it's filename, see `FilenameDateParser.parse`."""
+        return default_parser.parse(filepath, fallback=fallback)
+
+    def run_parallel_sorting(self, on_complete: Callable[[], None] | None = None) -> None:
+        """Creates a pool of threads and runs the image sorting across them.
+
+        Copying is bound by the storage rather than the CPU, so it runs on threads. The number of threads
+        is `self.copy_workers` if set, otherwise it is chosen from the kind of devices the input and output
+        folders are on. SSD's benifit from many parallel copies while HDD's slow down with more than a few.
+        If `self.autotune` is set, the number of threads copying at once is instead tuned from the measured
+        throughput, see `autotune.WorkerTuner`.
+
+        All output folders are created up front, so the copies never need to create folders themselves.
+        The per file messages are passed on to the reporter in batches.
+
+        Every completed transfer is recorded in a journal in the destination folder, until all files have been
+        transferred. If `self.resume` is set, files the journal lists as already transferred are skipped.
+
+        Arguments:
+            on_complete: called when sorting has finished, even if it failed, from the thread running the sort.
+                Waiting on `self.sorting_done` is an alternative for other threads.
         """
         self.sorting_complete = False
+        self.sorting_done.clear()
+        journal = SortJournal(self.destination_dir, filename=self.journal_filename, fsync=self.fsync_policy)
+        tuner = None
+        try:
+            with self._phase("prepare_sort"):
+                to_sort, copy_workers = self._prepare_sort(journal)
+            total_bytes = sum(input_file.size or 0 for input_file in to_sort)
+            progress = Progress("Sorting", total_files=len(to_sort), total_bytes=total_bytes)
+            messages = []
+            failed = 0
+            copy_options = CopyOptions(self.fsync_policy, self.preserve_times)
+            copy, tuner = self._copy_function(copy_options, copy_workers)
+            with self._phase("copy"):
+                with multiprocessing.pool.ThreadPool(processes=copy_workers) as pool:
+                    results = pool.imap_unordered(copy, enumerate(to_sort), chunksize=COPY_CHUNKSIZE)
+                    for index, bytes_copied, message in results:
+                        if bytes_copied is None:
+                            failed += 1
+                        else:
+                            journal.record(to_sort[index], bytes_copied)
+                            if self.instrumentation is not None:
+                                self.instrumentation.add_bytes(read=bytes_copied, written=bytes_copied)
+                        progress.update(bytes_done=bytes_copied or 0)
+                        messages.append(message)
+                        if progress.report_due():
+                            self.reporter.write("".join(messages))
+                            self.reporter.progress(progress)
+                            messages = []
+                self.reporter.write("".join(messages))
+                self.reporter.progress(progress)
+            with self._phase("sync"):
+                copy_options.finish()
+            if failed:
+                logger.info("Keeping the journal so the %i failed files can be retried by resuming", failed)
+            else:
+                journal.remove()
+            logger.info("Sorting Completed")
+        finally:
+            journal.close()
+            if tuner is not None:
+                tuner.close()
+            self.sorting_complete = True
+            self.sorting_done.set()
+            if on_complete is not None:
+                on_complete()
+
+    def _prepare_sort(self, journal: SortJournal) -> tuple[list[FileView], int]:
+        """Select the files to transfer, open the journal and create the output folders.
+
+        Returns: tuple of the files to transfer, and the number of files to copy in parallel
+        """
+        to_sort = [self.files_list[index] for index in self.files_list.rows(flag=FLAG_SORT)]
+        for input_file in to_sort:
+            if input_file.size is None:
+                try:
+                    input_file.read_stat()
+                except OSError:
+                    pass  # Such as a source moved by the interrupted run, its journal entry still identifies it
+        if self.resume:
+            journal.load()
+            remaining = [input_file for input_file in to_sort if not journal.is_complete(input_file)]
+            self.reporter.write(
+                f"Resuming, skipping {len(to_sort) - len(remaining)} files sorted by the interrupted run\n"
+            )
+            to_sort = remaining
+        journal.open(resume=self.resume)
+        if self.copy_workers:
+            copy_workers = self.copy_workers
+        elif self.autotune:
+            copy_workers = MAX_IO_WORKERS
+        else:
+            copy_workers = copy_concurrency(self.source_dir, self.destination_dir)
+        create_folders(
+            self.destination_dir,
+            {input_file.destination_relative_path for input_file in to_sort},
+            workers=copy_workers,
+        )
+        return to_sort, copy_workers
+
+    def _copy_function(
+        self, copy_options: CopyOptions, copy_workers: int
+    ) -> tuple[Callable[[tuple[int, File]], tuple[int, int | None, str]], WorkerTuner | None]:
+        """Return the function the copy threads run on each indexed file, timed and tuned if requested.
 
-        with multiprocessing.Pool(processes=self.threads_to_use) as pool:
-            inputs = [
-                (self.message_queue, self.destination_dir, input_file)
-                for input_file in self.files_list
-                if input_file.sort_flag
-            ]
-            pool.starmap(self.copy_file, inputs)
+        Returns: tuple of the function, and the WorkerTuner limiting the copies if `self.autotune` is set
+        """
+        copy = functools.partial(self._copy_indexed_file, self.destination_dir, self.transfer_mode, copy_options)
+        if self.instrumentation is not None:
+            copy = functools.partial(self._time_copy, copy)
+        tuner = None
+        if self.autotune and not self.copy_workers:
+            # Throughput of copies is measured in bytes, as files may range from kilobytes to gigabytes
+            tuner = WorkerTuner("copying", candidate_counts(copy_workers), unit="bytes")
+            copy = tuner.wrap(copy, amount=lambda result: result[1] or 0)
+        return copy, tuner
+
+    def _time_copy(
+        self, copy: Callable[[tuple[int, File]], tuple[int, int | None, str]], indexed_file: tuple[int, File]
+    ) -> tuple[int, int | None, str]:
+        """Run a copy worker function, recording the seconds it took to copy the file."""
+        start = time.perf_counter()
+        result = copy(indexed_file)
+        self.instrumentation.record("copy_file", indexed_file[1].fullpath, time.perf_counter() - start)
+        return result
 
-        self.sorting_complete = True
-        logger.info("Sorting Completed")
+    @staticmethod
+    def _copy_indexed_file(
+        destination_dir: str, transfer_mode: str, copy_options: CopyOptions, indexed_file: tuple[int, File]
+    ) -> tuple[int, int | None, str]:
+        """Worker function that copies a file while keeping track of its index position."""
+        index, input_file = indexed_file
+        return index, *ImageSort.copy_file(destination_dir, input_file, transfer_mode, copy_options)
 
     @staticmethod
-    def copy_file(message_queue: object, destination_dir: str, input_file: File) -> None:
+    def copy_file(
+        destination_dir: str, input_file: File, transfer_mode: str = "copy", copy_options: CopyOptions | None = None
+    ) -> tuple[int | None, str]:
         """Copy method that copies files into the structured output folder.
 
+        The destination folder of the file must already exist, `run_parallel_sorting` creates all of them
+        with `transfer.create_folders` before any file is copied.
+
         Arguments:
-            message_queue: a Queue to put log messages on for the GUI to display
             destination_dir: the output folder selected by the user
             input_file: File object
+            transfer_mode: how to transfer the file, one of `transfer.TRANSFER_MODES`
+            copy_options: durability and metadata options of the copy, the defaults of `transfer.CopyOptions` if None
+        Returns: tuple of the number of bytes copied or None if the copy failed, and a log message for the user
         """
         try:
             logger.debug("Copying: %s", input_file)
-            new_path = os.path.join(destination_dir, input_file.destination_relative_path)
-            os.makedirs(new_path, exist_ok=True)
-            destination_fullpath = os.path.join(new_path, input_file.sorted_filename)
-            shutil.copyfile(input_file.fullpath, destination_fullpath)
-            message_queue.put(f"Processed : {input_file.fullpath} --> {destination_fullpath}\n")
+            destination_fullpath = os.path.join(
+                destination_dir, input_file.destination_relative_path, input_file.sorted_filename
+            )
+            mode_used = transfer_file(input_file.fullpath, destination_fullpath, transfer_mode, copy_options)
+            message = f"Processed : {input_file.fullpath} --> {destination_fullpath}"
+            message += "\n" if mode_used == "copy" else f" ({mode_used})\n"
+            return os.path.getsize(destination_fullpath), message
         except Exception as error:
             logger.exception("Failed to copy file %s: %s", input_file.fullpath, error)
-            message_queue.put(f"ERROR copying {input_file.fullpath}: {error}\n")
-
-    def read_queue(self) -> None:
-        """Method to receive and log the messages from the workers in the pool."""
-        while True:
-            message = self.message_queue.get()
-            if message == "kill":
-                break
-            if self.tk_text_object is not None:
-                # Only run if a GUI object is provided
-                self.tk_text_object.configure(state="normal")  # Make writable
-                self.tk_text_object.insert(tk.INSERT, message)
-                self.tk_text_object.yview(tk.END)
-                self.tk_text_object.configure(state="disabled")  # Read Only
+            return None, f"ERROR copying {input_file.fullpath}: {error}\n"
 
     def cleanup(self) -> None:
-        """Cleanup function that kills any threads spawned on instance creation."""
-        logger.debug("Running cleanup on queue thread")
-        self.message_queue.put("kill")
-        time.sleep(0.2)
+        """Cleanup function kept for compatibility, ImageSort no longer spawns anything on instance creation."""
+        logger.debug("Running cleanup")
+
+
+def sort_directory(  # noqa: PLR0913
+    source_dir: str,
+    destination_dir: str,
+    *,
+    ext_to_sort: list[str] | None = None,
+    rename_duplicates: bool = False,
+    copy_unsorted: bool = False,
+    skip_identical: bool = False,
+    metadata_cache: MetadataCache | None = None,
+    transfer_mode: str = "copy",
+    fsync_policy: str = "none",
+    preserve_times: bool = False,
+    resume: bool = False,
+    copy_workers: int | None = None,
+    autotune: bool = False,
+    instrumentation: RunInstrumentation | None = None,
+    reporter: Reporter | None = None,
+) -> ImageSort:
+    """Analyse and sort a directory in one call, without any GUI.
+
+    Arguments:
+        source_dir: the folder to search for files to sort
+        destination_dir: the output folder to copy the sorted files into
+        ext_to_sort: extensions of the files to sort, defaults to `JPEG_EXTENSIONS`
+        rename_duplicates: keep files with duplicate datetimes by appending a postfix to their name
+        copy_unsorted: copy all files not matching `ext_to_sort` into an 'other_files' folder
+        skip_identical: only sort one copy of files with identical contents
+        metadata_cache: MetadataCache to reuse the datetimes extracted by previous runs
+        transfer_mode: how to transfer the files into the output folder, one of `transfer.TRANSFER_MODES`
+        fsync_policy: when copies are synced to the disk, one of `transfer.FSYNC_POLICIES`
+        preserve_times: copies keep the access and modification times of their source
+        resume: skip the files an interrupted sort into the same output folder already transferred
+        copy_workers: number of files to copy in parallel, chosen from the kind of storage devices if None
+        autotune: tune the number of workers analysing, hashing and copying files from their measured throughput
+        instrumentation: RunInstrumentation to time the run, it is started and stopped around the run
+        reporter: receives the user facing progress messages, they are discarded if not provided
+    Returns: the ImageSort object used for the run, so the categorised files can be inspected
+    """
+    sorter = ImageSort(source_dir, destination_dir, reporter)
+    try:
+        sorter.ext_to_sort = list(JPEG_EXTENSIONS if ext_to_sort is None else ext_to_sort)
+        sorter.rename_duplicates = rename_duplicates
+        sorter.copy_unsorted = copy_unsorted
+        sorter.skip_identical = skip_identical
+        sorter.metadata_cache = metadata_cache
+        sorter.transfer_mode = transfer_mode
+        sorter.fsync_policy = fsync_policy
+        sorter.preserve_times = preserve_times
+        sorter.resume = resume
+        sorter.copy_workers = copy_workers
+        sorter.autotune = autotune
+        sorter.instrumentation = instrumentation
+        if instrumentation is not None:
+            instrumentation.start()
+        sorter.find_images()
+        sorter.run_parallel_sorting()
+    finally:
+        if instrumentation is not None:
+            instrumentation.stop()
+        sorter.cleanup()
+    return sorter
+
+
+def analyse_directory(  # noqa: PLR0913
+    source_dir: str,
+    destination_dir: str,
+    *,
+    ext_to_sort: list[str] | None = None,
+    rename_duplicates: bool = False,
+    copy_unsorted: bool = False,
+    skip_identical: bool = False,
+    metadata_cache: MetadataCache | None = None,
+    autotune: bool = False,
+    instrumentation: RunInstrumentation | None = None,
+    reporter: Reporter | None = None,
+) -> ImageSort:
+    """Find and analyse the files of a directory without transferring them, such as to write a sort plan.
+
+    Arguments are as for `sort_directory`.
+    Returns: the ImageSort object with its files categorised, ready for `run_parallel_sorting`
+    """
+    sorter = ImageSort(source_dir, destination_dir, reporter)
+    sorter.ext_to_sort = list(JPEG_EXTENSIONS if ext_to_sort is None else ext_to_sort)
+    sorter.rename_duplicates = rename_duplicates
+    sorter.copy_unsorted = copy_unsorted
+    sorter.skip_identical = skip_identical
+    sorter.metadata_cache = metadata_cache
+    sorter.autotune = autotune
+    sorter.instrumentation = instrumentation
+    if instrumentation is not None:
+        instrumentation.start()
+    try:
+        sorter.find_images()
+    finally:
+        if instrumentation is not None:
+            instrumentation.stop()
+    return sorter
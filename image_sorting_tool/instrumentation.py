@@ -0,0 +1,239 @@
+"""Timing and profiling of a sorting run, written to a machine-readable report.
+
+A slow sort may be held up by searching the input folder, reading EXIF data, parsing filenames, hashing or
+copying. The instrumentation measures the wall time of each phase of a run and the latency of each file
+passing through the per file operations, so the report shows which of them is to blame. Latencies go into
+histograms with power of two buckets, so recording a file costs the same however many files a run has.
+
+Optionally the run is profiled with cProfile and its memory allocations traced with tracemalloc. Both only
+see the thread that started the run, the work of the extraction processes and copy threads shows up in the
+latency histograms instead.
+"""
+
+import contextlib
+import cProfile
+import heapq
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timezone
+
+from image_sorting_tool import __version__
+
+HISTOGRAM_BUCKETS = 40  # Bucket i counts latencies below 2**i microseconds, the last one counts all slower
+DEFAULT_SLOWEST_FILES = 10
+PROFILE_FUNCTIONS = 30  # Functions with the most cumulative time listed in the report
+MEMORY_SITES = 10  # Lines allocating the most memory listed in the report
+PERCENTILES = (50, 90, 99)
+
+
+class LatencyHistogram:
+    """Histogram of latencies with power of two buckets, keeping the total and maximum exactly."""
+
+    def __init__(self) -> None:
+        """Initialize an empty LatencyHistogram object."""
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        """Count a latency in seconds."""
+        bucket = min(int(seconds * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent: float) -> float:
+        """Return an upper bound of a percentile of the latencies, the upper edge of the bucket holding it."""
+        rank = self.count * percent / 100
+        seen = 0
+        for bucket, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if bucket_count and seen >= rank:
+                return min(2**bucket / 1e6, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        """Return the histogram as a dict of plain types, for the report."""
+        return {
+            "count": self.count,
+            "total_seconds": self.total,
+            "mean_seconds": self.total / self.count if self.count else 0.0,
+            "max_seconds": self.max,
+            **{f"p{percent}_seconds": self.percentile(percent) for percent in PERCENTILES},
+            "buckets": [
+                {"below_seconds": 2**bucket / 1e6, "count": bucket_count}
+                for bucket, bucket_count in enumerate(self.buckets)
+                if bucket_count
+            ],
+        }
+
+
+class RunInstrumentation:
+    """Collects the timings of a sorting run and writes them to a report.
+
+    The sorter records into it from the thread running the sort and from the copy threads, so recording is
+    guarded by a lock.
+    """
+
+    def __init__(
+        self,
+        report_path: str | None = None,
+        slowest_files: int = DEFAULT_SLOWEST_FILES,
+        profile: bool = False,
+        trace_memory: bool = False,
+    ) -> None:
+        """Initialize RunInstrumentation object.
+
+        Arguments:
+            report_path: JSON file the report is written to when the run stops, None to only keep it in memory
+            slowest_files: number of the slowest files to list for each operation
+            profile: profile the run with cProfile
+            trace_memory: trace the memory allocations of the run with tracemalloc
+        """
+        self.report_path = report_path
+        self.slowest_files = slowest_files
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.phases = {}  # Seconds spent in each phase, accumulated if a phase runs more than once
+        self.histograms = {}  # LatencyHistogram of each operation
+        self.slowest = {}  # Min heap of the (seconds, path) of the slowest files of each operation
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.started = None
+        self.wall_seconds = 0.0
+        self._start_time = None
+        self._profiler = None
+        self._profile_stats = None
+        self._memory = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start timing the run, and the profiler and memory tracing if requested."""
+        self.started = datetime.now(timezone.utc)
+        self._start_time = time.perf_counter()
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self) -> None:
+        """Stop timing the run, and write the report if it has a path."""
+        if self._start_time is None:
+            return
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profile_stats = pstats.Stats(self._profiler)
+            self._profiler = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self._memory = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top_sites": [
+                    {"site": str(statistic.traceback), "bytes": statistic.size, "blocks": statistic.count}
+                    for statistic in snapshot.statistics("lineno")[:MEMORY_SITES]
+                ],
+            }
+        self.wall_seconds = time.perf_counter() - self._start_time
+        self._start_time = None
+        if self.report_path is not None:
+            self.write(self.report_path)
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Context manager that adds the wall time of its block to a phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase_time(name, time.perf_counter() - start)
+
+    def add_phase_time(self, name: str, seconds: float) -> None:
+        """Add time to a phase."""
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def time_iterator(self, name: str, iterable: Iterable) -> Iterator:
+        """Yield the items of an iterable, adding the time spent producing them to a phase.
+
+        Used for phases that run as a stream interleaved with other work, such as searching the input folder.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_phase_time(name, time.perf_counter() - start)
+                return
+            self.add_phase_time(name, time.perf_counter() - start)
+            yield item
+
+    def record(self, operation: str, path: str, seconds: float) -> None:
+        """Record the latency of an operation on a file, such as 'get_datetime' or 'copy_file'."""
+        with self._lock:
+            histogram = self.histograms.get(operation)
+            if histogram is None:
+                histogram = self.histograms[operation] = LatencyHistogram()
+                self.slowest[operation] = []
+            histogram.add(seconds)
+            slowest = self.slowest[operation]
+            if len(slowest) < self.slowest_files:
+                heapq.heappush(slowest, (seconds, path))
+            elif slowest and seconds > slowest[0][0]:
+                heapq.heapreplace(slowest, (seconds, path))
+
+    def add_bytes(self, read: int = 0, written: int = 0) -> None:
+        """Count bytes read from the input folder and written to the output folder."""
+        with self._lock:
+            self.bytes_read += read
+            self.bytes_written += written
+
+    def report(self) -> dict:
+        """Return the report of the run as a dict of plain types."""
+        report = {
+            "version": __version__,
+            "started": None if self.started is None else self.started.isoformat(timespec="seconds"),
+            "wall_seconds": self.wall_seconds,
+            "phases": dict(self.phases),
+            "operations": {
+                operation: {
+                    **histogram.to_dict(),
+                    "slowest": [
+                        {"path": path, "seconds": seconds}
+                        for seconds, path in sorted(self.slowest[operation], reverse=True)
+                    ],
+                }
+                for operation, histogram in self.histograms.items()
+            },
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+        }
+        if self._profile_stats is not None:
+            functions = sorted(self._profile_stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+            report["profile"] = [
+                {
+                    "function": f"{filename}:{line}({name})",
+                    "calls": calls,
+                    "total_seconds": total,
+                    "cumulative_seconds": cumulative,
+                }
+                for (filename, line, name), (_, calls, total, cumulative, _) in functions[:PROFILE_FUNCTIONS]
+            ]
+        if self._memory is not None:
+            report["memory"] = self._memory
+        return report
+
+    def write(self, path: str) -> None:
+        """Write the report of the run to a JSON file."""
+        with open(path, "w", encoding="utf-8") as report_file:
+            json.dump(self.report(), report_file, indent=2)
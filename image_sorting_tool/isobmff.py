@@ -0,0 +1,356 @@
+"""Minimal ISO base media file format (MP4, MOV, 3GP, HEIF) reader that extracts creation times from the headers.
+
+ISO-BMFF files are a tree of boxes, each starting with its size and type. Only the headers of the top-level
+boxes are read to find the 'moov' box, seeking over the media data in between, so files with the 'moov' box
+at the end are handled without reading the media data. Inside 'moov' only the movie header ('mvhd') and the
+user data ('udta') are read, which are a few KB at most.
+
+Two creation times are found:
+- 'udta/©day', the capture date written by cameras and phones in local time, such as '2013-04-07T13:21:35+0100'.
+  Both the QuickTime form, directly in 'udta', and the iTunes form, in 'udta/meta/ilst', are read.
+- 'mvhd' creation_time, seconds since 1904 in UTC. Zero when the writer did not set it.
+
+HEIF images, such as the HEIC photos of iPhones, have no 'moov' box. Their EXIF data is an item of the
+top-level 'meta' box, located through the item info ('iinf') and item location ('iloc') boxes.
+"""
+
+import os
+import re
+import struct
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO
+
+BOX_HEADER_SIZE = 8
+LARGE_SIZE_FIELD = 8
+FULL_BOX_HEADER_SIZE = 4  # Version and flags of full boxes, such as 'mvhd' and 'meta'
+DATA_BOX_HEADER_SIZE = 8  # Type indicator and locale of the iTunes 'data' box
+QUICKTIME_TEXT_HEADER_SIZE = 4  # Length and language of QuickTime text user data
+MAX_HEADER_BOX_SIZE = 1024 * 1024  # Larger 'udta' children are media, such as thumbnails, and are skipped
+MAX_BOXES = 10_000  # Bounds the walk of malformed files that are made of tiny boxes
+MP4_EPOCH = datetime(1904, 1, 1, tzinfo=timezone.utc)
+DAY_BOX = b"\xa9day"
+VIDEO_EXTENSIONS = [".mp4", ".m4v", ".mov", ".3gp", ".3g2"]
+HEIF_EXTENSIONS = [".heic", ".heif", ".hif", ".avif"]
+# Brands of HEIF still images, image sequences such as 'msf1' have a 'moov' box like videos
+HEIF_BRANDS = {b"heic", b"heix", b"heim", b"heis", b"mif1", b"avif"}
+EXIF_ITEM_TYPE = b"Exif"
+DATE_PATTERN = re.compile(r"(\d{4})[-:]?(\d{2})[-:]?(\d{2})(?:[T ](\d{2}):?(\d{2})(?::?(\d{2}))?)?")
+
+
+class IsobmffError(ValueError):
+    """Raised when the boxes of an ISO-BMFF file are malformed."""
+
+
+def iter_boxes(file_obj: BinaryIO, start: int, end: int) -> Iterator[tuple[bytes, int, int]]:
+    """Walk the headers of the boxes between two file offsets, without reading their contents.
+
+    Arguments:
+        file_obj: binary file of the boxes
+        start: file offset of the first box
+        end: file offset the boxes end at, such as the end of the file or of their parent box
+    Returns: generator of tuples of the type, file offset of the contents and size of the contents of each box
+    Raises:
+        IsobmffError: if a box header is truncated or its size is invalid
+    """
+    offset = start
+    for _ in range(MAX_BOXES):
+        if offset + BOX_HEADER_SIZE > end:
+            return
+        file_obj.seek(offset)
+        header = file_obj.read(BOX_HEADER_SIZE)
+        if len(header) != BOX_HEADER_SIZE:
+            err_msg = f"Unexpected end of file in the box header at offset {offset}"
+            raise IsobmffError(err_msg)
+        size, box_type = struct.unpack(">I4s", header)
+        header_size = BOX_HEADER_SIZE
+        if size == 1:  # The size follows the type as a 64 bit integer
+            large_size = file_obj.read(LARGE_SIZE_FIELD)
+            if len(large_size) != LARGE_SIZE_FIELD:
+                err_msg = f"Unexpected end of file in the box header at offset {offset}"
+                raise IsobmffError(err_msg)
+            (size,) = struct.unpack(">Q", large_size)
+            header_size += LARGE_SIZE_FIELD
+        elif size == 0:  # The box extends to the end
+            size = end - offset
+        if size < header_size or offset + size > end:
+            err_msg = f"Invalid size {size} of the '{box_type.decode('latin-1')}' box at offset {offset}"
+            raise IsobmffError(err_msg)
+        yield box_type, offset + header_size, size - header_size
+        offset += size
+    err_msg = f"More than {MAX_BOXES} boxes"
+    raise IsobmffError(err_msg)
+
+
+def find_box(file_obj: BinaryIO, start: int, end: int, box_type: bytes) -> tuple[int, int] | None:
+    """Find the first box of a type between two file offsets.
+
+    Returns: tuple of the file offset and size of the contents of the box, or None if there is no such box
+    Raises:
+        IsobmffError: if a box header is malformed
+    """
+    for found_type, offset, size in iter_boxes(file_obj, start, end):
+        if found_type == box_type:
+            return offset, size
+    return None
+
+
+def read_mp4_creation_time(filepath: str) -> datetime | None:
+    """Read the creation time of an ISO-BMFF file, such as an MP4 or MOV video.
+
+    Arguments:
+        filepath: path to the file
+    Returns: the creation time as a naive local datetime, or None if the file records no creation time
+    Raises:
+        IsobmffError: if the file has no 'moov' box or its boxes are malformed
+    """
+    with open(filepath, "rb") as file_obj:
+        return read_movie_creation_time(file_obj)
+
+
+def read_movie_creation_time(file_obj: BinaryIO) -> datetime | None:
+    """Read the creation time of an ISO-BMFF movie from the headers of its 'moov' box.
+
+    The capture date in the user data is preferred, as its local time matches the EXIF datetimes of photos.
+    Otherwise the UTC creation time of the movie header is converted to the local time of this machine.
+
+    Arguments:
+        file_obj: binary file of the movie
+    Returns: the creation time as a naive local datetime, or None if the file records no creation time
+    Raises:
+        IsobmffError: if the file has no 'moov' box or its boxes are malformed
+    """
+    file_end = os.fstat(file_obj.fileno()).st_size
+    moov = find_box(file_obj, 0, file_end, b"moov")
+    if moov is None:
+        err_msg = "No 'moov' box found"
+        raise IsobmffError(err_msg)
+    moov_start, moov_end = moov[0], moov[0] + moov[1]
+    udta = find_box(file_obj, moov_start, moov_end, b"udta")
+    if udta is not None:
+        day = read_user_data_date(file_obj, udta[0], udta[0] + udta[1])
+        if day is not None:
+            return day
+    mvhd = find_box(file_obj, moov_start, moov_end, b"mvhd")
+    if mvhd is None:
+        return None
+    created = read_mvhd_creation_time(file_obj, *mvhd)
+    return None if created is None else created.astimezone().replace(tzinfo=None)
+
+
+def read_brands(file_obj: BinaryIO) -> set[bytes]:
+    """Read the major and compatible brands of the 'ftyp' box at the start of a file.
+
+    Returns: the brands, empty if the file does not start with an 'ftyp' box
+    """
+    file_obj.seek(0)
+    header = file_obj.read(BOX_HEADER_SIZE)
+    if len(header) != BOX_HEADER_SIZE or header[4:] != b"ftyp":
+        return set()
+    (size,) = struct.unpack(">I", header[:4])
+    data = file_obj.read(min(max(size - BOX_HEADER_SIZE, 0), MAX_HEADER_BOX_SIZE))
+    # The major brand and minor version are followed by the compatible brands
+    return {data[:4]} | {data[offset : offset + 4] for offset in range(8, len(data) - 3, 4)}
+
+
+def find_heif_exif(file_obj: BinaryIO) -> tuple[int, int] | None:
+    """Find the TIFF data of the EXIF item of a HEIF image, without reading the image data.
+
+    Arguments:
+        file_obj: binary file of the image
+    Returns: tuple of the file offset and size of the TIFF data, or None if the image has no EXIF item
+    Raises:
+        IsobmffError: if the boxes are malformed, or the EXIF item is stored in a way that is not supported
+    """
+    file_end = os.fstat(file_obj.fileno()).st_size
+    meta = find_box(file_obj, 0, file_end, b"meta")
+    if meta is None:
+        return None
+    meta_start, meta_end = meta[0] + FULL_BOX_HEADER_SIZE, meta[0] + meta[1]
+    boxes = {box_type: (offset, size) for box_type, offset, size in iter_boxes(file_obj, meta_start, meta_end)}
+    if b"iinf" not in boxes or b"iloc" not in boxes:
+        return None
+    item_id = _find_item_id(file_obj, *boxes[b"iinf"], EXIF_ITEM_TYPE)
+    if item_id is None:
+        return None
+    location = _find_item_location(file_obj, *boxes[b"iloc"], item_id)
+    if location is None:
+        return None
+    construction_method, offset, size = location
+    if construction_method == 1:  # Stored in the 'idat' box of 'meta'
+        if b"idat" not in boxes:
+            err_msg = "The EXIF item is stored in a missing 'idat' box"
+            raise IsobmffError(err_msg)
+        offset += boxes[b"idat"][0]
+    elif construction_method != 0:
+        err_msg = f"Unsupported construction method {construction_method} of the EXIF item"
+        raise IsobmffError(err_msg)
+    # The item starts with the offset of the TIFF header, from the end of that field
+    file_obj.seek(offset)
+    data = file_obj.read(4)
+    if len(data) != 4 or size < 4:  # noqa: PLR2004
+        err_msg = "The EXIF item is truncated"
+        raise IsobmffError(err_msg)
+    tiff_start = 4 + struct.unpack(">I", data)[0]
+    if tiff_start >= size:
+        err_msg = "The EXIF item has no TIFF data"
+        raise IsobmffError(err_msg)
+    return offset + tiff_start, size - tiff_start
+
+
+def _read_exactly(file_obj: BinaryIO, offset: int, size: int, box_type: str) -> bytes:
+    """Read the contents of a box, raising IsobmffError if it is truncated."""
+    if size > MAX_HEADER_BOX_SIZE:
+        err_msg = f"The '{box_type}' box is too large: {size} bytes"
+        raise IsobmffError(err_msg)
+    file_obj.seek(offset)
+    data = file_obj.read(size)
+    if len(data) != size:
+        err_msg = f"The '{box_type}' box is truncated"
+        raise IsobmffError(err_msg)
+    return data
+
+
+def _find_item_id(file_obj: BinaryIO, offset: int, size: int, item_type: bytes) -> int | None:
+    """Find the ID of the first item of a type in an item info box.
+
+    Returns: the item ID, or None if there is no item of that type
+    """
+    data = _read_exactly(file_obj, offset, size, "iinf")
+    entries_start = FULL_BOX_HEADER_SIZE + (2 if data[0] == 0 else 4)
+    for box_type, entry_offset, entry_size in iter_boxes(file_obj, offset + entries_start, offset + size):
+        if box_type != b"infe":
+            continue
+        entry = data[entry_offset - offset : entry_offset - offset + entry_size]
+        version = entry[0] if entry else 0
+        # Versions 0 and 1 have no item type
+        if version < 2:  # noqa: PLR2004
+            continue
+        id_format = ">H" if version == 2 else ">I"  # noqa: PLR2004
+        id_size = struct.calcsize(id_format)
+        type_start = FULL_BOX_HEADER_SIZE + id_size + 2  # After the item ID and protection index
+        if len(entry) < type_start + 4:
+            err_msg = "The 'infe' box is truncated"
+            raise IsobmffError(err_msg)
+        if entry[type_start : type_start + 4] == item_type:
+            return struct.unpack_from(id_format, entry, FULL_BOX_HEADER_SIZE)[0]
+    return None
+
+
+def _find_item_location(file_obj: BinaryIO, offset: int, size: int, item_id: int) -> tuple[int, int, int] | None:
+    """Find the location of an item in an item location box. Only items stored in a single extent are supported.
+
+    Returns: tuple of the construction method, offset and size of the item, or None if the item is not listed
+    """
+    data = _read_exactly(file_obj, offset, size, "iloc")
+    try:
+        version = data[0]
+        offset_size, length_size = data[4] >> 4, data[4] & 0xF
+        base_offset_size, index_size = data[5] >> 4, data[5] & 0xF
+        position = 6
+        count_size = 2 if version < 2 else 4  # noqa: PLR2004
+        item_count = int.from_bytes(data[position : position + count_size], "big")
+        position += count_size
+        for _ in range(item_count):
+            current_id = int.from_bytes(data[position : position + count_size], "big")
+            position += count_size
+            construction_method = 0
+            if version in {1, 2}:
+                construction_method = data[position + 1] & 0xF
+                position += 2
+            position += 2  # Data reference index
+            base_offset = int.from_bytes(data[position : position + base_offset_size], "big")
+            position += base_offset_size
+            extent_count = struct.unpack_from(">H", data, position)[0]
+            position += 2
+            extents = []
+            for _ in range(extent_count):
+                if version in {1, 2}:
+                    position += index_size
+                extent_offset = int.from_bytes(data[position : position + offset_size], "big")
+                position += offset_size
+                extent_length = int.from_bytes(data[position : position + length_size], "big")
+                position += length_size
+                extents.append((extent_offset, extent_length))
+            if position > len(data):
+                err_msg = "The 'iloc' box is truncated"
+                raise IsobmffError(err_msg)
+            if current_id == item_id:
+                if len(extents) != 1:
+                    err_msg = f"The EXIF item is stored in {len(extents)} extents"
+                    raise IsobmffError(err_msg)
+                return construction_method, base_offset + extents[0][0], extents[0][1]
+    except (IndexError, struct.error) as error:
+        err_msg = "The 'iloc' box is truncated"
+        raise IsobmffError(err_msg) from error
+    return None
+
+
+def read_mvhd_creation_time(file_obj: BinaryIO, offset: int, size: int) -> datetime | None:
+    """Read the creation time of a movie header box.
+
+    Returns: the creation time as an aware UTC datetime, or None if it is not set
+    Raises:
+        IsobmffError: if the box is truncated
+    """
+    file_obj.seek(offset)
+    version = file_obj.read(FULL_BOX_HEADER_SIZE)[:1]
+    time_format = ">Q" if version == b"\x01" else ">I"
+    time_size = struct.calcsize(time_format)
+    data = file_obj.read(time_size)
+    if not version or len(data) != time_size or size < FULL_BOX_HEADER_SIZE + time_size:
+        err_msg = "The 'mvhd' box is truncated"
+        raise IsobmffError(err_msg)
+    (seconds,) = struct.unpack(time_format, data)
+    if seconds == 0:
+        return None
+    try:
+        return MP4_EPOCH + timedelta(seconds=seconds)
+    except OverflowError as error:
+        err_msg = f"Invalid 'mvhd' creation time {seconds}"
+        raise IsobmffError(err_msg) from error
+
+
+def read_user_data_date(file_obj: BinaryIO, start: int, end: int) -> datetime | None:
+    """Read the '©day' capture date of a user data box, in its QuickTime or iTunes form.
+
+    Returns: the capture date as a naive datetime in the local time it was recorded in, or None if not present
+    Raises:
+        IsobmffError: if a box header is malformed
+    """
+    for box_type, offset, size in iter_boxes(file_obj, start, end):
+        if size > MAX_HEADER_BOX_SIZE:
+            continue
+        if box_type == DAY_BOX:
+            file_obj.seek(offset)
+            text = file_obj.read(size)
+            # The QuickTime form starts with the length of the text, the iTunes form with a 'data' box
+            if text[4:8] == b"data":
+                text = text[BOX_HEADER_SIZE + DATA_BOX_HEADER_SIZE :]
+            else:
+                text = text[QUICKTIME_TEXT_HEADER_SIZE:]
+            return parse_date_text(text.decode("utf-8", errors="replace"))
+        if box_type == b"meta":
+            # Unlike the other container boxes, 'meta' is a full box. Some QuickTime writers omit its header.
+            file_obj.seek(offset)
+            children = offset if file_obj.read(8)[4:8] == b"hdlr" else offset + FULL_BOX_HEADER_SIZE
+            ilst = find_box(file_obj, children, offset + size, b"ilst")
+            if ilst is not None:
+                day = read_user_data_date(file_obj, ilst[0], ilst[0] + ilst[1])
+                if day is not None:
+                    return day
+    return None
+
+
+def parse_date_text(text: str) -> datetime | None:
+    """Parse a '©day' capture date such as '2013-04-07T13:21:35+0100', ignoring its UTC offset.
+
+    Returns: the date as a naive datetime, or None if the text holds no valid date
+    """
+    match = DATE_PATTERN.search(text)
+    if match is None:
+        return None
+    try:
+        return datetime(*(int(group or 0) for group in match.groups()))  # noqa: DTZ001
+    except ValueError:
+        return None
@@ -0,0 +1,178 @@
+"""Crash-safe journal of the files transferred into the output folder, so interrupted sorts can be resumed.
+
+Every completed transfer is appended to a JSON lines file in the output folder, recording the identity of
+the source file and where it was transferred to. Transfers write to a temporary name and are renamed into
+place, so a file only appears under its final name once it is complete.
+
+Lines are only forced to disk at checkpoints. How the transferred files themselves reach the disk follows the
+fsync policy of the copies, see `transfer.CopyOptions`. Under the 'file' policy they are synced as they are
+placed, and under the 'folder' policy each checkpoint first syncs the files recorded since the previous one,
+so the entries before the last checkpoint can be trusted after a crash or power loss. Otherwise nothing forces
+the files to disk, so like the entries of the batch that was in flight, their entries are verified against the
+output folder before they are skipped. The journal is removed once a sort completes without any failed
+transfers, as there is nothing left to resume.
+"""
+
+import json
+import logging
+import os
+import time
+
+from image_sorting_tool.transfer import fsync_files
+
+logger = logging.getLogger("image-sorting-tool")
+
+JOURNAL_FILENAME = ".image-sorting-tool-journal.jsonl"
+# Seconds between checkpoints, which bounds the work redone after a power loss
+CHECKPOINT_INTERVAL = 5.0
+SYNCED_POLICIES = ("file", "folder")  # fsync policies under which checkpoints confirm the files are on disk
+
+
+class SortJournal:
+    """Append-only record of the transfers completed by a sorting run."""
+
+    def __init__(
+        self,
+        destination_dir: str,
+        checkpoint_interval: float = CHECKPOINT_INTERVAL,
+        filename: str = JOURNAL_FILENAME,
+        fsync: str = "folder",
+    ) -> None:
+        """Initialize SortJournal object.
+
+        Arguments:
+            destination_dir: the output folder, the journal is kept inside it
+            checkpoint_interval: seconds between checkpoints while recording transfers
+            filename: name of the journal file, runs sorting into the same output folder at once need their own
+            fsync: fsync policy of the transfers, one of `transfer.FSYNC_POLICIES`
+        """
+        self.destination_dir = destination_dir
+        self.path = os.path.join(destination_dir, filename)
+        self.checkpoint_interval = checkpoint_interval
+        self.fsync = fsync
+        self.completed = {}  # source fullpath -> journal entry of its completed transfer
+        self.unsynced = []  # Output files recorded since the last checkpoint, synced by the next under 'folder'
+        self.file = None
+        self.last_checkpoint = time.monotonic()
+
+    def load(self) -> None:
+        """Read the completed transfers of a previous run from the journal, if there is one.
+
+        Entries written after the last checkpoint, or before checkpoints that did not sync their output files,
+        are only accepted if their output file is present with the recorded size, as they may not have reached
+        the disk before the run was interrupted.
+        """
+        self.completed = {}
+        unconfirmed = []
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # A line cut short by the interruption, nothing after it was written
+                    if entry.get("checkpoint"):
+                        if entry.get("verify"):
+                            continue  # The output files were not synced, so the entries stay unconfirmed
+                        self.completed.update((item["source"], item) for item in unconfirmed)
+                        unconfirmed = []
+                    else:
+                        unconfirmed.append(entry)
+        except FileNotFoundError:
+            return
+        verified = [entry for entry in unconfirmed if self._output_is_intact(entry)]
+        self.completed.update((entry["source"], entry) for entry in verified)
+        logger.info(
+            "Journal lists %i completed transfers, %i of the %i unconfirmed ones were verified",
+            len(self.completed),
+            len(verified),
+            len(unconfirmed),
+        )
+
+    def _output_is_intact(self, entry: dict) -> bool:
+        """Return True if the output file of a journal entry exists with the recorded size."""
+        try:
+            return os.path.getsize(os.path.join(self.destination_dir, entry["destination"])) == entry["bytes"]
+        except OSError:
+            return False
+
+    def is_complete(self, input_file: object) -> bool:
+        """Return True if the journal records the file as already transferred to its current destination.
+
+        Arguments:
+            input_file: File object with its stat attributes, destination and sorted filename populated
+        """
+        entry = self.completed.get(input_file.fullpath)
+        if entry is None or entry["destination"] != self.destination_of(input_file):
+            return False
+        # A moved source no longer exists, otherwise it must not have changed since it was transferred
+        return input_file.size is None or (entry["size"], entry["mtime_ns"]) == (input_file.size, input_file.mtime_ns)
+
+    @staticmethod
+    def destination_of(input_file: object) -> str:
+        """Return the path a file is transferred to, relative to the output folder."""
+        return os.path.join(input_file.destination_relative_path, input_file.sorted_filename)
+
+    def open(self, resume: bool = False) -> None:
+        """Open the journal for recording transfers.
+
+        Arguments:
+            resume: keep the entries of the previous run, otherwise the journal is started afresh
+        """
+        os.makedirs(self.destination_dir, exist_ok=True)  # The output folder may not exist before the first sort
+        self.file = open(self.path, "a" if resume else "w", encoding="utf-8")  # noqa: SIM115
+        self.last_checkpoint = time.monotonic()
+
+    def record(self, input_file: object, bytes_copied: int) -> None:
+        """Append a completed transfer, writing a checkpoint if one is due.
+
+        Arguments:
+            input_file: File object that was transferred, with its stat attributes populated
+            bytes_copied: size of the output file
+        """
+        entry = {
+            "source": input_file.fullpath,
+            "size": input_file.size,
+            "mtime_ns": input_file.mtime_ns,
+            "destination": self.destination_of(input_file),
+            "bytes": bytes_copied,
+        }
+        self.file.write(json.dumps(entry) + "\n")
+        if self.fsync == "folder":
+            self.unsynced.append(os.path.join(self.destination_dir, entry["destination"]))
+        if time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def checkpoint(self) -> None:
+        """Force the journal to disk, confirming the entries written so far if their files are synced too.
+
+        Under the 'folder' policy the files recorded since the last checkpoint are synced first, as they must be
+        on disk before the journal claims they are. Under the 'file' policy they already are. Otherwise the
+        checkpoint is marked for its entries to be verified when they are loaded.
+        """
+        self.file.flush()
+        if self.fsync == "folder":
+            fsync_files(self.unsynced)
+        self.unsynced = []
+        checkpoint = {"checkpoint": True} if self.fsync in SYNCED_POLICIES else {"checkpoint": True, "verify": True}
+        self.file.write(json.dumps(checkpoint) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.last_checkpoint = time.monotonic()
+
+    def close(self) -> None:
+        """Write a final checkpoint and close the journal."""
+        if self.file is not None:
+            self.checkpoint()
+            self.file.close()
+            self.file = None
+
+    def remove(self) -> None:
+        """Close and delete the journal, once the sort it records has fully completed."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
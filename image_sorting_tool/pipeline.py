@@ -0,0 +1,372 @@
+"""Optional asyncio engine running the phases of a sort as concurrent stages, joined by bounded queues.
+
+The default engine searches and analyses the input folder, then categorises every file, then transfers them,
+so the time of a sort is the sum of its phases. This engine instead runs them as a chain of stages:
+
+    scan -> stat -> metadata -> plan -> transfer
+
+Files flow through the stages in chunks of `CHUNKSIZE`, so the asyncio overhead is paid per chunk rather than
+per file. Each queue between two stages holds at most `QUEUE_CHUNKS` chunks, so a fast stage waits for the
+slower one after it instead of piling up files in memory. Blocking work runs in executors: searching, stat and
+transfers on threads, and opening files for their metadata on processes. Each stage works on at most its limit
+of chunks at once, see `StageLimits`. Only the event loop's thread writes to the `FileIndex`, and transfers are
+handed standalone `File` copies of their rows.
+
+The plan stage streams files on to the transfers as soon as they are categorised, so the time of a sort
+approaches that of its slowest stage. The whole index is categorised again once the transfers are done, only
+to number and report its duplicates. Renaming duplicates or skipping identical files numbers the duplicates in
+path order over the whole folder though, which is only known once every file has been analysed, so the plan
+stage then categorises the whole index and holds back all files until the metadata stage has finished. The
+search, stat and metadata stages still overlap each other.
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+from collections.abc import Awaitable, Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import NamedTuple
+
+from image_sorting_tool.cache import MetadataCache, datetime_to_seconds
+from image_sorting_tool.devices import copy_concurrency
+from image_sorting_tool.file_index import FLAG_SORT, NO_VALUE, FileIndex
+from image_sorting_tool.filename_dates import default_parser, register_patterns
+from image_sorting_tool.image_sort import JPEG_EXTENSIONS, File, ImageSort
+from image_sorting_tool.instrumentation import RunInstrumentation
+from image_sorting_tool.journal import SortJournal
+from image_sorting_tool.reporting import Progress, Reporter
+from image_sorting_tool.transfer import CopyOptions, create_folders
+
+logger = logging.getLogger("image-sorting-tool")
+
+CHUNKSIZE = 32  # Files handed between stages at once
+QUEUE_CHUNKS = 8  # Chunks each queue holds before the stage feeding it waits
+STAT_WORKERS = 8  # Chunks stat'ed at once, which only matters on network drives where each stat is a round trip
+
+
+class StageLimits(NamedTuple):
+    """Most chunks of files each stage works on at once. The search is always a single walk of the folder tree."""
+
+    stat: int = STAT_WORKERS
+    metadata: int = max(1, multiprocessing.cpu_count() // 2)  # Processes opening files for their metadata
+    transfer: int = 4  # Chunks transferred at once, each by its own thread
+
+
+def _take(iterator: Iterator[str], count: int) -> list[str]:
+    """Return the next `count` items of an iterator, fewer once it is exhausted."""
+    return list(itertools.islice(iterator, count))
+
+
+def _stat_files(paths: list[str]) -> list[os.stat_result | None]:
+    """Stat files, None for the files that cannot be stat'ed."""
+    results = []
+    for path in paths:
+        try:
+            results.append(os.stat(path))
+        except OSError as error:
+            logger.warning("Failed to stat %s: %s", path, error)
+            results.append(None)
+    return results
+
+
+def _extract_seconds(paths: list[str]) -> list[int | None]:
+    """Worker function that extracts the datetimes of files as epoch seconds, None where it failed."""
+    seconds = []
+    for path in paths:
+        dtime = ImageSort.get_datetime(File(path)).datetime
+        seconds.append(None if dtime is None else datetime_to_seconds(dtime))
+    return seconds
+
+
+class SortPipeline:
+    """Sorts the input folder of an `ImageSort` with concurrent stages, using its sorting options.
+
+    The files are left categorised in `sorter.files_list`, as after `ImageSort.find_images`. Autotuning is not
+    used, as each stage has its fixed limit instead.
+    """
+
+    def __init__(self, sorter: ImageSort, limits: StageLimits | None = None) -> None:
+        """Initialize SortPipeline object.
+
+        Arguments:
+            sorter: ImageSort object holding the folders and sorting options
+            limits: most chunks each stage works on at once. The transfer limit defaults to `sorter.copy_workers`,
+                or else a number suited to the storage devices, and the metadata limit to `sorter.threads_to_use`
+        """
+        self.sorter = sorter
+        if limits is None:
+            transfer = sorter.copy_workers or copy_concurrency(sorter.source_dir, sorter.destination_dir)
+            limits = StageLimits(metadata=sorter.threads_to_use, transfer=transfer)
+        self.limits = limits
+        self.journal = SortJournal(sorter.destination_dir, filename=sorter.journal_filename, fsync=sorter.fsync_policy)
+        self.copy_options = CopyOptions(sorter.fsync_policy, sorter.preserve_times)
+        self.progress = Progress("Sorting")
+        # Without renaming, a file's category and name do not depend on the other files, so it can be streamed
+        self.streaming = not (sorter.rename_duplicates or sorter.skip_identical)
+        self.failed = 0
+        self.skipped = 0
+        self._created_folders = set()
+        self._messages = []
+        self._journal_lock = threading.Lock()  # Serialises the transfer threads recording into the journal
+        self._threads = None
+        self._processes = None
+
+    def run(self) -> None:
+        """Sort the input folder, returning once every file has been transferred."""
+        sorter = self.sorter
+        sorter.sorting_complete = False
+        sorter.sorting_done.clear()
+        sorter.files_list = FileIndex()
+        sorter.reporter.clear()
+        sorter.reporter.write("Searching, analysing and sorting the input folder at once...\n")
+        if sorter.metadata_cache is not None:
+            sorter.metadata_cache.load(sorter.source_dir)
+        if sorter.resume:
+            self.journal.load()
+        self.journal.open(resume=sorter.resume)
+        try:
+            asyncio.run(self._run())
+            if sorter.resume:
+                sorter.reporter.write(f"Resumed, skipped {self.skipped} files sorted by the interrupted run\n")
+            if self.failed:
+                logger.info("Keeping the journal so the %i failed files can be retried by resuming", self.failed)
+            else:
+                self.journal.remove()
+            logger.info("Sorting Completed")
+        finally:
+            self.journal.close()
+            sorter.sorting_complete = True
+            sorter.sorting_done.set()
+
+    async def _run(self) -> None:
+        """Run every stage until the last file has been transferred."""
+        limits = self.limits
+        queues = [asyncio.Queue(QUEUE_CHUNKS) for _ in range(4)]
+        with (
+            ThreadPoolExecutor(max_workers=1 + limits.stat + limits.transfer) as self._threads,
+            ProcessPoolExecutor(
+                max_workers=limits.metadata, initializer=register_patterns, initargs=(default_parser.user_patterns,)
+            ) as self._processes,
+        ):
+            tasks = [
+                asyncio.create_task(self._scan(queues[0])),
+                asyncio.create_task(self._stage(queues[0], queues[1], self._stat, limits.stat)),
+                asyncio.create_task(self._stage(queues[1], queues[2], self._metadata, limits.metadata)),
+                asyncio.create_task(self._plan(queues[2], queues[3])),
+                asyncio.create_task(self._stage(queues[3], None, self._transfer, limits.transfer)),
+            ]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+            loop = asyncio.get_running_loop()
+            if self.streaming:
+                # Categorised as a whole once no transfer reads the index, to number and report the duplicates
+                await loop.run_in_executor(self._threads, self._categorize_all)
+            await loop.run_in_executor(self._threads, self.copy_options.finish)
+        self.sorter.reporter.write("".join(self._messages))
+        self.sorter.reporter.progress(self.progress)
+
+    @staticmethod
+    async def _stage(
+        inbox: asyncio.Queue,
+        outbox: asyncio.Queue | None,
+        work: Callable[[list[int]], Awaitable[list[int]]],
+        limit: int,
+    ) -> None:
+        """Run `limit` workers taking chunks of rows from the inbox, passing the chunks they return to the outbox.
+
+        A None chunk marks the end of the inbox, and is put in the outbox once every worker has finished.
+        """
+
+        async def worker() -> None:
+            while True:
+                rows = await inbox.get()
+                if rows is None:
+                    await inbox.put(None)  # So the other workers of the stage see the end too
+                    return
+                rows = await work(rows)
+                if outbox is not None and rows:
+                    await outbox.put(rows)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, limit))))
+        if outbox is not None:
+            await outbox.put(None)
+
+    async def _scan(self, outbox: asyncio.Queue) -> None:
+        """Search the input folder, adding the files found to the index in chunks."""
+        loop = asyncio.get_running_loop()
+        files_list = self.sorter.files_list
+        paths = self.sorter.scan_files()
+        while chunk := await loop.run_in_executor(self._threads, _take, paths, CHUNKSIZE):
+            await outbox.put([files_list.append(path) for path in chunk])
+        await outbox.put(None)
+
+    async def _stat(self, rows: list[int]) -> list[int]:
+        """Read the size, modification time and inode of a chunk of files."""
+        files_list = self.sorter.files_list
+        paths = [files_list.fullpath(row) for row in rows]
+        stat_results = await asyncio.get_running_loop().run_in_executor(self._threads, _stat_files, paths)
+        for row, stat_result in zip(rows, stat_results, strict=True):
+            if stat_result is not None:
+                files_list.sizes[row] = stat_result.st_size
+                files_list.mtimes[row] = stat_result.st_mtime_ns
+                files_list.inodes[row] = stat_result.st_ino
+        return rows
+
+    async def _metadata(self, rows: list[int]) -> list[int]:
+        """Set the datetimes of a chunk of files, opening them in the worker processes if needed."""
+        sorter = self.sorter
+        files_list = sorter.files_list
+        to_open = [row for row in rows if not sorter.resolve_datetime_locally(files_list[row])]
+        if to_open:
+            paths = [files_list.fullpath(row) for row in to_open]
+            seconds = await asyncio.get_running_loop().run_in_executor(self._processes, _extract_seconds, paths)
+            for row, row_seconds in zip(to_open, seconds, strict=True):
+                files_list.datetimes[row] = NO_VALUE if row_seconds is None else row_seconds
+                input_file = files_list[row]
+                if sorter.metadata_cache is not None and input_file.size is not None:
+                    sorter.metadata_cache.store(input_file)
+        return rows
+
+    async def _plan(self, inbox: asyncio.Queue, outbox: asyncio.Queue) -> None:
+        """Categorise the analysed files, passing the files to transfer on as they come or once all are analysed."""
+        sorter = self.sorter
+        files_list = sorter.files_list
+        while (rows := await inbox.get()) is not None:
+            if self.streaming:
+                files_list.categorize_rows(rows, sorter.ext_to_sort, sorter.copy_unsorted)
+                to_transfer = [row for row in rows if files_list.flags[row] & FLAG_SORT]
+                if to_transfer:
+                    await outbox.put(to_transfer)
+        if not self.streaming:
+            # Every file is analysed, so the duplicates can be numbered. No transfer has started to read the index
+            await asyncio.get_running_loop().run_in_executor(self._threads, self._categorize_all)
+            to_transfer = files_list.rows(flag=FLAG_SORT)
+            for start in range(0, len(to_transfer), CHUNKSIZE):
+                await outbox.put(to_transfer[start : start + CHUNKSIZE])
+        await outbox.put(None)
+
+    def _categorize_all(self) -> None:
+        """Save the metadata cache, then categorise the whole index. Runs in a thread, as it may hash files."""
+        sorter = self.sorter
+        if sorter.metadata_cache is not None:
+            logger.info("Reused %i cached datetimes", sorter.metadata_cache.hits)
+            sorter.metadata_cache.save()
+        sorter.categorize_found_files()
+
+    async def _transfer(self, rows: list[int]) -> list[int]:
+        """Transfer a chunk of files, counting their bytes and passing their messages to the reporter."""
+        sorter = self.sorter
+        to_transfer = [File.from_view(sorter.files_list[row]) for row in rows]
+        if sorter.resume:
+            remaining = [input_file for input_file in to_transfer if not self.journal.is_complete(input_file)]
+            self.skipped += len(to_transfer) - len(remaining)
+            to_transfer = remaining
+        folders = {input_file.destination_relative_path for input_file in to_transfer} - self._created_folders
+        results = await asyncio.get_running_loop().run_in_executor(
+            self._threads, self._transfer_files, folders, to_transfer
+        )
+        self._created_folders |= folders
+        for bytes_copied, message in results:
+            if bytes_copied is None:
+                self.failed += 1
+            elif sorter.instrumentation is not None:
+                sorter.instrumentation.add_bytes(read=bytes_copied, written=bytes_copied)
+            self.progress.update(bytes_done=bytes_copied or 0)
+            self._messages.append(message)
+        if self.progress.report_due():
+            sorter.reporter.write("".join(self._messages))
+            sorter.reporter.progress(self.progress)
+            self._messages = []
+        return rows
+
+    def _transfer_files(self, folders: set[str], to_transfer: list[File]) -> list[tuple[int | None, str]]:
+        """Create the folders not created yet, then transfer files and record them in the journal. Runs in a thread.
+
+        Recording may write a checkpoint, which syncs files to the disk, so it is kept off the event loop too.
+        """
+        sorter = self.sorter
+        if folders:
+            create_folders(sorter.destination_dir, folders)
+        results = [
+            ImageSort.copy_file(sorter.destination_dir, input_file, sorter.transfer_mode, self.copy_options)
+            for input_file in to_transfer
+        ]
+        with self._journal_lock:
+            for input_file, (bytes_copied, _) in zip(to_transfer, results, strict=True):
+                if bytes_copied is not None:
+                    self.journal.record(input_file, bytes_copied)
+        return results
+
+
+def pipeline_sort_directory(  # noqa: PLR0913
+    source_dir: str,
+    destination_dir: str,
+    *,
+    ext_to_sort: list[str] | None = None,
+    rename_duplicates: bool = False,
+    copy_unsorted: bool = False,
+    skip_identical: bool = False,
+    metadata_cache: MetadataCache | None = None,
+    transfer_mode: str = "copy",
+    fsync_policy: str = "none",
+    preserve_times: bool = False,
+    resume: bool = False,
+    copy_workers: int | None = None,
+    limits: StageLimits | None = None,
+    instrumentation: RunInstrumentation | None = None,
+    reporter: Reporter | None = None,
+) -> ImageSort:
+    """Analyse and sort a directory with the pipelined engine, otherwise like `image_sort.sort_directory`.
+
+    Arguments:
+        source_dir: the folder to search for files to sort
+        destination_dir: the output folder to copy the sorted files into
+        ext_to_sort: extensions of the files to sort, defaults to `JPEG_EXTENSIONS`
+        rename_duplicates: keep files with duplicate datetimes by appending a postfix to their name
+        copy_unsorted: copy all files not matching `ext_to_sort` into an 'other_files' folder
+        skip_identical: only sort one copy of files with identical contents
+        metadata_cache: MetadataCache to reuse the datetimes extracted by previous runs
+        transfer_mode: how to transfer the files into the output folder, one of `transfer.TRANSFER_MODES`
+        fsync_policy: when copies are synced to the disk, one of `transfer.FSYNC_POLICIES`
+        preserve_times: copies keep the access and modification times of their source
+        resume: skip the files an interrupted sort into the same output folder already transferred
+        copy_workers: number of chunks of files to transfer at once, chosen from the kind of storage devices if None
+        limits: most chunks each stage works on at once, overriding `copy_workers`, see `SortPipeline`
+        instrumentation: RunInstrumentation to time the run, it is started and stopped around the run. The stages
+            overlap, so they are timed together as a 'pipeline' phase, which includes the categorisation phases
+        reporter: receives the user facing progress messages, they are discarded if not provided
+    Returns: the ImageSort object used for the run, so the categorised files can be inspected
+    """
+    sorter = ImageSort(source_dir, destination_dir, reporter)
+    sorter.ext_to_sort = list(JPEG_EXTENSIONS if ext_to_sort is None else ext_to_sort)
+    sorter.rename_duplicates = rename_duplicates
+    sorter.copy_unsorted = copy_unsorted
+    sorter.skip_identical = skip_identical
+    sorter.metadata_cache = metadata_cache
+    sorter.transfer_mode = transfer_mode
+    sorter.fsync_policy = fsync_policy
+    sorter.preserve_times = preserve_times
+    sorter.resume = resume
+    sorter.copy_workers = copy_workers
+    if instrumentation is not None:
+        instrumentation.start()
+    try:
+        pipeline = SortPipeline(sorter, limits)
+        if instrumentation is None:
+            pipeline.run()
+        else:
+            sorter.instrumentation = instrumentation
+            with instrumentation.phase("pipeline"):
+                pipeline.run()
+    finally:
+        if instrumentation is not None:
+            instrumentation.stop()
+    return sorter
@@ -0,0 +1,260 @@
+"""Sort plans, the transfers of an analysed directory written to a file to review and apply later.
+
+A plan is a JSON lines file, gzip compressed if its name ends in '.gz'. The first line is a header with the
+folders and settings of the analysis, followed by one line per file to transfer, sorted by source path so
+plans of the same folder can be diffed between runs. Each line holds the source, the destination relative to
+the output folder, the category, the size and modification time, and the datetime and duplicate numbering
+the destination was derived from.
+
+Applying a plan transfers its files without analysing them again. A plan can be split into shards, which
+separate processes or machines sharing the same storage apply at once. Files are assigned to shards by
+their destination, so files that would overwrite each other are always transferred by the same shard.
+"""
+
+import gzip
+import json
+import logging
+import os
+import zlib
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timezone
+from typing import IO, NamedTuple
+
+from image_sorting_tool import __version__
+from image_sorting_tool.file_index import (
+    CATEGORY_FAILED,
+    CATEGORY_OTHER,
+    CATEGORY_SORT,
+    FLAG_DUPLICATE,
+    FLAG_RENAMED,
+    FLAG_SORT,
+    NO_VALUE,
+    FileIndex,
+    FileView,
+)
+from image_sorting_tool.image_sort import ImageSort
+from image_sorting_tool.instrumentation import RunInstrumentation
+from image_sorting_tool.journal import JOURNAL_FILENAME
+from image_sorting_tool.reporting import Reporter
+
+PLAN_FORMAT = "image-sorting-tool-plan"
+PLAN_VERSION = 1
+CATEGORY_NAMES = {CATEGORY_SORT: "sort", CATEGORY_FAILED: "failed", CATEGORY_OTHER: "other"}
+CATEGORY_IDS = {name: category for category, name in CATEGORY_NAMES.items()}
+
+logger = logging.getLogger("image-sorting-tool")
+
+
+class PlanEntry(NamedTuple):
+    """A file to transfer, as written in a plan."""
+
+    source: str  # Absolute path of the file
+    destination: str  # Path relative to the output folder, with '/' separators
+    category: str  # One of the values of CATEGORY_NAMES
+    size: int | None
+    mtime_ns: int | None
+    datetime: datetime | None
+    duplicate_idx: int | None
+    renamed: bool  # The duplicate postfix is appended to the sorted filename
+
+
+def destination_of(input_file: FileView) -> str:
+    """Return the destination of a file relative to the output folder, with '/' separators."""
+    return "/".join([*input_file.destination_relative_path.split(os.sep), input_file.sorted_filename])
+
+
+def plan_entries(files_list: FileIndex) -> list[PlanEntry]:
+    """Return the files of an index that will be transferred, sorted by source path.
+
+    Files whose stat has not been read yet are stat'ed, so the plan records the size of every file.
+    """
+    entries = []
+    for row in files_list.rows(flag=FLAG_SORT):
+        input_file = files_list[row]
+        if input_file.size is None:
+            try:
+                input_file.read_stat()
+            except OSError as error:
+                logger.warning("Failed to stat %s: %s", input_file.fullpath, error)
+        entries.append(
+            PlanEntry(
+                source=input_file.fullpath,
+                destination=destination_of(input_file),
+                category=CATEGORY_NAMES[files_list.categories[row]],
+                size=input_file.size,
+                mtime_ns=input_file.mtime_ns,
+                datetime=input_file.datetime,
+                duplicate_idx=input_file.duplicate_idx,
+                renamed=bool(files_list.flags[row] & FLAG_RENAMED),
+            )
+        )
+    entries.sort(key=lambda entry: entry.source)
+    return entries
+
+
+def open_jsonl(path: str, mode: str) -> IO[str]:
+    """Open a JSON lines file for reading or writing text, compressed if its name ends in '.gz'."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")  # noqa: SIM115
+
+
+def write_plan(path: str, sorter: ImageSort) -> int:
+    """Write the transfers of an analysed directory to a plan file.
+
+    Arguments:
+        path: plan file to write
+        sorter: ImageSort object that has run `find_images`
+    Returns: the number of files in the plan
+    """
+    entries = plan_entries(sorter.files_list)
+    header = {
+        "format": PLAN_FORMAT,
+        "version": PLAN_VERSION,
+        "tool_version": __version__,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source_dir": os.path.abspath(sorter.source_dir),
+        "destination_dir": os.path.abspath(sorter.destination_dir),
+        "files": len(entries),
+        "bytes": sum(entry.size or 0 for entry in entries),
+        "settings": {
+            "ext_to_sort": sorter.ext_to_sort,
+            "rename_duplicates": sorter.rename_duplicates,
+            "copy_unsorted": sorter.copy_unsorted,
+            "skip_identical": sorter.skip_identical,
+        },
+    }
+    with open_jsonl(path, "w") as plan_file:
+        plan_file.write(json.dumps(header) + "\n")
+        for entry in entries:
+            line = entry._asdict()
+            line["datetime"] = None if entry.datetime is None else entry.datetime.isoformat()
+            plan_file.write(json.dumps(line) + "\n")
+    logger.info("Wrote a plan of %i files to %s", len(entries), path)
+    return len(entries)
+
+
+def read_plan(path: str) -> tuple[dict, Iterator[PlanEntry]]:
+    """Read a plan file.
+
+    Arguments:
+        path: plan file to read
+    Returns: tuple of the header, and a generator of the entries that reads the file as it is iterated
+    Raises:
+        ValueError: if the file is not a plan, or of a newer version than this tool understands
+    """
+    plan_file = open_jsonl(path, "r")
+    try:
+        header = json.loads(plan_file.readline() or "{}")
+    except json.JSONDecodeError:
+        header = {}
+    if header.get("format") != PLAN_FORMAT or header.get("version", 0) > PLAN_VERSION:
+        plan_file.close()
+        err_msg = f"Not a sort plan of version {PLAN_VERSION} or older: '{path}'"
+        raise ValueError(err_msg)
+
+    def entries() -> Iterator[PlanEntry]:
+        with plan_file:
+            for line in plan_file:
+                fields = json.loads(line)
+                if fields["datetime"] is not None:
+                    fields["datetime"] = datetime.fromisoformat(fields["datetime"])
+                yield PlanEntry(**fields)
+
+    return header, entries()
+
+
+def shard_of(entry: PlanEntry, shard_count: int) -> int:
+    """Return the shard a file is transferred by, from 0 to `shard_count` - 1, decided by its destination."""
+    return zlib.crc32(entry.destination.encode()) % shard_count
+
+
+def shard_journal_filename(shard: int, shard_count: int) -> str:
+    """Return the journal filename of a shard, so shards applied at once keep separate journals."""
+    stem, extension = os.path.splitext(JOURNAL_FILENAME)
+    return f"{stem}.shard-{shard + 1}-of-{shard_count}{extension}"
+
+
+def plan_index(entries: Iterable[PlanEntry]) -> FileIndex:
+    """Build a FileIndex of the files of a plan, categorised and numbered as they were analysed.
+
+    Raises:
+        ValueError: if an entry's destination does not follow from its category, datetime and numbering,
+            such as when it was edited by hand. Entries may be removed from a plan, but not changed.
+    """
+    files_list = FileIndex()
+    for entry in entries:
+        row = files_list.append(entry.source)
+        input_file = files_list[row]
+        input_file.datetime = entry.datetime
+        files_list.sizes[row] = NO_VALUE if entry.size is None else entry.size
+        files_list.mtimes[row] = NO_VALUE if entry.mtime_ns is None else entry.mtime_ns
+        files_list.categories[row] = CATEGORY_IDS[entry.category]
+        files_list.duplicate_indexes[row] = entry.duplicate_idx or 0
+        files_list.flags[row] = (
+            FLAG_SORT | (FLAG_DUPLICATE if entry.duplicate_idx else 0) | (FLAG_RENAMED if entry.renamed else 0)
+        )
+        if destination_of(input_file) != entry.destination:
+            err_msg = f"Plan entry of '{entry.source}' was changed, its destination '{entry.destination}' is invalid"
+            raise ValueError(err_msg)
+    return files_list
+
+
+def apply_plan(  # noqa: PLR0913
+    plan_path: str,
+    *,
+    shard: int | None = None,
+    shard_count: int = 1,
+    transfer_mode: str = "copy",
+    fsync_policy: str = "none",
+    preserve_times: bool = False,
+    resume: bool = False,
+    copy_workers: int | None = None,
+    autotune: bool = False,
+    instrumentation: RunInstrumentation | None = None,
+    reporter: Reporter | None = None,
+) -> ImageSort:
+    """Transfer the files of a plan, or of one shard of it, into the output folder recorded in the plan.
+
+    Arguments:
+        plan_path: plan file written by `write_plan`
+        shard: only transfer the files of this shard, from 0 to `shard_count` - 1, or all files if None
+        shard_count: number of shards the plan is split into
+        transfer_mode: how to transfer the files into the output folder, one of `transfer.TRANSFER_MODES`
+        fsync_policy: when copies are synced to the disk, one of `transfer.FSYNC_POLICIES`
+        preserve_times: copies keep the access and modification times of their source
+        resume: skip the files an interrupted apply of the same plan, or shard, already transferred
+        copy_workers: number of files to copy in parallel, chosen from the kind of storage devices if None
+        autotune: tune the number of threads copying files from their measured throughput
+        instrumentation: RunInstrumentation to time the run, it is started and stopped around the run
+        reporter: receives the user facing progress messages, they are discarded if not provided
+    Returns: the ImageSort object used for the run
+    Raises:
+        ValueError: if the file is not a valid plan, or the shard is out of range
+    """
+    if shard is not None and not 0 <= shard < shard_count:
+        err_msg = f"Shard {shard + 1} does not exist, the plan is split into {shard_count} shards"
+        raise ValueError(err_msg)
+    header, entries = read_plan(plan_path)
+    if shard is not None:
+        entries = (entry for entry in entries if shard_of(entry, shard_count) == shard)
+    sorter = ImageSort(header["source_dir"], header["destination_dir"], reporter)
+    sorter.files_list = plan_index(entries)
+    if shard is not None:
+        sorter.journal_filename = shard_journal_filename(shard, shard_count)
+    sorter.transfer_mode = transfer_mode
+    sorter.fsync_policy = fsync_policy
+    sorter.preserve_times = preserve_times
+    sorter.resume = resume
+    sorter.copy_workers = copy_workers
+    sorter.autotune = autotune
+    sorter.instrumentation = instrumentation
+    logger.info("Applying %i files of the plan %s", len(sorter.files_list), plan_path)
+    if instrumentation is not None:
+        instrumentation.start()
+    try:
+        sorter.run_parallel_sorting()
+    finally:
+        if instrumentation is not None:
+            instrumentation.stop()
+    return sorter
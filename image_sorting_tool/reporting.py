@@ -0,0 +1,166 @@
+"""Progress reporters that receive the user facing messages of a sorting run.
+
+The sorting engine never talks to a user interface directly, instead it hands its messages to a reporter.
+The GUI provides a reporter that renders into its text window, while headless runs can print to a stream
+or discard the messages altogether.
+"""
+
+import sys
+import time
+from collections import deque
+from typing import TextIO
+
+# Minimum seconds between two progress reports, so reporters are not flooded on large runs
+PROGRESS_INTERVAL = 0.5
+# Seconds of recent progress the throughput and ETA are measured over, so they follow changes in speed
+RATE_WINDOW = 10.0
+SECONDS_PER_MINUTE = 60
+
+
+class Progress:
+    """Counters of a running phase, such as analysing or sorting.
+
+    The engine updates the counters for every file, but only hands them to the reporter every
+    `PROGRESS_INTERVAL` seconds, so reporting costs nothing per file. The counters are sampled at each report,
+    so the throughput and ETA are measured over the last `RATE_WINDOW` seconds rather than the whole phase.
+    """
+
+    def __init__(self, phase: str, total_files: int | None = None, total_bytes: int | None = None) -> None:
+        """Initialize Progress object.
+
+        Arguments:
+            phase: name of the phase shown to the user, such as 'Sorting'
+            total_files: number of files the phase will process, None if not known in advance
+            total_bytes: number of bytes the phase will process, None if not known in advance
+        """
+        self.phase = phase
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.files_done = 0
+        self.bytes_done = 0
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self._samples = deque([(self.started, 0, 0)])  # (time, files done, bytes done) of recent reports
+
+    def update(self, files: int = 1, bytes_done: int = 0) -> None:
+        """Add processed files and bytes to the counters."""
+        self.files_done += files
+        self.bytes_done += bytes_done
+
+    def report_due(self) -> bool:
+        """Return True at most once every `PROGRESS_INTERVAL` seconds, when a report should be sent."""
+        now = time.monotonic()
+        if now - self.last_report < PROGRESS_INTERVAL:
+            return False
+        self.last_report = now
+        self._samples.append((now, self.files_done, self.bytes_done))
+        # Keep the last sample from before the window, so the window always spans RATE_WINDOW seconds
+        while len(self._samples) > 1 and self._samples[1][0] <= now - RATE_WINDOW:
+            self._samples.popleft()
+        return True
+
+    def _recent(self) -> tuple[float, int, int]:
+        """Return the seconds, files and bytes processed since the start of the rate window."""
+        since, files_before, bytes_before = self._samples[0]
+        return time.monotonic() - since, self.files_done - files_before, self.bytes_done - bytes_before
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the phase started."""
+        return time.monotonic() - self.started
+
+    @property
+    def bytes_per_second(self) -> float:
+        """Throughput over the last `RATE_WINDOW` seconds."""
+        seconds, _, recent_bytes = self._recent()
+        return recent_bytes / max(seconds, 1e-9)
+
+    @property
+    def fraction_done(self) -> float | None:
+        """Fraction of the phase completed between 0 and 1, None if the totals are not known."""
+        if self.total_bytes:
+            return min(1.0, self.bytes_done / self.total_bytes)
+        if self.total_files:
+            return min(1.0, self.files_done / self.total_files)
+        return None
+
+    @property
+    def eta(self) -> float | None:
+        """Estimated seconds until the phase finishes, None if it cannot be estimated yet.
+
+        The remaining bytes are used if their total is known, as a few large videos take far longer than as
+        many photos. The rate is that of the last `RATE_WINDOW` seconds, or of the whole phase if nothing was
+        processed within the window, such as while a single large file is being copied.
+        """
+        seconds, recent_files, recent_bytes = self._recent()
+        if self.total_bytes and self.bytes_done:
+            if not recent_bytes:
+                seconds, recent_bytes = self.elapsed, self.bytes_done
+            return seconds * max(0, self.total_bytes - self.bytes_done) / recent_bytes
+        if self.total_files and self.files_done:
+            if not recent_files:
+                seconds, recent_files = self.elapsed, self.files_done
+            return seconds * max(0, self.total_files - self.files_done) / recent_files
+        return None
+
+    def summary(self) -> str:
+        """Single line description of the progress, such as 'Sorting: 10 of 20 files, 50.0 MB, 5.0 MB/s, ETA 0m 3s'."""
+        text = f"{self.phase}: {self.files_done}"
+        if self.total_files is not None:
+            text += f" of {self.total_files}"
+        text += " files"
+        if self.bytes_done:
+            text += f", {self.bytes_done / 1e6:.1f} MB, {self.bytes_per_second / 1e6:.1f} MB/s"
+        eta = self.eta
+        if eta is not None:
+            text += f", ETA {int(eta // SECONDS_PER_MINUTE)}m {int(eta % SECONDS_PER_MINUTE)}s"
+        return text
+
+
+class Reporter:
+    """Reporter that silently discards all messages.
+
+    This is the base class for all reporters, subclasses override the hooks they are interested in.
+    """
+
+    def clear(self) -> None:
+        """Clear any previously reported messages."""
+
+    def write(self, message: str) -> None:
+        """Report a message to the user.
+
+        Arguments:
+            message: text to display, including any trailing newline
+        """
+
+    def progress(self, progress: Progress) -> None:
+        """Report the progress of the running phase, called at most every `PROGRESS_INTERVAL` seconds.
+
+        Arguments:
+            progress: counters of the running phase
+        """
+
+
+class StreamReporter(Reporter):
+    """Reporter that writes all messages to a text stream such as stdout."""
+
+    def __init__(self, stream: TextIO | None = None) -> None:
+        """Initialize StreamReporter object.
+
+        Arguments:
+            stream: text stream to write to, defaults to `sys.stdout`
+        """
+        self.stream = stream if stream is not None else sys.stdout
+
+    def write(self, message: str) -> None:
+        """Write the message to the stream, replacing any progress line shown on a terminal."""
+        if self.stream.isatty():
+            message = "\r\033[K" + message
+        self.stream.write(message)
+        self.stream.flush()
+
+    def progress(self, progress: Progress) -> None:
+        """Show the progress on a single updating line, only when writing to a terminal."""
+        if self.stream.isatty():
+            self.stream.write(f"\r{progress.summary()}\033[K")
+            self.stream.flush()
@@ -0,0 +1,274 @@
+"""Sort a directory with several independent executors, such as processes or machines sharing the same storage.
+
+Analysing the files is most of the work of a sort, but numbering the files that share a datetime needs the
+datetimes of all of them, so a sort cannot simply be split by folder. A sharded sort runs in three steps:
+
+1. Each of N shards analyses the files of its own folders, assigned by a hash of the folder path relative to
+   the input folder, and writes their datetimes and stats to a partial index. No shard reads another's files.
+2. A merge reads the partial indexes of all shards, then categorises the files, skips identical copies and
+   numbers the duplicates over the whole input folder, exactly as a single sort would. It writes a sort plan.
+3. Each shard transfers its shard of the plan with `plan.apply_plan`.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import zlib
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+from image_sorting_tool import __version__
+from image_sorting_tool.cache import MetadataCache
+from image_sorting_tool.file_index import NO_INODE, NO_VALUE
+from image_sorting_tool.image_sort import JPEG_EXTENSIONS, ImageSort
+from image_sorting_tool.instrumentation import RunInstrumentation
+from image_sorting_tool.plan import open_jsonl
+from image_sorting_tool.reporting import Reporter
+
+PARTIAL_INDEX_FORMAT = "image-sorting-tool-partial-index"
+PARTIAL_INDEX_VERSION = 1
+
+logger = logging.getLogger("image-sorting-tool")
+
+
+class IndexedFile(NamedTuple):
+    """An analysed file, as written in a partial index. Stat values are None if the file could not be stat'ed."""
+
+    source: str  # Absolute path of the file
+    seconds: int | None  # Datetime as epoch seconds, None if it could not be extracted
+    size: int | None
+    mtime_ns: int | None
+    inode: int | None
+
+
+def folder_shard(folder: str, source_dir: str, shard_count: int) -> int:
+    """Return the shard analysing the files of a folder, from 0 to `shard_count` - 1.
+
+    The hash is of the folder path relative to the input folder, so executors with the input folder mounted at
+    different paths agree on the shards.
+    """
+    relative_path = os.path.relpath(folder, source_dir).replace(os.sep, "/")
+    return zlib.crc32(relative_path.encode()) % shard_count
+
+
+def check_shard(shard: int, shard_count: int) -> None:
+    """Check a shard is one of `shard_count` shards, numbered from 0.
+
+    Raises:
+        ValueError: if the shard does not exist
+    """
+    if shard_count < 1 or not 0 <= shard < shard_count:
+        err_msg = f"Shard {shard + 1} does not exist, the sort is split into {shard_count} shards"
+        raise ValueError(err_msg)
+
+
+def analyse_shard(  # noqa: PLR0913
+    source_dir: str,
+    destination_dir: str,
+    index_path: str,
+    *,
+    shard: int,
+    shard_count: int,
+    metadata_cache: MetadataCache | None = None,
+    autotune: bool = False,
+    instrumentation: RunInstrumentation | None = None,
+    reporter: Reporter | None = None,
+) -> ImageSort:
+    """Analyse the files of one shard of a directory and write them to a partial index.
+
+    Every shard searches the whole folder tree, but only lists, stats and analyses the files of its own folders.
+
+    Arguments:
+        source_dir: the folder to search for files to sort
+        destination_dir: the output folder the files will be sorted into
+        index_path: partial index file to write, compressed if it ends in '.gz'
+        shard: the shard to analyse, from 0 to `shard_count` - 1
+        shard_count: number of shards the sort is split into
+        metadata_cache: MetadataCache to reuse the datetimes extracted by previous runs
+        autotune: tune the number of processes analysing files from their measured throughput
+        instrumentation: RunInstrumentation to time the run, it is started and stopped around the run
+        reporter: receives the user facing progress messages, they are discarded if not provided
+    Returns: the ImageSort object used for the analysis, with its files analysed but not categorised
+    Raises:
+        ValueError: if the shard does not exist
+    """
+    check_shard(shard, shard_count)
+    source_dir = os.path.abspath(source_dir)
+    sorter = ImageSort(source_dir, destination_dir, reporter)
+    sorter.metadata_cache = metadata_cache
+    sorter.autotune = autotune
+    sorter.instrumentation = instrumentation
+    sorter.folder_filter = lambda folder: folder_shard(folder, source_dir, shard_count) == shard
+    if instrumentation is not None:
+        instrumentation.start()
+    try:
+        sorter.analyse_files()
+        with contextlib.nullcontext() if instrumentation is None else instrumentation.phase("stat"):
+            for input_file in sorter.files_list:
+                if input_file.size is None:
+                    try:
+                        input_file.read_stat()
+                    except OSError as error:
+                        logger.warning("Failed to stat %s: %s", input_file.fullpath, error)
+        write_partial_index(index_path, sorter, shard, shard_count)
+    finally:
+        if instrumentation is not None:
+            instrumentation.stop()
+    return sorter
+
+
+def write_partial_index(path: str, sorter: ImageSort, shard: int, shard_count: int) -> None:
+    """Write the analysed files of a shard to a partial index file.
+
+    Arguments:
+        path: partial index file to write
+        sorter: ImageSort object that has run `analyse_files` on the shard
+        shard: the shard the files were analysed by
+        shard_count: number of shards the sort is split into
+    """
+    files_list = sorter.files_list
+    header = {
+        "format": PARTIAL_INDEX_FORMAT,
+        "version": PARTIAL_INDEX_VERSION,
+        "tool_version": __version__,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source_dir": os.path.abspath(sorter.source_dir),
+        "destination_dir": os.path.abspath(sorter.destination_dir),
+        "shard": shard,
+        "shard_count": shard_count,
+        "files": len(files_list),
+    }
+    with open_jsonl(path, "w") as index_file:
+        index_file.write(json.dumps(header) + "\n")
+        for row in range(len(files_list)):
+            seconds, size = files_list.datetimes[row], files_list.sizes[row]
+            mtime_ns, inode = files_list.mtimes[row], files_list.inodes[row]
+            entry = IndexedFile(
+                source=files_list.fullpath(row),
+                seconds=None if seconds == NO_VALUE else seconds,
+                size=None if size == NO_VALUE else size,
+                mtime_ns=None if mtime_ns == NO_VALUE else mtime_ns,
+                inode=None if inode == NO_INODE else inode,
+            )
+            index_file.write(json.dumps(entry._asdict()) + "\n")
+    logger.info("Wrote a partial index of %i files of shard %i/%i to %s", len(files_list), shard + 1, shard_count, path)
+
+
+def read_partial_index(path: str) -> tuple[dict, Iterator[IndexedFile]]:
+    """Read a partial index file.
+
+    Arguments:
+        path: partial index file to read
+    Returns: tuple of the header, and a generator of the files that reads the file as it is iterated
+    Raises:
+        ValueError: if the file is not a partial index, or of a newer version than this tool understands
+    """
+    index_file = open_jsonl(path, "r")
+    try:
+        header = json.loads(index_file.readline() or "{}")
+    except json.JSONDecodeError:
+        header = {}
+    if header.get("format") != PARTIAL_INDEX_FORMAT or header.get("version", 0) > PARTIAL_INDEX_VERSION:
+        index_file.close()
+        err_msg = f"Not a partial index of version {PARTIAL_INDEX_VERSION} or older: '{path}'"
+        raise ValueError(err_msg)
+
+    def entries() -> Iterator[IndexedFile]:
+        with index_file:
+            for line in index_file:
+                yield IndexedFile(**json.loads(line))
+
+    return header, entries()
+
+
+def check_partial_indexes(headers: list[dict]) -> None:
+    """Check the partial indexes to merge are of the same sort, and cover each of its shards exactly once.
+
+    Raises:
+        ValueError: if the partial indexes are of different sorts, or shards are missing or repeated
+    """
+    first = headers[0]
+    for header in headers[1:]:
+        for key in ("source_dir", "destination_dir", "shard_count"):
+            if header[key] != first[key]:
+                err_msg = f"Partial indexes of different sorts, with '{key}' {first[key]!r} and {header[key]!r}"
+                raise ValueError(err_msg)
+    shards = sorted(header["shard"] for header in headers)
+    if shards != list(range(first["shard_count"])):
+        missing = sorted(set(range(first["shard_count"])) - set(shards))
+        repeated = sorted({shard for shard in shards if shards.count(shard) > 1})
+        err_msg = (
+            f"Partial indexes must cover each of the {first['shard_count']} shards once, missing shards "
+            f"{[shard + 1 for shard in missing]} and repeated shards {[shard + 1 for shard in repeated]}"
+        )
+        raise ValueError(err_msg)
+
+
+def merge_partial_indexes(  # noqa: PLR0913
+    index_paths: list[str],
+    *,
+    ext_to_sort: list[str] | None = None,
+    rename_duplicates: bool = False,
+    copy_unsorted: bool = False,
+    skip_identical: bool = False,
+    metadata_cache: MetadataCache | None = None,
+    autotune: bool = False,
+    instrumentation: RunInstrumentation | None = None,
+    reporter: Reporter | None = None,
+) -> ImageSort:
+    """Merge the partial indexes of every shard, then categorise the files and number the duplicates globally.
+
+    Files are numbered in order of their path across all shards, so the result is the same as sorting the
+    whole directory at once, whatever the number of shards. Comparing the contents of files to skip identical
+    copies only reads files of the same size as another, which are found from the sizes in the partial indexes.
+
+    Arguments:
+        index_paths: partial index files written by `analyse_shard`, one of each shard
+        ext_to_sort: extensions of the files to sort, defaults to `JPEG_EXTENSIONS`
+        rename_duplicates: keep files with duplicate datetimes by appending a postfix to their name
+        copy_unsorted: copy all files not matching `ext_to_sort` into an 'other_files' folder
+        skip_identical: only sort one copy of files with identical contents
+        metadata_cache: MetadataCache to reuse the hashes of unchanged files from previous runs
+        autotune: tune the number of threads hashing files from their measured throughput
+        instrumentation: RunInstrumentation to time the merge, it is started and stopped around the merge
+        reporter: receives the user facing progress messages, they are discarded if not provided
+    Returns: the ImageSort object with its files categorised, ready for `plan.write_plan`
+    Raises:
+        ValueError: if a file is not a partial index, or the partial indexes do not make up one whole sort
+    """
+    if not index_paths:
+        err_msg = "At least one partial index is needed to merge"
+        raise ValueError(err_msg)
+    readers = [read_partial_index(path) for path in index_paths]
+    headers = [header for header, _ in readers]
+    check_partial_indexes(headers)
+
+    sorter = ImageSort(headers[0]["source_dir"], headers[0]["destination_dir"], reporter)
+    sorter.ext_to_sort = list(JPEG_EXTENSIONS if ext_to_sort is None else ext_to_sort)
+    sorter.rename_duplicates = rename_duplicates
+    sorter.copy_unsorted = copy_unsorted
+    sorter.skip_identical = skip_identical
+    sorter.metadata_cache = metadata_cache
+    sorter.autotune = autotune
+    sorter.instrumentation = instrumentation
+    if instrumentation is not None:
+        instrumentation.start()
+    try:
+        with contextlib.nullcontext() if instrumentation is None else instrumentation.phase("merge"):
+            files_list = sorter.files_list
+            for _, entries in readers:
+                for entry in entries:
+                    row = files_list.append(entry.source)
+                    files_list.datetimes[row] = NO_VALUE if entry.seconds is None else entry.seconds
+                    files_list.sizes[row] = NO_VALUE if entry.size is None else entry.size
+                    files_list.mtimes[row] = NO_VALUE if entry.mtime_ns is None else entry.mtime_ns
+                    files_list.inodes[row] = NO_INODE if entry.inode is None else entry.inode
+        logger.info("Merged %i files from %i partial indexes", len(files_list), len(index_paths))
+        sorter.reporter.write(f"Merged {len(files_list)} files analysed by {len(index_paths)} shards.\n")
+        sorter.categorize_found_files()
+    finally:
+        if instrumentation is not None:
+            instrumentation.stop()
+    return sorter
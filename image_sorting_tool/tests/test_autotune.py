@@ -0,0 +1,73 @@
+"""Unit tests for the autotune module."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from image_sorting_tool.autotune import WorkerTuner, candidate_counts
+
+
+def test_candidate_counts() -> None:
+    """Test the candidates are powers of two up to and including the maximum."""
+    assert candidate_counts(12) == [1, 2, 4, 8, 12]
+    assert candidate_counts(8) == [1, 2, 4, 8]
+    assert candidate_counts(1) == [1]
+
+
+def test_warm_up_settles_on_fastest_count() -> None:
+    """Test the warm-up climbs while throughput improves, and settles on the fastest count once it drops."""
+    tuner = WorkerTuner("test", [1, 2, 4, 8])
+    for throughput in (100, 180, 150):
+        tuner._measured(throughput)
+
+    assert tuner.workers == 2
+    assert tuner.chosen_throughput == 180
+    tuner._measured(170)  # Normal variation keeps the chosen count
+    assert (tuner.workers, tuner.chosen_throughput) == (2, 180)
+
+
+def test_degraded_throughput_warms_up_again() -> None:
+    """Test a large drop in throughput tries the counts around the chosen one again."""
+    tuner = WorkerTuner("test", [1, 2, 4, 8, 16])
+    for throughput in (100, 200, 300, 250):
+        tuner._measured(throughput)
+    assert tuner.workers == 4
+
+    tuner._measured(100)
+    assert (tuner.workers, tuner.chosen_throughput) == (2, None)
+    for throughput in (90, 60):
+        tuner._measured(throughput)
+    assert (tuner.workers, tuner.chosen_throughput) == (2, 90)
+
+
+def test_wrap_limits_concurrency() -> None:
+    """Test no more functions run at once than the current count, however many threads the pool has."""
+    tuner = WorkerTuner("test", [2], sample_size=1000)
+    running = 0
+    most_running = 0
+    lock = threading.Lock()
+
+    def work(item: int) -> int:
+        nonlocal running, most_running
+        with lock:
+            running += 1
+            most_running = max(most_running, running)
+        time.sleep(0.005)
+        with lock:
+            running -= 1
+        return item
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert list(executor.map(tuner.wrap(work), range(20))) == list(range(20))
+    assert most_running <= 2
+
+
+def test_close_releases_waiting_threads() -> None:
+    """Test closing the tuner unblocks a thread waiting for a worker, such as the feeder of a stopped pool."""
+    tuner = WorkerTuner("test", [1])
+    tuner.acquire()
+    waiter = threading.Thread(target=tuner.acquire)
+    waiter.start()
+    tuner.close()
+    waiter.join(timeout=5)
+    assert not waiter.is_alive()
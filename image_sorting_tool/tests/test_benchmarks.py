@@ -0,0 +1,58 @@
+"""Smoke tests of the benchmark suite, so it keeps working as the tool changes."""
+
+import json
+import os
+
+from benchmarks import run
+from benchmarks.library import generate_library
+from image_sorting_tool.image_sort import File, ImageSort
+
+
+def list_library(root) -> dict[str, bytes]:
+    """Return the contents of every file in a library, by relative path."""
+    contents = {}
+    for folder, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(folder, filename)
+            with open(path, "rb") as file:
+                contents[os.path.relpath(path, root)] = file.read()
+    return contents
+
+
+def test_generate_library_is_reproducible(tmp_path) -> None:
+    """Test the same seed generates the same library, and the counts match the files written."""
+    spec = generate_library(str(tmp_path / "a"), files=60, depth=1, width=2, burst_ratio=0.2, seed=3)
+    generate_library(str(tmp_path / "b"), files=60, depth=1, width=2, burst_ratio=0.2, seed=3)
+
+    library = list_library(tmp_path / "a")
+    assert library == list_library(tmp_path / "b")
+    assert len(library) == sum(spec["counts"].values()) == 60
+    assert spec["bytes"] == sum(len(contents) for contents in library.values())
+    assert any("_BURST" in path for path in library)
+
+
+def test_generated_files_are_dated(tmp_path) -> None:
+    """Test the datetimes written into the EXIF data and names of generated files are read back."""
+    generate_library(str(tmp_path), files=40, mix={"jpeg_exif": 1, "png": 1, "jpeg_undated": 1}, seed=1)
+
+    for path in list_library(tmp_path):
+        dtime = ImageSort.get_datetime(File(str(tmp_path / path))).datetime
+        assert (dtime is None) == os.path.basename(path).startswith("download_"), path
+
+
+def test_main_stores_and_compares_results(tmp_path, capsys) -> None:
+    """Test a benchmark run stores JSON results, and a later run is compared against them."""
+    library = str(tmp_path / "library")
+    output = str(tmp_path / "results.json")
+    args = ["--files", "30", "--repeat", "1", "--threads", "1", "--library", library]
+
+    assert run.main([*args, "--output", output]) == 0
+    with open(output, encoding="utf-8") as results_file:
+        results = json.load(results_file)
+    assert list(results["phases"]) == list(run.PHASES)
+    assert results["library"]["files"] == 30
+    capsys.readouterr()
+
+    assert run.main([*args, "--compare", output, "--threshold", "1000"]) == 0
+    assert "Generating" not in capsys.readouterr().out  # The library is reused
+    assert run.compare_results(results, {"phases": {"_find_files": {"min": 1e-9}}}) != []
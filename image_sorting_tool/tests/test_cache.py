@@ -0,0 +1,121 @@
+"""Unit tests for the cache module."""
+
+import os
+import shutil
+from collections.abc import Generator
+from datetime import datetime
+
+import pytest
+
+from image_sorting_tool.cache import MetadataCache, datetime_to_seconds, seconds_to_datetime
+from image_sorting_tool.filename_dates import default_parser
+from image_sorting_tool.image_sort import File, ImageSort
+
+tests_path = os.path.dirname(os.path.abspath(__file__))
+BURST_ASSETS_PATH = tests_path + "/../../assets/test_assets/burst"
+
+
+@pytest.fixture(name="cache")
+def fixture_cache(tmp_path) -> Generator[MetadataCache, None, None]:
+    """Open a cache in a tmp directory."""
+    cache = MetadataCache(str(tmp_path / "cache" / "metadata.sqlite3"))
+    yield cache
+    cache.close()
+
+
+def make_file(path, content=b"data") -> File:
+    """Write a file and return its File object with the stat attributes populated."""
+    with open(path, "wb") as file_obj:
+        file_obj.write(content)
+    input_file = File(str(path))
+    input_file.read_stat()
+    return input_file
+
+
+def test_seconds_round_trip() -> None:
+    """Test datetimes survive conversion to and from epoch seconds."""
+    dtime = datetime(2013, 4, 8, 13, 17, 38)
+    assert seconds_to_datetime(datetime_to_seconds(dtime)) == dtime
+    assert seconds_to_datetime(datetime_to_seconds(datetime(1901, 1, 1))) == datetime(1901, 1, 1)
+
+
+def test_lookup_and_persist(cache, tmp_path) -> None:
+    """Test stored results, including failures, are found again after reopening the cache."""
+    dated = make_file(tmp_path / "dated.jpg")
+    dated.datetime = datetime(2020, 1, 2, 3, 4, 5)
+    failed = make_file(tmp_path / "failed.jpg")
+    cache.store(dated)
+    cache.store(failed)
+    cache.save()
+
+    reopened = MetadataCache(cache.path)
+    reopened.load(str(tmp_path))
+    assert reopened.lookup(dated) == (True, datetime(2020, 1, 2, 3, 4, 5))
+    assert reopened.lookup(failed) == (True, None)
+    reopened.close()
+
+
+def test_changed_file_is_a_miss(cache, tmp_path) -> None:
+    """Test a file whose size or modification time changed is not served from the cache."""
+    input_file = make_file(tmp_path / "a.jpg")
+    input_file.datetime = datetime(2020, 1, 1)
+    cache.store(input_file)
+
+    changed = make_file(tmp_path / "a.jpg", b"different data")
+    assert cache.lookup(changed) == (False, None)
+
+    cache.invalidate(str(tmp_path / "a.jpg"))
+    assert cache.lookup(input_file) == (False, None)
+
+
+def test_eviction(tmp_path) -> None:
+    """Test the cache never holds more than max_entries after saving."""
+    cache = MetadataCache(str(tmp_path / "metadata.sqlite3"), max_entries=3)
+    for idx in range(5):
+        cache.store(make_file(tmp_path / f"{idx}.jpg"))
+    cache.save()
+    assert cache.connection.execute("SELECT COUNT(*) FROM datetimes").fetchone()[0] == 3
+    cache.close()
+
+
+def test_image_sort_reuses_cache(cache, tmp_path) -> None:
+    """Test a second analysis of an unchanged directory takes every datetime from the cache."""
+    tmp_src = str(tmp_path / "src")
+    shutil.copytree(BURST_ASSETS_PATH, tmp_src)
+    first = ImageSort(tmp_src, str(tmp_path / "dst"))
+    first.metadata_cache = cache
+    first.find_images()
+    first.cleanup()
+
+    second = ImageSort(tmp_src, str(tmp_path / "dst"))
+    second.metadata_cache = cache
+    second.find_images()
+    second.cleanup()
+
+    assert cache.hits == len(os.listdir(tmp_src))
+    assert [i.datetime for i in second.files_list] == [i.datetime for i in first.files_list]
+
+
+def test_registered_pattern_is_not_served_stale_results(cache, tmp_path, monkeypatch) -> None:
+    """Test files cached before a filename pattern was registered are analysed again with the pattern."""
+    tmp_src = tmp_path / "src"
+    tmp_src.mkdir()
+    (tmp_src / "holiday_d05m06y2019.txt").write_bytes(b"data")
+
+    def analyse() -> datetime | None:
+        sorter = ImageSort(str(tmp_src), str(tmp_path / "dst"))
+        sorter.ext_to_sort = [".txt"]
+        sorter.metadata_cache = cache
+        sorter.find_images()
+        cache.save()
+        return sorter.files_list[0].datetime
+
+    assert analyse() is None
+    for attribute in ("user_patterns", "patterns"):
+        monkeypatch.setattr(default_parser, attribute, list(getattr(default_parser, attribute)))
+    monkeypatch.setattr(default_parser, "patterns_digest", default_parser.patterns_digest)
+    default_parser.register(r"d(?P<day>\d\d)m(?P<month>\d\d)y(?P<year>\d{4})")
+
+    assert analyse() == datetime(2019, 6, 5)
+    assert analyse() == datetime(2019, 6, 5)
+    assert cache.hits == 1  # Only the run with the same pattern reused the cached result
@@ -0,0 +1,69 @@
+"""Unit tests for the dedup module."""
+
+from unittest.mock import patch
+
+from image_sorting_tool import dedup
+from image_sorting_tool.cache import MetadataCache
+from image_sorting_tool.dedup import PARTIAL_HASH_BYTES, find_identical_files, full_hash, partial_hash
+from image_sorting_tool.image_sort import File
+
+
+def make_files(tmp_path, contents: dict[str, bytes]) -> list[File]:
+    """Write files with the given contents and return their File objects in the order given."""
+    files = []
+    for name, content in contents.items():
+        (tmp_path / name).write_bytes(content)
+        files.append(File(str(tmp_path / name)))
+    return files
+
+
+def test_partial_hash_covers_small_files(tmp_path) -> None:
+    """Test the partial hash of a small file changes with any of its bytes."""
+    files = make_files(tmp_path, {"a": b"x" * 100, "b": b"x" * 99 + b"y"})
+    assert partial_hash(files[0].fullpath, 100) != partial_hash(files[1].fullpath, 100)
+
+
+def test_find_identical_files(tmp_path) -> None:
+    """Test only files with identical contents are grouped, including large files differing in the middle."""
+    large = b"a" * PARTIAL_HASH_BYTES * 4
+    large_changed = large[: PARTIAL_HASH_BYTES * 2] + b"b" + large[PARTIAL_HASH_BYTES * 2 + 1 :]
+    files = make_files(
+        tmp_path,
+        {
+            "small_copy.jpg": b"photo",
+            "small.jpg": b"photo",
+            "same_size.jpg": b"other",
+            "large.jpg": large,
+            "large_changed.jpg": large_changed,
+            "large_copy.jpg": large,
+            "unique.jpg": b"unique contents",
+        },
+    )
+
+    assert find_identical_files(files) == [[3, 5], [1, 0]]
+
+
+def test_hashes_are_cached(tmp_path) -> None:
+    """Test unchanged files are not reread when their hashes are in the cache."""
+    large = b"a" * PARTIAL_HASH_BYTES * 4
+    files = make_files(tmp_path, {"one.jpg": large, "two.jpg": large})
+    cache = MetadataCache(str(tmp_path / "metadata.sqlite3"))
+    try:
+        assert find_identical_files(files, metadata_cache=cache) == [[0, 1]]
+        cache.save()
+        assert cache.lookup_hash(files[0], "full") == full_hash(files[0].fullpath, files[0].size)
+
+        with patch.dict(dedup.HASH_FUNCTIONS, {"partial": None, "full": None}):
+            assert find_identical_files(files, metadata_cache=cache) == [[0, 1]]
+    finally:
+        cache.close()
+
+
+def test_unreadable_files_are_never_identical(tmp_path) -> None:
+    """Test files that disappear before they are hashed are left out of the groups."""
+    files = make_files(tmp_path, {"one.jpg": b"same", "two.jpg": b"same", "three.jpg": b"same"})
+    for input_file in files:
+        input_file.read_stat()
+    (tmp_path / "two.jpg").unlink()
+
+    assert find_identical_files(files) == [[0, 2]]
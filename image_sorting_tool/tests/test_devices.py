@@ -0,0 +1,77 @@
+"""Unit tests for the devices module."""
+
+import os
+
+import pytest
+
+from image_sorting_tool import devices
+from image_sorting_tool.devices import copy_concurrency, device_kind, parse_mountinfo
+
+MOUNTINFO = """\
+22 1 8:1 / / rw,relatime shared:1 - ext4 /dev/sda1 rw
+40 22 8:17 / /mnt/backup rw,relatime shared:2 - ext4 /dev/sdb1 rw
+41 22 259:2 / /mnt/fast\\040drive rw,relatime - xfs /dev/nvme0n1p2 rw
+42 22 0:51 / /mnt/nas rw,relatime - nfs4 server:/photos rw
+43 22 0:52 / /mnt/btrfs rw,relatime - btrfs /dev/sdc rw
+"""
+
+
+@pytest.fixture(name="fake_system")
+def fixture_fake_system(tmp_path, monkeypatch) -> None:
+    """Point the device detection at a fake mountinfo file and sysfs tree."""
+    (tmp_path / "mountinfo").write_text(MOUNTINFO)
+    monkeypatch.setattr(devices, "MOUNTINFO_PATH", str(tmp_path / "mountinfo"))
+    monkeypatch.setattr(devices, "SYS_DEV_BLOCK", str(tmp_path / "dev" / "block"))
+    monkeypatch.setattr(devices, "SYS_CLASS_BLOCK", str(tmp_path / "class" / "block"))
+    (tmp_path / "dev" / "block").mkdir(parents=True)
+    (tmp_path / "class" / "block").mkdir(parents=True)
+    disks = {"sda": ("8:0", "1", "8:1"), "sdb": ("8:16", "1", "8:17"), "nvme0n1": ("259:0", "0", "259:2")}
+    for disk, (_, rotational, partition_number) in disks.items():
+        disk_dir = tmp_path / "devices" / disk
+        (disk_dir / "queue").mkdir(parents=True)
+        (disk_dir / "queue" / "rotational").write_text(rotational + "\n")
+        partition_dir = disk_dir / f"{disk}{'p2' if disk.startswith('nvme') else '1'}"
+        partition_dir.mkdir()
+        (partition_dir / "partition").write_text("1\n")
+        os.symlink(partition_dir, tmp_path / "dev" / "block" / partition_number)
+    ssd_dir = tmp_path / "devices" / "sdc"
+    (ssd_dir / "queue").mkdir(parents=True)
+    (ssd_dir / "queue" / "rotational").write_text("0\n")
+    os.symlink(ssd_dir, tmp_path / "class" / "block" / "sdc")
+
+
+def test_parse_mountinfo() -> None:
+    """Test mount points are unescaped and the filesystem fields after the separator are found."""
+    mounts = parse_mountinfo(MOUNTINFO)
+    assert mounts[2].mount_point == "/mnt/fast drive"
+    assert (mounts[3].fstype, mounts[3].source) == ("nfs4", "server:/photos")
+
+
+@pytest.mark.usefixtures("fake_system")
+@pytest.mark.parametrize(
+    ("path", "expected_kind"),
+    [
+        ("/home/user/photos", "hdd"),
+        ("/mnt/backup/2020", "hdd"),
+        ("/mnt/fast drive/photos", "nvme"),
+        ("/mnt/nas/photos", "network"),
+        ("/mnt/btrfs/photos", "ssd"),
+    ],
+)
+def test_device_kind(path, expected_kind) -> None:
+    """Test devices are classified from their mount, including partitions and anonymous device numbers."""
+    assert device_kind(path) == expected_kind
+
+
+@pytest.mark.usefixtures("fake_system")
+def test_copy_concurrency() -> None:
+    """Test the slowest device limits the concurrency, and a single hard disk is copied with one thread."""
+    assert copy_concurrency("/mnt/fast drive/in", "/mnt/nas/out") == devices.DEVICE_CONCURRENCY["nvme"]
+    assert copy_concurrency("/mnt/fast drive/in", "/mnt/backup/out") == devices.DEVICE_CONCURRENCY["hdd"]
+    assert copy_concurrency("/home/user/in", "/home/user/out") == 1
+
+
+def test_unknown_without_mountinfo(monkeypatch, tmp_path) -> None:
+    """Test platforms without mountinfo report an unknown device."""
+    monkeypatch.setattr(devices, "MOUNTINFO_PATH", str(tmp_path / "missing"))
+    assert device_kind(str(tmp_path)) == "unknown"
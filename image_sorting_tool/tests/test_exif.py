@@ -0,0 +1,86 @@
+"""Unit tests for the exif module."""
+
+import io
+import os
+import struct
+from datetime import datetime
+
+import pytest
+from PIL import Image
+
+from image_sorting_tool.exif import (
+    ExifError,
+    find_jpeg_exif,
+    read_jpeg_datetime_original,
+    read_tiff_datetime_original,
+)
+from image_sorting_tool.image_sort import ImageSort
+
+tests_path = os.path.dirname(os.path.abspath(__file__))
+MIXED_ASSETS_PATH = tests_path + "/../../assets/test_assets/mix"
+BURST_ASSETS_PATH = tests_path + "/../../assets/test_assets/burst"
+JPEG_TEST_ASSETS = [
+    os.path.join(MIXED_ASSETS_PATH, "pass_0.JPG"),
+    os.path.join(MIXED_ASSETS_PATH, "pass_1.JPG"),
+    os.path.join(BURST_ASSETS_PATH, "burst_0.jpeg"),
+]
+
+
+def make_tiff(byte_order: str, date_taken: bytes = b"2021:02:03 04:05:06\x00") -> bytes:
+    """Build TIFF data with IFD0 pointing to an Exif IFD holding a DateTimeOriginal tag."""
+    endian = "<" if byte_order == "II" else ">"
+    exif_ifd_offset = 8 + 2 + 12 + 4
+    string_offset = exif_ifd_offset + 2 + 12 + 4
+    ifd0 = struct.pack(endian + "HHHII", 1, 0x8769, 4, 1, exif_ifd_offset) + b"\x00" * 4
+    exif_ifd = struct.pack(endian + "HHHII", 1, 0x9003, 2, len(date_taken), string_offset) + b"\x00" * 4
+    return byte_order.encode() + struct.pack(endian + "HI", 42, 8) + ifd0 + exif_ifd + date_taken
+
+
+def make_jpeg(tiff: bytes) -> bytes:
+    """Wrap TIFF data in an EXIF APP1 segment after a JFIF APP0 segment."""
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+    app1 = b"\xff\xe1" + struct.pack(">H", len(tiff) + 8) + b"Exif\x00\x00" + tiff
+    return b"\xff\xd8" + app0 + app1 + b"\xff\xda\x00\x02" + b"\xff\xd9"
+
+
+@pytest.mark.parametrize("asset", JPEG_TEST_ASSETS)
+def test_matches_pillow(asset) -> None:
+    """Test the header parser reads the same DateTimeOriginal as Pillow."""
+    with Image.open(asset) as image:
+        assert read_jpeg_datetime_original(asset) == image._getexif()[36867]
+
+
+def test_no_exif() -> None:
+    """Test a JPEG without EXIF data returns None."""
+    assert read_jpeg_datetime_original(os.path.join(MIXED_ASSETS_PATH, "no_exif.jpg")) is None
+
+
+@pytest.mark.parametrize("byte_order", ["II", "MM"])
+def test_byte_orders(tmp_path, byte_order) -> None:
+    """Test both little and big endian EXIF data are parsed."""
+    path = tmp_path / "image.jpg"
+    path.write_bytes(make_jpeg(make_tiff(byte_order)))
+    assert read_jpeg_datetime_original(str(path)) == "2021:02:03 04:05:06"
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"not a jpeg",
+        b"\xff\xd8\xff\xe1\x00",  # Truncated segment length
+        make_jpeg(b"XX" + make_tiff("II")[2:]),  # Invalid byte order
+        make_jpeg(make_tiff("II")[:30]),  # Exif IFD outside of the segment
+    ],
+)
+def test_malformed(data) -> None:
+    """Test malformed files raise ExifError."""
+    file_obj = io.BytesIO(data)
+    with pytest.raises(ExifError):
+        read_tiff_datetime_original(file_obj, *find_jpeg_exif(file_obj))
+
+
+def test_image_sort_falls_back_to_filename(tmp_path) -> None:
+    """Test a malformed EXIF segment still falls back to the filename datetime."""
+    path = tmp_path / "IMG_20190101_120000.jpg"
+    path.write_bytes(make_jpeg(make_tiff("II")[:30]))
+    assert ImageSort._get_datetime_from_exif(str(path)) == datetime(2019, 1, 1, 12, 0, 0)
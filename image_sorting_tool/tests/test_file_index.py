@@ -0,0 +1,115 @@
+"""Unit tests for the file_index module."""
+
+import os
+from datetime import datetime
+
+import pytest
+
+from image_sorting_tool.file_index import (
+    CATEGORY_FAILED,
+    CATEGORY_OTHER,
+    CATEGORY_SORT,
+    FLAG_DUPLICATE,
+    FLAG_IDENTICAL,
+    FLAG_SORT,
+    FileIndex,
+    format_sorted_filename,
+)
+
+
+@pytest.fixture(name="index")
+def fixture_index() -> FileIndex:
+    """Create an index of files with and without datetimes, some sharing a datetime."""
+    index = FileIndex()
+    for path in ("/photos/b/one.jpg", "/photos/a/two.JPG", "/photos/a/three.jpg", "/photos/a/notes.txt"):
+        index.append(path)
+    index[0].datetime = datetime(2020, 1, 14, 13, 53, 12)
+    index[1].datetime = datetime(2020, 1, 14, 13, 53, 12)
+    return index
+
+
+def test_append_interns_folders_and_extensions(index) -> None:
+    """Test each folder and extension is stored once, and the views rebuild the paths."""
+    assert index.directories == [os.path.abspath("/photos/b"), os.path.abspath("/photos/a")]
+    assert index.extensions == [".jpg", ".JPG", ".txt"]
+    assert index[1].fullpath == os.path.abspath("/photos/a/two.JPG")
+    assert (index[1].filename, index[1].extension) == ("two.JPG", ".JPG")
+    assert index[-1].filename == "notes.txt"
+    with pytest.raises(IndexError):
+        index[4]
+
+
+def test_view_defaults(index) -> None:
+    """Test unset columns read as None through a view, like a new File."""
+    view = index[2]
+    assert (view.datetime, view.size, view.inode, view.duplicate_idx) == (None, None, None, None)
+    assert (view.destination_relative_path, view.sorted_filename, view.sort_flag) == (None, None, False)
+
+
+def test_categorize(index) -> None:
+    """Test files are categorised by extension and datetime, and only other files depend on copy_unsorted."""
+    index.categorize([".jpg"], copy_unsorted=False)
+
+    assert list(index.categories) == [CATEGORY_SORT, CATEGORY_SORT, CATEGORY_FAILED, CATEGORY_OTHER]
+    assert index.rows(flag=FLAG_SORT) == [0, 1, 2]
+    assert index[0].destination_relative_path == os.path.join("2020", "01")
+    assert index[0].sorted_filename == "20200114_135312.jpg"
+    assert (index[2].destination_relative_path, index[2].sorted_filename) == ("failed_to_sort", "three.jpg")
+    assert index[3].destination_relative_path == "other_files"
+
+    index.categorize([".jpg"], copy_unsorted=True)
+    assert index.rows(flag=FLAG_SORT) == [0, 1, 2, 3]
+
+
+def test_categorize_rows(index) -> None:
+    """Test categorising files a few rows at a time matches categorising the whole index."""
+    index.categorize_rows([3, 0], [".jpg"], copy_unsorted=True)
+    assert (index.categories[0], index.categories[3]) == (CATEGORY_SORT, CATEGORY_OTHER)
+    assert index.rows(flag=FLAG_SORT) == [0, 3]
+
+    index.categorize_rows([1, 2], [".jpg"], copy_unsorted=True)
+    categorized = (list(index.categories), list(index.flags))
+    index.categorize([".jpg"], copy_unsorted=True)
+    assert categorized == (list(index.categories), list(index.flags))
+
+
+@pytest.mark.parametrize("rename", [False, True])
+def test_number_duplicates(index, rename) -> None:
+    """Test duplicates are numbered by path, and only renamed when requested."""
+    index.categorize([".jpg"], copy_unsorted=False)
+    index.number_duplicates(rename=rename)
+
+    assert index.rows(flag=FLAG_DUPLICATE) == [0, 1]
+    assert (index[1].duplicate_idx, index[0].duplicate_idx) == (1, 2)
+    expected_name = "20200114_135312_001.JPG" if rename else "20200114_135312.JPG"
+    assert index[1].sorted_filename == expected_name
+
+
+def test_skip_identical(index) -> None:
+    """Test skipped files are excluded from their category and no longer count as duplicates."""
+    index.categorize([".jpg"], copy_unsorted=False)
+    index.skip_identical([1])
+    index.number_duplicates(rename=True)
+
+    assert index.rows(CATEGORY_SORT) == [0]
+    assert index.rows(flag=FLAG_IDENTICAL) == [1]
+    assert not index[1].sort_flag
+    assert index.rows(flag=FLAG_DUPLICATE) == []
+
+
+def test_read_stat(tmp_path) -> None:
+    """Test the stat attributes are stored in the index."""
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(b"data")
+    index = FileIndex()
+    view = index[index.append(str(path))]
+
+    view.read_stat()
+
+    assert (view.size, view.mtime_ns, view.inode) == (4, path.stat().st_mtime_ns, path.stat().st_ino)
+
+
+def test_format_sorted_filename() -> None:
+    """Test the sorted filename format, with and without a duplicate postfix."""
+    assert format_sorted_filename(datetime(987, 6, 5, 4, 3, 2), ".png") == "09870605_040302.png"
+    assert format_sorted_filename(datetime(2020, 1, 14, 13, 53, 12), ".jpg", 2) == "20200114_135312_002.jpg"
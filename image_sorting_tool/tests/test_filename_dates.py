@@ -0,0 +1,63 @@
+"""Unit tests for the filename_dates module."""
+
+from datetime import datetime
+
+import pytest
+
+from image_sorting_tool.filename_dates import FilenameDateParser
+
+
+@pytest.mark.parametrize(
+    "filename,expected",
+    [
+        ("IMG_20190101_120000.jpg", datetime(2019, 1, 1, 12, 0, 0)),
+        ("PXL_20210315_083012345.jpg", datetime(2021, 3, 15, 8, 30, 12)),
+        ("Screenshot_2020-01-01-12-30-45.png", datetime(2020, 1, 1, 12, 30, 45)),
+        ("Screenshot 2017-05-12 at 18.46.55.png", datetime(2017, 5, 12, 18, 46, 55)),
+        ("Screenshot 2017-05-12 18.46.55.png", datetime(2017, 5, 12, 18, 46, 55)),
+        ("VID-20200101-WA0001.mp4", datetime(2020, 1, 1)),
+        ("Animated_2018-0305_093556.gif", datetime(2018, 3, 5, 9, 35, 56)),
+        ("no_exif20000101-010101.jpg", datetime(2000, 1, 1, 1, 1, 1)),
+        ("/some/dir/20130408_131738_001.jpeg", datetime(2013, 4, 8, 13, 17, 38)),
+    ],
+)
+def test_naming_schemes(filename, expected) -> None:
+    """Test the common camera and phone naming schemes are recognised."""
+    assert FilenameDateParser().parse(filename) == expected
+
+
+def test_fall_back_to_dateutil() -> None:
+    """Test names that match no pattern are still handed to dateutil when they contain a year."""
+    assert FilenameDateParser().parse("holiday 2019.jpg") == datetime(2019, 1, 1)  # Not today's month and day
+    assert FilenameDateParser().parse("20190230_x_20190305.jpg") == datetime(2019, 3, 5)
+
+
+def test_without_fallback() -> None:
+    """Test names matching no pattern are refused rather than guessed at when the fallback is disabled."""
+    assert FilenameDateParser().parse("VID-20200101-WA0001.mp4", fallback=False) == datetime(2020, 1, 1)
+    with pytest.raises(ValueError, match="No naming scheme matches GOPR2015"):
+        FilenameDateParser().parse("GOPR2015.MP4", fallback=False)
+
+
+def test_no_year() -> None:
+    """Test a name without a year raises ValueError."""
+    with pytest.raises(ValueError, match="No year found"):
+        FilenameDateParser().parse("MOV_0001.mp4")
+
+
+def test_register_pattern() -> None:
+    """Test user patterns take priority over the default ones."""
+    date_parser = FilenameDateParser()
+    date_parser.register(r"(?P<day>\d\d)\.(?P<month>\d\d)\.(?P<year>\d{4})")
+    assert date_parser.parse("holiday 05.06.2019 20190101.jpg") == datetime(2019, 6, 5)
+
+    with pytest.raises(ValueError, match="missing the groups: day"):
+        date_parser.register(r"(?P<year>\d{4})(?P<month>\d\d)")
+
+
+def test_parse_many() -> None:
+    """Test the batch entry point returns None for names without a datetime."""
+    assert FilenameDateParser().parse_many(["IMG_20190101_120000.jpg", "text.txt"]) == [
+        datetime(2019, 1, 1, 12, 0, 0),
+        None,
+    ]
@@ -0,0 +1,166 @@
+"""Unit tests for the formats module."""
+
+import struct
+import zlib
+from datetime import datetime, timezone
+
+import pytest
+
+from image_sorting_tool.formats import (
+    FormatError,
+    ImageFormat,
+    detect_format,
+    metadata_extensions,
+    read_metadata_datetime,
+    read_modified_datetime,
+    register_format,
+)
+from image_sorting_tool.image_sort import File, ImageSort
+from image_sorting_tool.tests.test_exif import make_jpeg, make_tiff
+from image_sorting_tool.tests.test_isobmff import box
+
+TAKEN = datetime(2021, 2, 3, 4, 5, 6)  # noqa: DTZ001
+XMP = (
+    '<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF><rdf:Description xmp:CreateDate="2019-01-01T00:00:00">'
+    "<exif:DateTimeOriginal>2021-02-03T04:05:06+01:00</exif:DateTimeOriginal></rdf:Description></rdf:RDF>"
+    "</x:xmpmeta>"
+)
+
+
+def png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """Build a PNG chunk, with its CRC."""
+    return struct.pack(">I4s", len(data), chunk_type) + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+
+def make_png(*chunks: bytes) -> bytes:
+    """Build a PNG of a header chunk, the given chunks, then the image data."""
+    ihdr = png_chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 0, 0, 0, 0))
+    return b"\x89PNG\r\n\x1a\n" + ihdr + b"".join(chunks) + png_chunk(b"IDAT", b"\x00" * 16) + png_chunk(b"IEND", b"")
+
+
+def make_gif(*extensions: bytes) -> bytes:
+    """Build a GIF with a global colour table, the given extensions, then an image."""
+    screen = b"GIF89a" + struct.pack("<HHBBB", 1, 1, 0x80, 0, 0) + b"\x00" * 6
+    image = b"\x2c" + struct.pack("<HHHHB", 0, 0, 1, 1, 0) + b"\x02\x02\x44\x01\x00"
+    return screen + b"".join(extensions) + image + b"\x3b"
+
+
+def sub_blocks(data: bytes) -> bytes:
+    """Split data into GIF sub-blocks, ending with a terminator."""
+    return b"".join(bytes([len(data[i : i + 255])]) + data[i : i + 255] for i in range(0, len(data), 255)) + b"\x00"
+
+
+def make_heif(tiff: bytes, construction_method: int = 0) -> bytes:
+    """Build a HEIF image with an EXIF item, stored after the 'meta' box or in its 'idat' box."""
+    item = struct.pack(">I", 6) + b"Exif\x00\x00" + tiff
+    infe = box(b"infe", b"\x02\x00\x00\x00" + struct.pack(">HH", 2, 0) + b"Exif")
+    iinf = box(b"iinf", b"\x00" * 4 + struct.pack(">H", 1) + box(b"infe", b"\x02" + b"\x00" * 7 + b"hvc1") + infe)
+
+    def meta(item_offset: int) -> bytes:
+        location = struct.pack(">HHHIHII", 2, construction_method, 0, 0, 1, item_offset, len(item))
+        iloc = box(b"iloc", b"\x01\x00\x00\x00" + bytes([0x44, 0x40]) + struct.pack(">H", 1) + location)
+        idat = box(b"idat", item) if construction_method else b""
+        return box(b"meta", b"\x00" * 4 + box(b"hdlr", b"\x00" * 24) + iinf + iloc + idat)
+
+    ftyp = box(b"ftyp", b"heic\x00\x00\x00\x00mif1heic")
+    item_offset = 0 if construction_method else len(ftyp) + len(meta(0)) + 8
+    return ftyp + meta(item_offset) + box(b"mdat", b"" if construction_method else item)
+
+
+def write(tmp_path, name: str, data: bytes) -> str:
+    """Write a file and return its path."""
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_png_exif_is_preferred(tmp_path) -> None:
+    """Test the 'eXIf' chunk is used over the text and 'tIME' chunks of a PNG."""
+    modified = png_chunk(b"tIME", struct.pack(">HBBBBB", 2022, 1, 1, 0, 0, 0))
+    created = png_chunk(b"tEXt", b"Creation Time\x002019-05-06 07:08:09")
+    path = write(tmp_path, "a.png", make_png(modified, created, png_chunk(b"eXIf", make_tiff("MM"))))
+    assert read_metadata_datetime(path) == TAKEN
+
+
+def test_png_text_chunks(tmp_path) -> None:
+    """Test the date is read from XMP and 'Creation Time' text chunks, compressed or not, over 'tIME'."""
+    modified = png_chunk(b"tIME", struct.pack(">HBBBBB", 2022, 1, 1, 0, 0, 0))
+    itxt = png_chunk(b"iTXt", b"XML:com.adobe.xmp\x00\x01\x00\x00\x00" + zlib.compress(XMP.encode()))
+    assert read_metadata_datetime(write(tmp_path, "xmp.png", make_png(modified, itxt))) == TAKEN
+
+    ztxt = png_chunk(b"zTXt", b"Creation Time\x00\x00" + zlib.compress(b"Wed, 03 Feb 2021 04:05:06 +0000"))
+    assert read_metadata_datetime(write(tmp_path, "ztxt.png", make_png(ztxt, modified))) == TAKEN
+
+    corrupt = png_chunk(b"zTXt", b"Creation Time\x00\x00not zlib")
+    with pytest.raises(FormatError):
+        read_metadata_datetime(write(tmp_path, "corrupt.png", make_png(corrupt)))
+
+
+def test_png_modification_time(tmp_path) -> None:
+    """Test the UTC 'tIME' chunk is only read as the modification time, and chunks after the image data are not."""
+    modified = png_chunk(b"tIME", struct.pack(">HBBBBB", 2021, 2, 3, 4, 5, 6))
+    local = TAKEN.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    path = write(tmp_path, "time.png", make_png(modified))
+    assert read_metadata_datetime(path) is None
+    assert read_modified_datetime(path) == local
+
+    after_image = make_png() + png_chunk(b"eXIf", make_tiff("II"))
+    assert read_metadata_datetime(write(tmp_path, "late.png", after_image)) is None
+
+
+def test_png_modification_time_is_the_last_resort(tmp_path) -> None:
+    """Test a re-saved PNG is dated from its filename over its 'tIME' chunk, which is used if the name has no date."""
+    modified = png_chunk(b"tIME", struct.pack(">HBBBBB", 2021, 2, 3, 4, 5, 6))
+    named = write(tmp_path, "Screenshot_2020-01-01-12-30-45.png", make_png(modified))
+    assert ImageSort.get_datetime(File(named)).datetime == datetime(2020, 1, 1, 12, 30, 45)  # noqa: DTZ001
+    unnamed = write(tmp_path, "image.png", make_png(modified))
+    local = TAKEN.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    assert ImageSort.get_datetime(File(unnamed)).datetime == local
+    assert ImageSort.get_datetime(File(write(tmp_path, "blank.png", make_png()))).datetime is None
+
+
+def test_gif_extensions(tmp_path) -> None:
+    """Test the date is read from the XMP extension of a GIF over its comments."""
+    comment = b"\x21\xfe" + sub_blocks(b"Taken 2019-05-06 07:08:09")
+    # The XMP packet is stored raw, ending with a 'magic trailer' that reads back as empty sub-blocks
+    xmp = b"\x21\xff\x0bXMP DataXMP" + XMP.encode() + b"\x01" + bytes(range(255, -1, -1)) + b"\x00"
+    netscape = b"\x21\xff\x0bNETSCAPE2.0" + sub_blocks(b"\x01\x00\x00")
+    assert read_metadata_datetime(write(tmp_path, "a.gif", make_gif(netscape, comment, xmp))) == TAKEN
+    assert read_metadata_datetime(write(tmp_path, "b.gif", make_gif(comment))) == datetime(2019, 5, 6, 7, 8, 9)  # noqa: DTZ001
+    assert read_metadata_datetime(write(tmp_path, "c.gif", make_gif(netscape))) is None
+
+
+@pytest.mark.parametrize("construction_method", [0, 1])
+def test_heif_exif(tmp_path, construction_method) -> None:
+    """Test the date is read from the EXIF item of a HEIF image, stored in 'mdat' or 'idat'."""
+    path = write(tmp_path, "IMG_0001.HEIC", make_heif(make_tiff("MM"), construction_method))
+    assert read_metadata_datetime(path) == TAKEN
+
+
+def test_detected_by_contents(tmp_path) -> None:
+    """Test files are read by their magic bytes, whatever their extension."""
+    assert read_metadata_datetime(write(tmp_path, "IMG_0001.jpg", make_heif(make_tiff("II")))) == TAKEN
+    assert read_metadata_datetime(write(tmp_path, "IMG_0002.png", make_jpeg(make_tiff("II")))) == TAKEN
+    assert read_metadata_datetime(write(tmp_path, "IMG_0003.heic", b"plain text")) is None
+    assert ImageSort.get_datetime(File(str(tmp_path / "IMG_0001.jpg"))).datetime == TAKEN
+
+
+def test_image_sort_falls_back_to_filename(tmp_path) -> None:
+    """Test PNG, GIF and HEIC files without a date in their metadata are dated from their filename."""
+    for name in ("20200114_135312.png", "20200114_135312.gif", "20200114_135312.heic"):
+        path = write(tmp_path, name, make_png() if name.endswith(".png") else make_gif())
+        assert ImageSort.get_datetime(File(path)).datetime == datetime(2020, 1, 14, 13, 53, 12)  # noqa: DTZ001
+
+
+def test_register_format(tmp_path) -> None:
+    """Test a registered format is detected and read, replacing a format of the same name."""
+    register_format(ImageFormat("TEST", b"TEST", 2, (".tst",), lambda _: TAKEN))
+    register_format(ImageFormat("TEST", b"TEST", 0, (".tst",), lambda _: TAKEN))
+    try:
+        assert detect_format(b"TEST....").name == "TEST"
+        assert metadata_extensions().count(".tst") == 1
+        assert read_metadata_datetime(write(tmp_path, "a.tst", b"TEST")) == TAKEN
+        with pytest.raises(ValueError, match="within the first"):
+            register_format(ImageFormat("LATE", b"LATE", 14, (), lambda _: None))
+    finally:
+        register_format(ImageFormat("TEST", b"\x00TEST_UNUSED\x00", 0, (), lambda _: None))
@@ -3,11 +3,12 @@
 import os
 import sys
 from collections.abc import Generator
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 import pytest
 
-from image_sorting_tool.gui import GUI
+from image_sorting_tool import gui
+from image_sorting_tool.gui import GUI, TextReporter, collapse_processed_lines
 from image_sorting_tool.image_sort import JPEG_EXTENSIONS
 
 # Skip GUI tests in CI on non-macOS platforms (since they lack a display)
@@ -64,6 +65,23 @@ def test_assert_paths_are_valid(gui_app, tmp_path) -> None:
     assert gui_app.assert_paths_are_valid()
 
 
+@pytest.mark.parametrize("confirmed", [True, False])
+def test_move_asks_for_confirmation(gui_app, tmp_path, confirmed) -> None:
+    """Test sorting in move mode only starts once the user confirms the input files will be removed."""
+    (tmp_path / "src").mkdir()
+    (tmp_path / "dst").mkdir()
+    gui_app.source_dir_var.set(str(tmp_path / "src"))
+    gui_app.destination_dir_var.set(str(tmp_path / "dst"))
+    gui_app.transfer_mode.set("move")
+    with (
+        patch("image_sorting_tool.gui.messagebox.askokcancel", return_value=confirmed) as mock_ask,
+        patch.object(gui_app, "after") as mock_after,
+    ):
+        gui_app.sort_images()
+    mock_ask.assert_called_once()
+    assert mock_after.called == confirmed
+
+
 def test_enable_buttons(gui_app) -> None:
     """Test button state management based on input variables."""
     gui_app.source_dir_var.set("src")
@@ -76,3 +94,54 @@ def test_enable_buttons(gui_app) -> None:
     gui_app.find_flag = True
     gui_app.enable_buttons()
     assert str(gui_app.start_button["state"]) == "normal"
+
+
+def test_reporter_renders_on_pump(gui_app) -> None:
+    """Test queued messages only reach the widget when the pump runs, capped to the scrollback limit."""
+    gui_app.reporter.max_lines = 10
+    gui_app.reporter.clear()
+    for idx in range(20):
+        gui_app.reporter.write(f"line {idx}\n")
+    assert "line 0" not in gui_app.scroll.get("1.0", "end")
+
+    gui_app.reporter.pump()
+    text = gui_app.scroll.get("1.0", "end")
+    assert "line 19" in text
+    assert "line 5" not in text
+
+
+def test_reporter_runs_callbacks_in_order(gui_app) -> None:
+    """Test callbacks queued from other threads run on the pump after the messages written before them."""
+    seen = []
+    gui_app.reporter.write("before\n")
+    gui_app.reporter.run_on_main_thread(lambda: seen.append(gui_app.scroll.get("1.0", "end")))
+    gui_app.reporter.pump()
+    assert "before" in seen[0]
+
+
+def test_collapse_processed_lines() -> None:
+    """Test long runs of per file lines are collapsed while errors are kept."""
+    text = "Processed : a --> b\n" * 3 + "ERROR copying c: boom\n" + "Processed : d --> e\n"
+    assert collapse_processed_lines(text, threshold=10) == text
+    assert collapse_processed_lines(text, threshold=2) == (
+        "Processed 3 files\nERROR copying c: boom\nProcessed 1 files\n"
+    )
+
+
+def test_full_reporter_queue_keeps_errors(monkeypatch) -> None:
+    """Test a full queue only drops the per file 'Processed' lines, while errors and other lines are kept."""
+    monkeypatch.setattr(gui, "MAX_PENDING_MESSAGES", 2)
+    reporter = TextReporter(Mock())
+    reporter.write("Found 4 files\n")
+    reporter.write("Processed : a --> b\n")
+    reporter.write("Processed : c --> d\nERROR copying e: boom\nProcessed : f --> g\n")
+    reporter.write("Processed : h --> i\n")
+    reporter.write("Sorting Completed\n")
+
+    assert list(reporter.pending) == [
+        "Found 4 files\n",
+        "Processed : a --> b\n",
+        "ERROR copying e: boom\n",
+        "Sorting Completed\n",
+    ]
+    assert reporter.dropped == 3
@@ -1,5 +1,6 @@
 """Unit tests for the image_sort module."""
 
+import io
 import os
 import shutil
 from collections.abc import Generator
@@ -7,7 +8,10 @@ from unittest.mock import MagicMock
 
 import pytest
 
-from image_sorting_tool.image_sort import JPEG_EXTENSIONS, File, ImageSort
+from image_sorting_tool.image_sort import JPEG_EXTENSIONS, File, ImageSort, sort_directory
+from image_sorting_tool.instrumentation import RunInstrumentation
+from image_sorting_tool.journal import JOURNAL_FILENAME, SortJournal
+from image_sorting_tool.reporting import StreamReporter
 
 tests_path = os.path.dirname(os.path.abspath(__file__))
 
@@ -29,8 +33,8 @@ def fixture_setup_tmp_dirs_and_sorter(tmp_path) -> Generator[tuple[str, str, Ima
     os.mkdir(tmp_src)
     os.mkdir(tmp_dst)
 
-    mock_tk_text = MagicMock()
-    sorter = ImageSort(tmp_src, tmp_dst, mock_tk_text)
+    mock_reporter = MagicMock()
+    sorter = ImageSort(tmp_src, tmp_dst, mock_reporter)
 
     # Run test
     yield tmp_src, tmp_dst, sorter
@@ -45,6 +49,17 @@ def test_file_repr() -> None:
     assert repr(file_obj).startswith("File(")
 
 
+def test_file_has_no_instance_dict() -> None:
+    """Test File objects use slots, so millions of them stay small."""
+    assert not hasattr(File("dummy/path/file.jpg"), "__dict__")
+
+
+def test_worker_results_are_epoch_seconds() -> None:
+    """Test extraction workers take an index and path, and return the datetime as epoch seconds."""
+    assert ImageSort._get_indexed_seconds((3, BURST_TEST_ASSETS[0])) == (3, 1365427058)
+    assert ImageSort._get_indexed_seconds((4, "bad_file_no_year_or_exif.jpg")) == (4, None)
+
+
 def test_get_datetime_exception() -> None:
     """Test exception handling when extracting datetime fails entirely."""
     file_obj = File("bad_file_no_year_or_exif.jpg")
@@ -52,6 +67,117 @@ def test_get_datetime_exception() -> None:
     assert result.datetime is None
 
 
+def test_sort_directory(tmp_path) -> None:
+    """Test the headless API sorts a directory and reports progress to a stream."""
+    tmp_src, tmp_dst = tmp_path / "src", tmp_path / "dst"
+    shutil.copytree(BURST_ASSETS_PATH, tmp_src)
+    tmp_dst.mkdir()
+    stream = io.StringIO()
+
+    sorter = sort_directory(str(tmp_src), str(tmp_dst), rename_duplicates=True, reporter=StreamReporter(stream))
+
+    assert len(sorter.duplicates_list) == len(BURST_TEST_ASSETS)
+    assert len(os.listdir(tmp_dst / "2013" / "04")) == len(BURST_TEST_ASSETS)
+    assert "Found 9 images/videos" in stream.getvalue()
+
+
+def test_sort_directory_autotuned(tmp_path) -> None:
+    """Test tuning the workers of each phase sorts the same files as the fixed counts."""
+    tmp_src, tmp_dst = tmp_path / "src", tmp_path / "dst"
+    shutil.copytree(BURST_ASSETS_PATH, tmp_src)
+
+    sort_directory(str(tmp_src), str(tmp_dst), skip_identical=True, autotune=True)
+
+    assert len(os.listdir(tmp_dst / "2013" / "04")) == 1  # The burst assets are identical
+
+
+def test_sort_directory_instrumented(tmp_path) -> None:
+    """Test an instrumented run times its phases and the files it analyses and copies."""
+    tmp_src, tmp_dst = tmp_path / "src", tmp_path / "dst"
+    shutil.copytree(BURST_ASSETS_PATH, tmp_src)
+    instrumentation = RunInstrumentation()
+
+    sort_directory(str(tmp_src), str(tmp_dst), rename_duplicates=True, instrumentation=instrumentation)
+
+    report = instrumentation.report()
+    assert set(report["phases"]) == {
+        "search",
+        "search_and_analyse",
+        "categorize",
+        "duplicates",
+        "prepare_sort",
+        "copy",
+        "sync",
+    }
+    assert report["operations"]["get_datetime"]["count"] == len(BURST_TEST_ASSETS)
+    assert report["operations"]["copy_file"]["count"] == len(BURST_TEST_ASSETS)
+    assert report["bytes_written"] == sum(os.path.getsize(path) for path in BURST_TEST_ASSETS)
+
+
+def test_find_files_in_subfolders(test_setup) -> None:
+    """Test files are found in nested subfolders."""
+    tmp_src, _, sorter = test_setup
+    nested = os.path.join(tmp_src, "a", "b", "c")
+    os.makedirs(nested)
+    for folder in (tmp_src, os.path.join(tmp_src, "a"), nested):
+        shutil.copy2(BURST_TEST_ASSETS[0], folder)
+
+    sorter._find_files()
+
+    assert sorted(i.fullpath for i in sorter.files_list) == sorted(
+        os.path.join(folder, os.path.basename(BURST_TEST_ASSETS[0]))
+        for folder in (tmp_src, os.path.join(tmp_src, "a"), nested)
+    )
+
+
+@pytest.mark.skipif(
+    os.name == "nt" or os.geteuid() == 0, reason="Folders cannot be made unreadable on Windows or for root"
+)
+def test_unreadable_folders_do_not_stop_the_search(test_setup) -> None:
+    """Test the files of readable folders are still found when a folder cannot be read."""
+    tmp_src, _, sorter = test_setup
+    locked, readable = os.path.join(tmp_src, "locked"), os.path.join(tmp_src, "readable")
+    for folder in (locked, readable):
+        os.makedirs(folder)
+        shutil.copy2(BURST_TEST_ASSETS[0], folder)
+    os.chmod(locked, 0)
+    try:
+        sorter._find_files()
+    finally:
+        os.chmod(locked, 0o700)
+
+    assert [i.fullpath for i in sorter.files_list] == [os.path.join(readable, os.path.basename(BURST_TEST_ASSETS[0]))]
+
+
+def test_duplicate_numbering_follows_paths(test_setup) -> None:
+    """Test duplicates are numbered in order of their path, whatever order they were analysed in."""
+    tmp_src, _, sorter = test_setup
+    for asset in BURST_TEST_ASSETS:
+        shutil.copy2(asset, tmp_src)
+    sorter.ext_to_sort = JPEG_EXTENSIONS
+    sorter.find_images()
+
+    numbering = {sorter.files_list[i].filename: sorter.files_list[i].duplicate_idx for i in sorter.duplicates_list}
+    assert numbering == {f"burst_{idx}.jpeg": idx + 1 for idx in range(len(BURST_TEST_ASSETS))}
+
+
+def test_sorting_signals_completion(test_setup) -> None:
+    """Test completion is signalled through the callback and the event, with a final progress report."""
+    tmp_src, _, sorter = test_setup
+    for asset in BURST_TEST_ASSETS:
+        shutil.copy2(asset, tmp_src)
+    sorter.ext_to_sort = JPEG_EXTENSIONS
+    sorter.find_images()
+    on_complete = MagicMock()
+
+    sorter.run_parallel_sorting(on_complete=on_complete)
+
+    on_complete.assert_called_once_with()
+    assert sorter.sorting_done.is_set()
+    final_progress = sorter.reporter.progress.call_args.args[0]
+    assert final_progress.files_done == final_progress.total_files == len(BURST_TEST_ASSETS)
+
+
 @pytest.mark.parametrize(
     "test_extensions,expected_sort",
     [
@@ -321,3 +447,51 @@ def test_rename_duplicates_images(test_setup, test_extensions, expected_result,
 
     # Check duplicate files were copied correctly
     assert set(sorted_list) == set(expected_result)
+
+
+def test_skip_identical_files(test_setup) -> None:
+    """Test identical copies are skipped, while different files sharing a datetime are renamed and kept."""
+    tmp_src, tmp_dst, sorter = test_setup
+    # The burst assets are identical, so appending a byte after the image data makes a different shot
+    for asset in BURST_TEST_ASSETS[:3]:
+        shutil.copy2(asset, tmp_src)
+    with open(os.path.join(tmp_src, os.path.basename(BURST_TEST_ASSETS[2])), "ab") as file_obj:
+        file_obj.write(b"\0")
+    sorter.ext_to_sort = JPEG_EXTENSIONS
+    sorter.skip_identical = True
+    sorter.find_images()
+
+    skipped_copy = max(os.path.basename(asset) for asset in BURST_TEST_ASSETS[:2])
+    assert [sorter.files_list[i].filename for i in sorter.identical_list] == [skipped_copy]
+    assert len(sorter.duplicates_list) == 2
+
+    sorter.run_parallel_sorting()
+
+    assert len(os.listdir(os.path.join(tmp_dst, "2013", "04"))) == 2
+
+
+def test_resume_skips_sorted_files(test_setup) -> None:
+    """Test resuming only transfers the files missing from the journal of an interrupted run."""
+    tmp_src, tmp_dst, sorter = test_setup
+    for asset in BURST_TEST_ASSETS:
+        shutil.copy2(asset, tmp_src)
+    sorter.ext_to_sort = JPEG_EXTENSIONS
+    sorter.rename_duplicates = True
+    sorter.find_images()
+    sorter.run_parallel_sorting()
+    assert not os.path.exists(os.path.join(tmp_dst, JOURNAL_FILENAME))
+    # Recreate the journal of a run interrupted after its first few transfers
+    journal = SortJournal(tmp_dst)
+    journal.open()
+    for index in sorter.sort_list[:5]:
+        input_file = sorter.files_list[index]
+        journal.record(input_file, os.path.getsize(input_file.fullpath))
+    journal.close()
+    sorter.reporter.reset_mock()
+
+    sorter.resume = True
+    sorter.run_parallel_sorting()
+
+    written = "".join(call.args[0] for call in sorter.reporter.write.call_args_list)
+    assert "skipping 5 files" in written
+    assert written.count("Processed : ") == len(BURST_TEST_ASSETS) - 5
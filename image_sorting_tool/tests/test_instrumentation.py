@@ -0,0 +1,60 @@
+"""Unit tests for the instrumentation module."""
+
+import json
+
+import pytest
+
+from image_sorting_tool.instrumentation import LatencyHistogram, RunInstrumentation
+
+
+def test_histogram() -> None:
+    """Test latencies are counted in power of two buckets, with the total and maximum kept exactly."""
+    histogram = LatencyHistogram()
+    for seconds in (0.000_001, 0.000_003, 0.000_003, 0.5):
+        histogram.add(seconds)
+
+    summary = histogram.to_dict()
+    assert summary["count"] == 4
+    assert summary["total_seconds"] == pytest.approx(0.500_007)
+    assert summary["max_seconds"] == 0.5
+    assert [bucket["count"] for bucket in summary["buckets"]] == [1, 2, 1]
+    assert summary["p50_seconds"] == 0.000_004  # Upper edge of the bucket holding the median
+    assert summary["p99_seconds"] == 0.5  # Capped by the maximum
+
+
+def test_slowest_files() -> None:
+    """Test only the slowest files of each operation are kept, slowest first."""
+    instrumentation = RunInstrumentation(slowest_files=2)
+    for seconds, path in [(0.3, "a.jpg"), (0.1, "b.jpg"), (0.5, "c.jpg"), (0.2, "d.jpg")]:
+        instrumentation.record("copy_file", path, seconds)
+
+    slowest = instrumentation.report()["operations"]["copy_file"]["slowest"]
+    assert [entry["path"] for entry in slowest] == ["c.jpg", "a.jpg"]
+
+
+def test_phases_accumulate() -> None:
+    """Test a phase that runs more than once adds up, including the time spent producing streamed items."""
+    instrumentation = RunInstrumentation()
+    with instrumentation.phase("categorize"):
+        pass
+    with instrumentation.phase("categorize"):
+        pass
+    assert list(instrumentation.time_iterator("search", range(3))) == [0, 1, 2]
+
+    assert set(instrumentation.phases) == {"categorize", "search"}
+
+
+def test_report_written_on_stop(tmp_path) -> None:
+    """Test stopping a run writes its report, including the profile and memory tracing when requested."""
+    report_path = tmp_path / "report.json"
+    instrumentation = RunInstrumentation(str(report_path), profile=True, trace_memory=True)
+    instrumentation.start()
+    data = [bytes(1000) for _ in range(100)]
+    instrumentation.add_bytes(read=len(data), written=len(data))
+    instrumentation.stop()
+
+    report = json.loads(report_path.read_text())
+    assert report["wall_seconds"] > 0
+    assert report["bytes_read"] == report["bytes_written"] == 100
+    assert report["profile"]
+    assert report["memory"]["peak_bytes"] >= 100_000
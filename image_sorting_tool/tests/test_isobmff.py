@@ -0,0 +1,133 @@
+"""Unit tests for the isobmff module."""
+
+import struct
+from datetime import datetime, timedelta
+
+import pytest
+
+from image_sorting_tool.image_sort import FILE_TYPES, File, ImageSort, analyse_directory
+from image_sorting_tool.isobmff import MP4_EPOCH, IsobmffError, parse_date_text, read_mp4_creation_time
+
+CREATED = datetime(2021, 2, 3, 4, 5, 6)  # noqa: DTZ001
+
+
+def box(box_type: bytes, payload: bytes = b"") -> bytes:
+    """Build a box with a 32 bit size."""
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def mvhd(seconds: int, version: int = 0) -> bytes:
+    """Build a movie header box with a creation time, followed by the rest of a version 0 header."""
+    time_format = ">Q" if version else ">I"
+    return box(b"mvhd", bytes([version, 0, 0, 0]) + struct.pack(time_format, seconds) * 2 + b"\x00" * 88)
+
+
+def mp4_seconds(dtime: datetime) -> int:
+    """Seconds since the MP4 epoch of a UTC datetime."""
+    return int((dtime - MP4_EPOCH.replace(tzinfo=None)).total_seconds())
+
+
+def local_time(seconds: int) -> datetime:
+    """Local time of a UTC MP4 creation time, as returned for the movie header."""
+    return (MP4_EPOCH + timedelta(seconds=seconds)).astimezone().replace(tzinfo=None)
+
+
+def write_video(tmp_path, boxes: bytes, name: str = "MOV_0001.mp4") -> str:
+    """Write a video of an 'ftyp' box followed by other boxes."""
+    path = tmp_path / name
+    path.write_bytes(box(b"ftyp", b"isom\x00\x00\x02\x00isomiso2mp41") + boxes)
+    return str(path)
+
+
+@pytest.mark.parametrize("version", [0, 1])
+def test_movie_header_creation_time(tmp_path, version) -> None:
+    """Test the creation time is read from the movie header, converted from UTC to local time."""
+    seconds = mp4_seconds(CREATED)
+    path = write_video(tmp_path, box(b"moov", mvhd(seconds, version) + box(b"trak")) + box(b"mdat", b"\x00" * 64))
+    assert read_mp4_creation_time(path) == local_time(seconds)
+
+
+def test_moov_at_the_end(tmp_path) -> None:
+    """Test the 'moov' box is found after a large 'mdat' box with a 64 bit size, without reading the media."""
+    media = b"\x00" * 100_000
+    large_mdat = struct.pack(">I4sQ", 1, b"mdat", 16 + len(media)) + media
+    path = write_video(tmp_path, box(b"free") + large_mdat + box(b"moov", mvhd(mp4_seconds(CREATED))))
+    assert read_mp4_creation_time(path) == local_time(mp4_seconds(CREATED))
+
+
+def test_user_data_date_is_preferred(tmp_path) -> None:
+    """Test the local capture date of 'udta/©day' is used over the movie header, in both its forms."""
+    quicktime_day = box(b"\xa9day", struct.pack(">HH", 24, 0x55C4) + b"2019-08-07T06:05:04+0100")
+    path = write_video(tmp_path, box(b"moov", mvhd(mp4_seconds(CREATED)) + box(b"udta", quicktime_day)))
+    assert read_mp4_creation_time(path) == datetime(2019, 8, 7, 6, 5, 4)  # noqa: DTZ001
+
+    itunes_day = box(b"\xa9day", box(b"data", struct.pack(">II", 1, 0) + b"2018-01-02"))
+    meta = box(b"meta", b"\x00" * 4 + box(b"hdlr", b"\x00" * 24) + box(b"ilst", itunes_day))
+    path = write_video(tmp_path, box(b"moov", box(b"udta", box(b"thmb", b"\xff" * 32) + meta) + mvhd(0)), "b.mov")
+    assert read_mp4_creation_time(path) == datetime(2018, 1, 2)  # noqa: DTZ001
+
+
+def test_no_creation_time(tmp_path) -> None:
+    """Test files without a creation time return None, and files without a 'moov' box raise."""
+    assert read_mp4_creation_time(write_video(tmp_path, box(b"moov", mvhd(0)))) is None
+    assert read_mp4_creation_time(write_video(tmp_path, box(b"moov", box(b"trak")))) is None
+    with pytest.raises(IsobmffError, match="moov"):
+        read_mp4_creation_time(write_video(tmp_path, box(b"mdat", b"\x00" * 16)))
+
+
+@pytest.mark.parametrize(
+    "boxes",
+    [
+        struct.pack(">I4s", 4, b"moov"),  # Smaller than its own header
+        struct.pack(">I4s", 1000, b"moov") + b"\x00" * 8,  # Larger than the file
+        struct.pack(">I4s", 1, b"moov") + b"\x00\x00",  # Truncated 64 bit size
+        box(b"moov", box(b"mvhd", b"\x00\x00")),  # Truncated movie header
+    ],
+)
+def test_malformed(tmp_path, boxes) -> None:
+    """Test malformed boxes raise IsobmffError."""
+    with pytest.raises(IsobmffError):
+        read_mp4_creation_time(write_video(tmp_path, boxes))
+
+
+def test_parse_date_text() -> None:
+    """Test capture dates are parsed in their common formats, ignoring the UTC offset."""
+    assert parse_date_text("2013-04-07T13:21:35+0100") == datetime(2013, 4, 7, 13, 21, 35)  # noqa: DTZ001
+    assert parse_date_text("2013-04-07 13:21") == datetime(2013, 4, 7, 13, 21)  # noqa: DTZ001
+    assert parse_date_text("2013") is None
+    assert parse_date_text("2013-13-07") is None
+
+
+def test_image_sort_reads_videos(tmp_path) -> None:
+    """Test videos are dated from their filename first, and from their headers if the name is generic."""
+    seconds = mp4_seconds(CREATED)
+    generic = write_video(tmp_path, box(b"moov", mvhd(seconds)), "MOV_0001.MP4")
+    assert ImageSort.get_datetime(File(generic)).datetime == local_time(seconds)
+    named = write_video(tmp_path, box(b"moov", mvhd(seconds)), "VID_20200114_135312.mp4")
+    assert ImageSort.get_datetime(File(named)).datetime == datetime(2020, 1, 14, 13, 53, 12)  # noqa: DTZ001
+    undated = write_video(tmp_path, box(b"moov", mvhd(0)), "MOV_0002.mov")
+    assert ImageSort.get_datetime(File(undated)).datetime is None
+
+
+@pytest.mark.parametrize("name", ["IMG_2047.MOV", "GOPR2015.MP4"])
+def test_digits_of_video_names_are_not_guessed_at(tmp_path, name) -> None:
+    """Test videos whose name follows no naming scheme are dated from their headers, not any digits in the name."""
+    seconds = mp4_seconds(CREATED)
+    video = File(write_video(tmp_path, box(b"moov", mvhd(seconds)), name))
+    video.read_stat()
+    assert not ImageSort(str(tmp_path), str(tmp_path)).resolve_datetime_locally(video)
+    assert ImageSort.get_datetime(video).datetime == local_time(seconds)
+
+
+def test_sort_generic_videos(tmp_path) -> None:
+    """Test videos with generic names are sorted by the creation time in their headers."""
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.mkdir()
+    dst.mkdir()
+    seconds = mp4_seconds(CREATED)
+    write_video(src, box(b"moov", mvhd(seconds)), "MOV_0001.mp4")
+    write_video(src, box(b"moov", mvhd(seconds)), "VID_20200114_135312.mp4")
+    sorter = analyse_directory(str(src), str(dst), ext_to_sort=FILE_TYPES["mp4"])
+    assert sorted(sorter.files_list[row].datetime for row in sorter.sort_list) == sorted(
+        [local_time(seconds), datetime(2020, 1, 14, 13, 53, 12)]  # noqa: DTZ001
+    )
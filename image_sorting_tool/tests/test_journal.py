@@ -0,0 +1,139 @@
+"""Unit tests for the journal module."""
+
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+
+from image_sorting_tool.image_sort import File
+from image_sorting_tool.journal import SortJournal
+
+
+def make_sorted_file(tmp_path, name: str, content: bytes = b"photo") -> File:
+    """Write a source file and its output file, returning the source File object ready for the journal."""
+    source = tmp_path / "src" / name
+    source.parent.mkdir(exist_ok=True)
+    source.write_bytes(content)
+    input_file = File(str(source))
+    input_file.read_stat()
+    input_file.destination_relative_path = "2013"
+    input_file.sorted_filename = name
+    output = tmp_path / "dst" / "2013" / name
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_bytes(content)
+    return input_file
+
+
+def test_checkpointed_entries_are_trusted(tmp_path) -> None:
+    """Test entries before a checkpoint are loaded without checking the output folder."""
+    input_file = make_sorted_file(tmp_path, "a.jpg")
+    journal = SortJournal(str(tmp_path / "dst"))
+    journal.open()
+    journal.record(input_file, 5)
+    journal.close()
+    (tmp_path / "dst" / "2013" / "a.jpg").unlink()
+
+    journal.load()
+
+    assert journal.is_complete(input_file)
+
+
+def test_unconfirmed_entries_are_verified(tmp_path) -> None:
+    """Test entries after the last checkpoint only count if their output file is intact."""
+    intact = make_sorted_file(tmp_path, "intact.jpg")
+    truncated = make_sorted_file(tmp_path, "truncated.jpg")
+    journal = SortJournal(str(tmp_path / "dst"), checkpoint_interval=3600)
+    journal.open()
+    journal.record(intact, 5)
+    journal.record(truncated, 5)
+    journal.file.flush()  # Interrupted before a checkpoint
+    (tmp_path / "dst" / "2013" / "truncated.jpg").write_bytes(b"ph")
+
+    resumed = SortJournal(str(tmp_path / "dst"))
+    resumed.load()
+
+    assert resumed.is_complete(intact)
+    assert not resumed.is_complete(truncated)
+    journal.file.close()
+
+
+@pytest.mark.parametrize(("fsync", "synced_at_checkpoint"), [("none", 0), ("file", 0), ("folder", 1), ("end", 0)])
+def test_checkpoints_follow_the_fsync_policy(tmp_path, fsync, synced_at_checkpoint) -> None:
+    """Test checkpoints only sync the files recorded since the last one, and only confirm files that were synced."""
+    first, second = make_sorted_file(tmp_path, "first.jpg"), make_sorted_file(tmp_path, "second.jpg")
+    journal = SortJournal(str(tmp_path / "dst"), checkpoint_interval=3600, fsync=fsync)
+    journal.open()
+    with (
+        patch("image_sorting_tool.journal.fsync_files") as fsync_files,
+        patch("image_sorting_tool.journal.os.sync", create=True) as sync_call,
+    ):
+        journal.record(first, 5)
+        journal.checkpoint()
+        journal.record(second, 5)
+        journal.close()
+    sync_call.assert_not_called()
+    assert fsync_files.call_count == 2 * synced_at_checkpoint
+    if synced_at_checkpoint:
+        assert fsync_files.call_args_list[1].args == ([str(tmp_path / "dst" / "2013" / "second.jpg")],)
+    (tmp_path / "dst" / "2013" / "first.jpg").unlink()  # Lost by a power cut, unless it had been synced
+
+    journal.load()
+
+    assert journal.is_complete(first) == (fsync in {"file", "folder"})
+    assert journal.is_complete(second)
+
+
+def test_partial_last_line_is_ignored(tmp_path) -> None:
+    """Test a line cut short by an interruption does not stop the journal from loading."""
+    input_file = make_sorted_file(tmp_path, "a.jpg")
+    entry = {"source": input_file.fullpath, "size": 5, "mtime_ns": input_file.mtime_ns}
+    entry.update({"destination": SortJournal.destination_of(input_file), "bytes": 5})
+    (tmp_path / "dst" / ".image-sorting-tool-journal.jsonl").write_text(
+        json.dumps(entry) + '\n{"checkpoint": true}\n{"source": "/cut'
+    )
+    journal = SortJournal(str(tmp_path / "dst"))
+
+    journal.load()
+
+    assert list(journal.completed) == [input_file.fullpath]
+
+
+def test_changed_sources_are_not_complete(tmp_path) -> None:
+    """Test a source modified since its transfer, or now sorted to another destination, is redone."""
+    input_file = make_sorted_file(tmp_path, "a.jpg")
+    journal = SortJournal(str(tmp_path / "dst"))
+    journal.open()
+    journal.record(input_file, 5)
+    journal.close()
+    journal.load()
+
+    input_file.sorted_filename = "a_001.jpg"
+    assert not journal.is_complete(input_file)
+    input_file.sorted_filename = "a.jpg"
+    input_file.size = 6
+    assert not journal.is_complete(input_file)
+
+
+def test_open_without_resume_starts_afresh(tmp_path) -> None:
+    """Test a new sort discards the journal of the previous one."""
+    input_file = make_sorted_file(tmp_path, "a.jpg")
+    journal = SortJournal(str(tmp_path / "dst"))
+    journal.open()
+    journal.record(input_file, 5)
+    journal.close()
+
+    journal.open(resume=False)
+    journal.close()
+    journal.load()
+
+    assert not journal.completed
+
+
+def test_open_creates_output_folder(tmp_path) -> None:
+    """Test the journal can be opened before the output folder exists."""
+    journal = SortJournal(str(tmp_path / "new" / "dst"))
+    journal.open()
+    journal.close()
+
+    assert os.path.isfile(journal.path)
@@ -1,8 +1,18 @@
 """Unit tests for the __main__ module."""
 
+import os
+import shutil
+import subprocess
+import sys
 from unittest.mock import patch
 
-from image_sorting_tool.__main__ import parse_args
+import pytest
+
+from image_sorting_tool.__main__ import parse_args, run_apply, run_gui, run_plan, run_sort
+from image_sorting_tool.image_sort import JPEG_EXTENSIONS
+
+tests_path = os.path.dirname(os.path.abspath(__file__))
+BURST_ASSETS_PATH = tests_path + "/../../assets/test_assets/burst"
 
 
 def test_parse_args() -> None:
@@ -10,3 +20,74 @@ def test_parse_args() -> None:
     with patch("sys.argv", ["image-sorting-tool", "-vv"]):
         args = parse_args()
         assert args.verbosity == 2
+        assert args.command is None
+
+
+def test_parse_args_sort() -> None:
+    """Test the sort command parses its positional arguments and options."""
+    args = parse_args(["sort", "src", "dst", "-t", "jpeg", "-t", "png", "--rename-duplicates"])
+    assert args.command == "sort"
+    assert (args.source, args.destination) == ("src", "dst")
+    assert args.types == ["jpeg", "png"]
+    assert args.rename_duplicates
+    assert not args.copy_other_files
+    assert not args.skip_identical
+    assert args.copy_workers is None
+
+
+def test_run_sort(tmp_path) -> None:
+    """Test a headless sort copies the burst shots into the output folder."""
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    shutil.copytree(BURST_ASSETS_PATH, src)
+    dst.mkdir()
+    with patch("image_sorting_tool.__main__.sort_directory") as mock_sort:
+        run_sort(parse_args(["sort", str(src), str(dst), "-q", "--no-cache"]))
+    assert mock_sort.call_args.kwargs["ext_to_sort"] == JPEG_EXTENSIONS
+
+    cache_file = str(tmp_path / "cache.sqlite3")
+    run_sort(parse_args(["sort", str(src), str(dst), "--rename-duplicates", "-q", "--cache-file", cache_file]))
+    assert len(os.listdir(dst / "2013" / "04")) == 9
+
+
+def test_run_gui_launches_the_gui() -> None:
+    """Test the GUI entry point launches the GUI whatever the arguments, as it has no console for commands."""
+    with (
+        patch("sys.argv", ["image-sorting-tool-gui", "sort", "src", "dst"]),
+        patch("image_sorting_tool.gui.GUI") as mock_gui,
+        patch("image_sorting_tool.__main__.run_sort") as mock_sort,
+    ):
+        run_gui()
+    mock_gui.return_value.mainloop.assert_called_once()
+    mock_sort.assert_not_called()
+
+
+def test_headless_import_does_not_load_tkinter() -> None:
+    """Test the command line entry point can be imported without tkinter."""
+    code = "import sys, image_sorting_tool.__main__; sys.exit('tkinter' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], check=False).returncode == 0  # noqa: S603
+
+
+def test_parse_args_apply_shard() -> None:
+    """Test the apply command parses shards given as I/N into a 0-based shard and the number of shards."""
+    args = parse_args(["apply", "plan.jsonl", "--shard", "2/4", "--mode", "hardlink"])
+    assert (args.command, args.plan, args.shard, args.mode) == ("apply", "plan.jsonl", (1, 4), "hardlink")
+    assert parse_args(["apply", "plan.jsonl"]).shard is None
+    for shard in ["0/4", "5/4", "two"]:
+        with pytest.raises(SystemExit):
+            parse_args(["apply", "plan.jsonl", "--shard", shard])
+
+
+def test_run_plan_and_apply(tmp_path) -> None:
+    """Test a plan written by the plan command is transferred by the apply command."""
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    shutil.copytree(BURST_ASSETS_PATH, src)
+    dst.mkdir()
+    plan_path = str(tmp_path / "plan.jsonl.gz")
+    run_plan(parse_args(["plan", str(src), str(dst), plan_path, "--rename-duplicates", "-q", "--no-cache"]))
+    assert os.listdir(dst) == []
+    for shard in ["1/2", "2/2"]:
+        run_apply(parse_args(["apply", plan_path, "--shard", shard, "-q"]))
+    assert len(os.listdir(dst / "2013" / "04")) == 9
+
+    with pytest.raises(SystemExit, match="does not exist"):
+        run_apply(parse_args(["apply", str(tmp_path / "missing.jsonl")]))
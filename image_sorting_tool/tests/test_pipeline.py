@@ -0,0 +1,134 @@
+"""Unit tests for the pipeline module."""
+
+import io
+import os
+import shutil
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from image_sorting_tool.__main__ import parse_args, run_sort
+from image_sorting_tool.file_index import FLAG_SORT
+from image_sorting_tool.image_sort import FILE_TYPES, JPEG_EXTENSIONS, ImageSort, sort_directory
+from image_sorting_tool.instrumentation import RunInstrumentation
+from image_sorting_tool.journal import JOURNAL_FILENAME, SortJournal
+from image_sorting_tool.pipeline import StageLimits, pipeline_sort_directory
+from image_sorting_tool.plan import plan_entries
+from image_sorting_tool.reporting import StreamReporter
+
+tests_path = os.path.dirname(os.path.abspath(__file__))
+ASSETS_PATH = tests_path + "/../../assets/test_assets"
+
+
+@pytest.fixture(name="source_dir")
+def fixture_source_dir(tmp_path) -> str:
+    """Copy the mix and burst assets into an input folder."""
+    source_dir = tmp_path / "src"
+    shutil.copytree(ASSETS_PATH, source_dir)
+    return str(source_dir)
+
+
+def sorted_files(destination_dir: str) -> list[str]:
+    """Return the paths of the files in the output folder, relative to it."""
+    return sorted(
+        os.path.relpath(os.path.join(root, name), destination_dir)
+        for root, _, names in os.walk(destination_dir)
+        for name in names
+    )
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},  # Transfers start as soon as files are categorised
+        {"copy_unsorted": True, "limits": StageLimits(stat=1, metadata=1, transfer=1)},
+        {"rename_duplicates": True, "copy_unsorted": True},  # Transfers wait for every file to be analysed
+        {"skip_identical": True},
+    ],
+)
+def test_pipeline_matches_sort_directory(source_dir, tmp_path, options) -> None:
+    """Test the pipeline plans and transfers the same files as sorting one phase after another."""
+    ext_to_sort = FILE_TYPES["jpeg"] + FILE_TYPES["png"]
+    sort_options = {key: value for key, value in options.items() if key != "limits"}
+    expected_dir, pipeline_dir = str(tmp_path / "expected"), str(tmp_path / "pipeline")
+    os.mkdir(expected_dir)
+    os.mkdir(pipeline_dir)
+
+    expected = sort_directory(source_dir, expected_dir, ext_to_sort=ext_to_sort, **sort_options)
+    sorter = pipeline_sort_directory(source_dir, pipeline_dir, ext_to_sort=ext_to_sort, **options)
+
+    assert sorter.sorting_complete
+    assert plan_entries(sorter.files_list) == plan_entries(expected.files_list)
+    assert sorted_files(pipeline_dir) == sorted_files(expected_dir)
+    assert not os.path.exists(os.path.join(pipeline_dir, JOURNAL_FILENAME))
+
+
+def test_pipeline_resume(source_dir, tmp_path) -> None:
+    """Test resuming skips the files the journal of an interrupted run lists as transferred."""
+    destination_dir = str(tmp_path / "dst")
+    os.mkdir(destination_dir)
+    sorter = pipeline_sort_directory(source_dir, destination_dir, rename_duplicates=True)
+    # Recreate the journal of a run interrupted after its first few transfers
+    journal = SortJournal(destination_dir)
+    journal.open()
+    for index in sorter.sort_list[:5]:
+        input_file = sorter.files_list[index]
+        journal.record(input_file, os.path.getsize(input_file.fullpath))
+    journal.close()
+    stream = io.StringIO()
+
+    pipeline_sort_directory(
+        source_dir, destination_dir, rename_duplicates=True, resume=True, reporter=StreamReporter(stream)
+    )
+
+    assert "skipped 5 files" in stream.getvalue()
+    assert stream.getvalue().count("Processed : ") == len(sorter.files_list.rows(flag=FLAG_SORT)) - 5
+
+
+def test_pipeline_instrumented(source_dir, tmp_path) -> None:
+    """Test an instrumented run times the pipeline as a whole and counts the bytes it copies."""
+    instrumentation = RunInstrumentation()
+    pipeline_sort_directory(source_dir, str(tmp_path), instrumentation=instrumentation)
+
+    report = instrumentation.report()
+    assert "pipeline" in report["phases"]
+    assert report["bytes_written"] > 0
+
+
+@pytest.mark.parametrize("rename_duplicates", [False, True])
+def test_pipeline_blocking_work_leaves_the_event_loop(source_dir, tmp_path, monkeypatch, rename_duplicates) -> None:
+    """Test journal checkpoints and the categorisation, which may hash files, never block the event loop."""
+    threads = {}
+
+    def on_thread(name: str, function: object) -> object:
+        def wrapper(*args: object) -> object:
+            threads.setdefault(name, set()).add(threading.current_thread())
+            return function(*args)
+
+        return wrapper
+
+    monkeypatch.setattr(SortJournal, "record", on_thread("record", SortJournal.record))
+    monkeypatch.setattr(ImageSort, "categorize_found_files", on_thread("categorize", ImageSort.categorize_found_files))
+    pipeline_sort_directory(source_dir, str(tmp_path), rename_duplicates=rename_duplicates)
+
+    assert set(threads) == {"record", "categorize"}
+    assert threading.main_thread() not in set.union(*threads.values())  # The event loop runs on the main thread
+
+
+def test_pipeline_stage_failure(source_dir, tmp_path) -> None:
+    """Test an error in a stage stops every stage and is raised."""
+    with (
+        patch.object(ImageSort, "resolve_datetime_locally", side_effect=RuntimeError("Broken stage")),
+        pytest.raises(RuntimeError, match="Broken stage"),
+    ):
+        pipeline_sort_directory(source_dir, str(tmp_path), ext_to_sort=JPEG_EXTENSIONS)
+
+
+def test_pipeline_arguments(source_dir, tmp_path) -> None:
+    """Test the sort command runs the pipeline with --pipeline, which cannot be combined with --autotune."""
+    with patch("image_sorting_tool.__main__.pipeline_sort_directory") as mock_pipeline:
+        run_sort(parse_args(["sort", source_dir, str(tmp_path), "--pipeline", "-q", "--no-cache"]))
+    assert mock_pipeline.call_args.kwargs["ext_to_sort"] == JPEG_EXTENSIONS
+    with pytest.raises(SystemExit, match="autotune"):
+        run_sort(parse_args(["sort", source_dir, str(tmp_path), "--pipeline", "--autotune", "--no-cache"]))
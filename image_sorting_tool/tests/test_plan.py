@@ -0,0 +1,110 @@
+"""Unit tests for the plan module."""
+
+import json
+import os
+import shutil
+
+import pytest
+
+from image_sorting_tool.image_sort import ImageSort, analyse_directory
+from image_sorting_tool.plan import (
+    apply_plan,
+    plan_entries,
+    plan_index,
+    read_plan,
+    shard_journal_filename,
+    shard_of,
+    write_plan,
+)
+
+tests_path = os.path.dirname(os.path.abspath(__file__))
+BURST_ASSETS_PATH = tests_path + "/../../assets/test_assets/burst"
+
+
+@pytest.fixture(name="burst_sorter")
+def fixture_burst_sorter(tmp_path) -> ImageSort:
+    """Burst shots analysed for sorting into an empty output folder, with duplicates renamed."""
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    shutil.copytree(BURST_ASSETS_PATH, src)
+    (src / "notes.txt").write_text("not a photo")
+    dst.mkdir()
+    return analyse_directory(str(src), str(dst), rename_duplicates=True, copy_unsorted=True)
+
+
+@pytest.mark.parametrize("filename", ["plan.jsonl", "plan.jsonl.gz"])
+def test_write_and_read_plan(burst_sorter, tmp_path, filename) -> None:
+    """Test a plan lists every file to transfer with its destination, and reads back the same."""
+    plan_path = str(tmp_path / filename)
+    assert write_plan(plan_path, burst_sorter) == 10
+    header, entries = read_plan(plan_path)
+    entries = list(entries)
+    assert header["source_dir"] == burst_sorter.source_dir
+    assert header["destination_dir"] == burst_sorter.destination_dir
+    assert header["settings"]["rename_duplicates"]
+    assert header["files"] == len(entries) == 10
+    assert entries == plan_entries(burst_sorter.files_list)
+    assert [entry.source for entry in entries] == sorted(entry.source for entry in entries)
+    assert {entry.category for entry in entries} == {"sort", "other"}
+    assert all(entry.size == os.path.getsize(entry.source) for entry in entries)
+    sorted_entries = [entry for entry in entries if entry.category == "sort"]
+    assert all(entry.destination.startswith("2013/04/") for entry in sorted_entries)
+    assert all(entry.renamed and entry.duplicate_idx for entry in sorted_entries)
+    assert len({entry.destination for entry in entries}) == 10
+
+
+def test_read_plan_rejects_other_files(tmp_path) -> None:
+    """Test files that are not plans, or are plans of a newer version, are rejected."""
+    not_a_plan = tmp_path / "notes.txt"
+    not_a_plan.write_text("not a plan\n")
+    with pytest.raises(ValueError, match="Not a sort plan"):
+        read_plan(str(not_a_plan))
+    newer_plan = tmp_path / "plan.jsonl"
+    newer_plan.write_text(json.dumps({"format": "image-sorting-tool-plan", "version": 99}) + "\n")
+    with pytest.raises(ValueError, match="Not a sort plan"):
+        read_plan(str(newer_plan))
+
+
+def test_plan_index_rebuilds_destinations(burst_sorter) -> None:
+    """Test the index built from a plan transfers every file to the same destination as the analysis."""
+    entries = plan_entries(burst_sorter.files_list)
+    files_list = plan_index(entries)
+    assert [files_list[row].fullpath for row in range(len(files_list))] == [entry.source for entry in entries]
+    assert plan_entries(files_list) == entries
+
+    edited = entries[0]._replace(destination="2013/04/elsewhere.jpg")
+    with pytest.raises(ValueError, match="was changed"):
+        plan_index([edited, *entries[1:]])
+
+
+def test_apply_plan(burst_sorter, tmp_path) -> None:
+    """Test applying a plan transfers its files without analysing them again, skipping removed entries."""
+    plan_path = tmp_path / "plan.jsonl"
+    write_plan(str(plan_path), burst_sorter)
+    lines = plan_path.read_text(encoding="utf-8").splitlines(keepends=True)
+    plan_path.write_text("".join(line for line in lines if "notes.txt" not in line), encoding="utf-8")
+
+    sorter = apply_plan(str(plan_path))
+    assert len(sorter.files_list) == 9
+    sorted_folder = os.path.join(burst_sorter.destination_dir, "2013", "04")
+    expected = [entry.destination for entry in plan_entries(burst_sorter.files_list) if entry.category == "sort"]
+    assert sorted(os.listdir(sorted_folder)) == sorted(os.path.basename(path) for path in expected)
+    assert not os.path.exists(os.path.join(burst_sorter.destination_dir, "other_files"))
+
+
+def test_apply_plan_shards(burst_sorter, tmp_path) -> None:
+    """Test the shards of a plan together transfer every file exactly once."""
+    plan_path = str(tmp_path / "plan.jsonl.gz")
+    write_plan(plan_path, burst_sorter)
+    shard_count = 3
+    transferred = []
+    for shard in range(shard_count):
+        sorter = apply_plan(plan_path, shard=shard, shard_count=shard_count)
+        transferred += [input_file.fullpath for input_file in sorter.files_list]
+        assert sorter.journal_filename == shard_journal_filename(shard, shard_count)
+        assert all(shard_of(entry, shard_count) == shard for entry in plan_entries(sorter.files_list))
+    assert sorted(transferred) == sorted(entry.source for entry in plan_entries(burst_sorter.files_list))
+    assert len(os.listdir(os.path.join(burst_sorter.destination_dir, "2013", "04"))) == 9
+    assert os.listdir(os.path.join(burst_sorter.destination_dir, "other_files")) == ["notes.txt"]
+
+    with pytest.raises(ValueError, match="does not exist"):
+        apply_plan(plan_path, shard=shard_count, shard_count=shard_count)
@@ -0,0 +1,74 @@
+"""Unit tests for the reporting module."""
+
+import io
+from unittest.mock import patch
+
+from image_sorting_tool.reporting import Progress, StreamReporter
+
+
+def test_progress_summary() -> None:
+    """Test the summary shows the counts, throughput and ETA."""
+    with patch("image_sorting_tool.reporting.time.monotonic", return_value=100.0):
+        progress = Progress("Sorting", total_files=20)
+    progress.update(files=10, bytes_done=50_000_000)
+    with patch("image_sorting_tool.reporting.time.monotonic", return_value=110.0):
+        assert progress.summary() == "Sorting: 10 of 20 files, 50.0 MB, 5.0 MB/s, ETA 0m 10s"
+
+
+def at_time(seconds: float) -> object:
+    """Patch the clock of the progress counters to a fixed time."""
+    return patch("image_sorting_tool.reporting.time.monotonic", return_value=seconds)
+
+
+def test_progress_eta_counts_bytes() -> None:
+    """Test the ETA is estimated from the bytes left when their total is known, not the files left."""
+    with at_time(0.0):
+        progress = Progress("Sorting", total_files=11, total_bytes=2_000_000_000)
+    progress.update(files=10, bytes_done=10_000_000)  # Ten photos done, one large video left
+    with at_time(2.0):
+        assert progress.fraction_done == 0.005
+        assert progress.eta == 398.0
+
+
+def test_progress_rate_follows_recent_speed() -> None:
+    """Test the throughput and ETA are measured over the last RATE_WINDOW seconds, not the whole phase."""
+    with at_time(0.0):
+        progress = Progress("Sorting", total_bytes=1_000_000_000)
+    for second in range(1, 31):
+        progress.update(bytes_done=20_000_000 if second <= 20 else 1_000_000)  # Slows down after 20 seconds
+        with at_time(float(second)):
+            assert progress.report_due()
+    with at_time(30.0):
+        assert progress.bytes_per_second == 1_000_000
+        assert progress.eta == 590.0
+    with at_time(45.0):  # Nothing finished within the window, such as while copying one large file
+        assert progress.report_due()
+        assert progress.bytes_per_second == 0
+        assert progress.eta == 45.0 * 590 / 410
+
+
+def test_progress_without_totals() -> None:
+    """Test phases with an unknown number of files have no ETA."""
+    progress = Progress("Analysing")
+    progress.update()
+    assert progress.eta is None
+    assert progress.fraction_done is None
+    assert progress.summary() == "Analysing: 1 files"
+
+
+def test_report_due_is_rate_limited() -> None:
+    """Test reports are due at most once per interval."""
+    with patch("image_sorting_tool.reporting.time.monotonic", return_value=0.0):
+        progress = Progress("Sorting")
+    with patch("image_sorting_tool.reporting.time.monotonic", return_value=1.0):
+        assert progress.report_due()
+        assert not progress.report_due()
+
+
+def test_stream_reporter_skips_progress_when_not_a_terminal() -> None:
+    """Test progress lines are only written to terminals, while messages always are."""
+    stream = io.StringIO()
+    reporter = StreamReporter(stream)
+    reporter.write("hello\n")
+    reporter.progress(Progress("Sorting"))
+    assert stream.getvalue() == "hello\n"
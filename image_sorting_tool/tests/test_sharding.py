@@ -0,0 +1,135 @@
+"""Unit tests for the sharding module."""
+
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from image_sorting_tool.__main__ import parse_args, run_apply, run_merge
+from image_sorting_tool.image_sort import FILE_TYPES, JPEG_EXTENSIONS, analyse_directory
+from image_sorting_tool.plan import plan_entries, read_plan
+from image_sorting_tool.sharding import (
+    analyse_shard,
+    folder_shard,
+    merge_partial_indexes,
+    read_partial_index,
+)
+
+tests_path = os.path.dirname(os.path.abspath(__file__))
+ASSETS_PATH = tests_path + "/../../assets/test_assets"
+EXTENSIONS = JPEG_EXTENSIONS + FILE_TYPES["png"] + FILE_TYPES["gif"]
+
+
+@pytest.fixture(name="folders")
+def fixture_folders(tmp_path) -> tuple[str, str]:
+    """Input folder with the burst shots spread over several folders, so their duplicates span shards."""
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    shutil.copytree(os.path.join(ASSETS_PATH, "mix"), src / "mix")
+    for number, name in enumerate(sorted(os.listdir(os.path.join(ASSETS_PATH, "burst")))):
+        folder = src / "burst" / f"folder_{number % 4}"
+        folder.mkdir(parents=True, exist_ok=True)
+        shutil.copy(os.path.join(ASSETS_PATH, "burst", name), folder)
+    dst.mkdir()
+    return str(src), str(dst)
+
+
+def test_shards_partition_the_files(folders, tmp_path) -> None:
+    """Test every file is analysed by exactly one shard, the shard of its folder."""
+    source_dir, destination_dir = folders
+    shard_count = 3
+    analysed = []
+    for shard in range(shard_count):
+        index_path = str(tmp_path / f"shard_{shard}.jsonl")
+        sorter = analyse_shard(source_dir, destination_dir, index_path, shard=shard, shard_count=shard_count)
+        header, entries = read_partial_index(index_path)
+        entries = list(entries)
+        assert (header["shard"], header["shard_count"], header["files"]) == (shard, shard_count, len(entries))
+        assert [entry.source for entry in entries] == [input_file.fullpath for input_file in sorter.files_list]
+        assert all(folder_shard(os.path.dirname(entry.source), source_dir, shard_count) == shard for entry in entries)
+        assert all(entry.size == os.path.getsize(entry.source) for entry in entries)
+        analysed += [entry.source for entry in entries]
+    found = [os.path.join(root, name) for root, _, names in os.walk(source_dir) for name in names]
+    assert sorted(analysed) == sorted(found)
+
+    with pytest.raises(ValueError, match="does not exist"):
+        analyse_shard(source_dir, destination_dir, str(tmp_path / "index.jsonl"), shard=3, shard_count=3)
+
+
+@pytest.mark.parametrize("skip_identical", [False, True])
+def test_merge_matches_a_single_analysis(folders, tmp_path, skip_identical) -> None:
+    """Test merging the shards categorises and numbers duplicates exactly as analysing the whole folder at once."""
+    source_dir, destination_dir = folders
+    shutil.copy(os.path.join(ASSETS_PATH, "mix", "pass_0.JPG"), os.path.join(source_dir, "burst", "folder_0"))
+    settings = {"ext_to_sort": EXTENSIONS, "rename_duplicates": True, "skip_identical": skip_identical}
+    shard_count = 4
+    index_paths = [str(tmp_path / f"shard_{shard}.jsonl.gz") for shard in range(shard_count)]
+    for shard, index_path in enumerate(index_paths):
+        analyse_shard(source_dir, destination_dir, index_path, shard=shard, shard_count=shard_count)
+
+    merged = merge_partial_indexes(index_paths, **settings)
+    single = analyse_directory(source_dir, destination_dir, **settings)
+    assert plan_entries(merged.files_list) == plan_entries(single.files_list)
+    for rows in ("duplicates_list", "identical_list"):
+        merged_paths = sorted(merged.files_list.fullpath(row) for row in getattr(merged, rows))
+        assert merged_paths == sorted(single.files_list.fullpath(row) for row in getattr(single, rows))
+    assert len(merged.identical_list if skip_identical else merged.duplicates_list) >= 9
+
+
+def test_merge_checks_the_shards(folders, tmp_path) -> None:
+    """Test partial indexes are only merged if they cover every shard of the same sort once."""
+    source_dir, destination_dir = folders
+    index_paths = [str(tmp_path / f"shard_{shard}.jsonl") for shard in range(3)]
+    for shard, index_path in enumerate(index_paths):
+        analyse_shard(source_dir, destination_dir, index_path, shard=shard, shard_count=3)
+    with pytest.raises(ValueError, match=r"missing shards \[3\]"):
+        merge_partial_indexes(index_paths[:2])
+    with pytest.raises(ValueError, match=r"repeated shards \[1\]"):
+        merge_partial_indexes([index_paths[0], *index_paths])
+
+    other_shard_count = str(tmp_path / "other.jsonl")
+    analyse_shard(source_dir, destination_dir, other_shard_count, shard=0, shard_count=2)
+    with pytest.raises(ValueError, match="different sorts"):
+        merge_partial_indexes([other_shard_count, *index_paths])
+
+
+def test_sharded_sort_with_processes(folders, tmp_path) -> None:
+    """Test a sort split across processes, standing in for machines, sorts every file once."""
+    source_dir, destination_dir = folders
+    shard_count = 3
+    index_paths = [str(tmp_path / f"shard_{shard}.jsonl") for shard in range(shard_count)]
+    processes = [
+        subprocess.Popen(  # noqa: S603
+            [
+                sys.executable,
+                "-m",
+                "image_sorting_tool",
+                "analyse-shard",
+                source_dir,
+                destination_dir,
+                index_path,
+                "--shard",
+                f"{shard + 1}/{shard_count}",
+                "--no-cache",
+                "-q",
+            ]
+        )
+        for shard, index_path in enumerate(index_paths)
+    ]
+    assert [process.wait() for process in processes] == [0] * shard_count
+
+    plan_path = str(tmp_path / "plan.jsonl")
+    run_merge(parse_args(["merge", plan_path, *index_paths, "-t", "jpeg", "--rename-duplicates", "--no-cache", "-q"]))
+    for shard in range(shard_count):
+        run_apply(parse_args(["apply", plan_path, "--shard", f"{shard + 1}/{shard_count}", "-q"]))
+
+    header, entries = read_plan(plan_path)
+    destinations = [entry.destination for entry in entries]
+    assert header["files"] == len(destinations) == 13
+    sorted_files = [
+        os.path.relpath(os.path.join(root, name), destination_dir).replace(os.sep, "/")
+        for root, _, names in os.walk(destination_dir)
+        for name in names
+    ]
+    assert sorted(sorted_files) == sorted(destinations)
@@ -0,0 +1,261 @@
+"""Unit tests for the transfer module."""
+
+import errno
+import os
+import threading
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pytest
+
+from image_sorting_tool import transfer
+from image_sorting_tool.transfer import (
+    TRANSFER_MODES,
+    CopyOptions,
+    copy_file_data,
+    create_folders,
+    fsync_files,
+    transfer_file,
+)
+
+
+@pytest.fixture(name="source")
+def fixture_source(tmp_path) -> str:
+    """Create a source file to transfer."""
+    path = tmp_path / "source.jpg"
+    path.write_bytes(os.urandom(100_000))
+    return str(path)
+
+
+@pytest.mark.parametrize("mode", TRANSFER_MODES)
+def test_modes_produce_identical_content(tmp_path, source, mode) -> None:
+    """Test every mode leaves a file with the source's content at the destination."""
+    content = Path(source).read_bytes()
+    destination = str(tmp_path / "destination.jpg")
+
+    mode_used = transfer_file(source, destination, mode)
+
+    assert mode_used in {mode, "copy"}
+    assert Path(destination).read_bytes() == content
+    assert os.path.exists(source) == (mode != "move")
+
+
+def test_hardlink_shares_the_inode(tmp_path, source) -> None:
+    """Test hardlinks do not duplicate the data."""
+    destination = str(tmp_path / "destination.jpg")
+    assert transfer_file(source, destination, "hardlink") == "hardlink"
+    assert os.stat(destination).st_ino == os.stat(source).st_ino
+
+
+def test_unsupported_mode_falls_back_to_copy(tmp_path, source) -> None:
+    """Test a cross device hardlink is replaced by a copy."""
+    destination = str(tmp_path / "destination.jpg")
+    with patch("image_sorting_tool.transfer.os.link", side_effect=OSError(errno.EXDEV, "cross device")):
+        assert transfer_file(source, destination, "hardlink") == "copy"
+    assert os.stat(destination).st_ino != os.stat(source).st_ino
+
+
+def test_move_refuses_to_overwrite(tmp_path, source) -> None:
+    """Test moving onto an existing file keeps both files."""
+    destination = tmp_path / "destination.jpg"
+    destination.write_bytes(b"existing")
+    with pytest.raises(FileExistsError):
+        transfer_file(source, str(destination), "move")
+    assert os.path.exists(source)
+    assert destination.read_bytes() == b"existing"
+
+
+def race_moves(sources: list[str], destination: str) -> list[FileExistsError]:
+    """Move files onto one destination from a thread each, all starting at once.
+
+    Returns: the errors of the moves refused as the destination exists
+    """
+    barrier = threading.Barrier(len(sources))
+    errors = []
+
+    def move(source: str) -> None:
+        barrier.wait()
+        try:
+            transfer_file(source, destination, "move")
+        except FileExistsError as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=move, args=(source,)) for source in sources]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+@pytest.mark.parametrize("strategy", ["renameat2", "hardlink", "locked", "cross_device"])
+def test_racing_moves_keep_both_files(tmp_path, monkeypatch, strategy) -> None:
+    """Test two threads moving files onto the same destination never destroy either file."""
+    rename_no_replace = transfer.rename_no_replace
+    if strategy != "renameat2":
+        monkeypatch.setattr(transfer, "_renameat2_no_replace", lambda source, destination: False)
+    if strategy == "locked":
+        monkeypatch.setattr(transfer.os, "link", Mock(side_effect=OSError(errno.EPERM, "no hardlinks")))
+    for attempt in range(20):
+        sources = {str(tmp_path / f"{attempt}_{name}.jpg"): os.urandom(10_000) for name in ("a", "b")}
+        for path, content in sources.items():
+            Path(path).write_bytes(content)
+        if strategy == "cross_device":
+
+            def across_devices(source: str, destination: str, sources: dict = sources) -> None:
+                if source in sources:
+                    raise OSError(errno.EXDEV, "cross device")
+                rename_no_replace(source, destination)
+
+            monkeypatch.setattr(transfer, "rename_no_replace", across_devices)
+        destination = tmp_path / f"{attempt}_destination.jpg"
+        errors = race_moves(list(sources), str(destination))
+
+        assert len(errors) == 1
+        remaining = [path for path in sources if os.path.exists(path)]
+        assert len(remaining) == 1
+        assert Path(remaining[0]).read_bytes() == sources[remaining[0]]
+        moved = next(path for path in sources if path not in remaining)
+        assert destination.read_bytes() == sources[moved]
+        assert sorted(os.listdir(tmp_path)).count(destination.name) == 1
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def move_across_devices(monkeypatch, source: str) -> None:
+    """Make renaming the source fail as if the destination was on another filesystem."""
+    rename_no_replace = transfer.rename_no_replace
+
+    def across_devices(from_path: str, to_path: str) -> None:
+        if from_path == source:
+            raise OSError(errno.EXDEV, "cross device")
+        rename_no_replace(from_path, to_path)
+
+    monkeypatch.setattr(transfer, "rename_no_replace", across_devices)
+
+
+@pytest.mark.skipif(not hasattr(os, "copy_file_range"), reason="copy_file_range is Linux only")
+@pytest.mark.parametrize("sendfile_copies", [True, False])
+def test_copy_file_range_copying_nothing_falls_back(tmp_path, source, monkeypatch, sendfile_copies) -> None:
+    """Test a copy_file_range returning 0 on its first call, as on some filesystems, does not leave an empty copy."""
+    content = Path(source).read_bytes()
+    destination = tmp_path / "destination.jpg"
+    move_across_devices(monkeypatch, source)
+    monkeypatch.setattr(transfer.os, "copy_file_range", Mock(return_value=0))
+    if not sendfile_copies:
+        monkeypatch.setattr(transfer.os, "sendfile", Mock(return_value=0))
+
+    transfer_file(source, str(destination), "move")
+
+    assert destination.read_bytes() == content
+    assert not os.path.exists(source)
+
+
+def test_incomplete_move_keeps_the_source(tmp_path, source, monkeypatch) -> None:
+    """Test the source of a move to another filesystem is only deleted once its copy is complete."""
+    destination = tmp_path / "destination.jpg"
+    move_across_devices(monkeypatch, source)
+    monkeypatch.setattr(transfer, "copy_file_data", lambda source, path: Path(path).write_bytes(b"short"))
+
+    with pytest.raises(OSError, match="Copied 5 of 100000 bytes"):
+        transfer_file(source, str(destination), "move")
+
+    assert os.path.getsize(source) == 100_000
+    assert not destination.exists()
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_copy_overwrites(tmp_path, source) -> None:
+    """Test copying replaces an existing destination entirely."""
+    destination = tmp_path / "destination.jpg"
+    destination.write_bytes(b"x" * 200_000)
+    copy_file_data(source, str(destination))
+    assert destination.read_bytes() == Path(source).read_bytes()
+
+
+@pytest.mark.skipif(not hasattr(os, "posix_fallocate"), reason="Large file path is Linux only")
+@pytest.mark.parametrize("in_kernel", [True, False])
+def test_large_file_copy(tmp_path, source, monkeypatch, in_kernel) -> None:
+    """Test large files are preallocated to their exact size, whether or not the kernel can copy them."""
+    monkeypatch.setattr(transfer, "LARGE_FILE_BYTES", 1000)
+    monkeypatch.setattr(transfer, "COPY_BUFFER_BYTES", 4096)
+    if not in_kernel:
+        monkeypatch.setattr(transfer, "_copy_in_kernel", lambda source_fd, destination_fd, size: False)
+    destination = tmp_path / "destination.jpg"
+    destination.write_bytes(b"x" * 200_000)
+
+    with patch("image_sorting_tool.transfer.os.posix_fallocate", wraps=os.posix_fallocate) as fallocate:
+        copy_file_data(source, str(destination), sync=True)
+
+    fallocate.assert_called_once()
+    assert destination.read_bytes() == Path(source).read_bytes()
+
+
+def test_preserve_times(tmp_path, source) -> None:
+    """Test copies keep the times of their source only when requested."""
+    os.utime(source, ns=(1_000_000_000_000_000_000, 1_300_000_000_000_000_000))
+    kept, fresh = tmp_path / "kept.jpg", tmp_path / "fresh.jpg"
+
+    transfer_file(source, str(kept), options=CopyOptions(preserve_times=True))
+    transfer_file(source, str(fresh))
+
+    assert os.stat(kept).st_mtime_ns == 1_300_000_000_000_000_000
+    assert os.stat(kept).st_atime_ns == 1_000_000_000_000_000_000
+    assert os.stat(fresh).st_mtime_ns != 1_300_000_000_000_000_000
+
+
+@pytest.mark.parametrize(
+    ("fsync", "syncs_before_finish"),
+    [("none", 0), ("file", 2 * 3), ("folder", 0), ("end", 0)],
+)
+def test_fsync_policies(tmp_path, source, monkeypatch, fsync, syncs_before_finish) -> None:
+    """Test each policy syncs the copies and their folder at its own point."""
+    monkeypatch.setattr(transfer, "FSYNC_FOLDER_BATCH", 4)
+    options = CopyOptions(fsync)
+    with (
+        patch("image_sorting_tool.transfer.os.fsync") as fsync_call,
+        patch("image_sorting_tool.transfer.os.sync") as sync_call,
+    ):
+        for name in ("a.jpg", "b.jpg", "c.jpg"):
+            transfer_file(source, str(tmp_path / name), options=options)
+        assert fsync_call.call_count == syncs_before_finish  # The data and the folder of each file
+        options.finish()
+        if fsync == "folder":
+            assert fsync_call.call_count == 3 + 1  # The batch of files and their folder
+        assert sync_call.call_count == (fsync == "end")
+
+
+@pytest.mark.parametrize("fsync", ["file", "folder", "end"])
+def test_fsync_policies_sync_real_files(tmp_path, source, fsync) -> None:
+    """Test each policy syncs the copies without mocks, as Windows only syncs files opened for writing."""
+    options = CopyOptions(fsync)
+    for name in ("a.jpg", "b.jpg"):
+        transfer_file(source, str(tmp_path / name), options=options)
+    options.finish()
+    fsync_files([str(tmp_path / "a.jpg"), str(tmp_path / "b.jpg")])
+    assert (tmp_path / "b.jpg").read_bytes() == Path(source).read_bytes()
+
+
+def test_unknown_fsync_policy() -> None:
+    """Test an unknown fsync policy is rejected."""
+    with pytest.raises(ValueError, match="Unknown fsync policy"):
+        CopyOptions("sometimes")
+
+
+def test_unknown_mode(tmp_path, source) -> None:
+    """Test an unknown mode is rejected."""
+    with pytest.raises(ValueError, match="Unknown transfer mode"):
+        transfer_file(source, str(tmp_path / "destination.jpg"), "teleport")
+
+
+def test_create_folders(tmp_path) -> None:
+    """Test a folder tree is created with one mkdir per folder, and a blocking file does not stop the rest."""
+    (tmp_path / "blocked").write_bytes(b"")
+    relative_paths = [os.path.join("2020", "01"), os.path.join("2020", "02"), os.path.join("2021", "01")] * 3
+    relative_paths += ["failed_to_sort", os.path.join("blocked", "01")]
+
+    with patch("os.mkdir", side_effect=os.mkdir) as mock_mkdir:
+        create_folders(str(tmp_path), relative_paths, workers=4)
+
+    assert mock_mkdir.call_count == 8
+    for relative_path in relative_paths[:-1]:
+        assert (tmp_path / relative_path).is_dir()
@@ -0,0 +1,207 @@
+"""Unit tests for the watch module."""
+
+import multiprocessing.pool
+import os
+import shutil
+import sys
+import threading
+import time
+from collections.abc import Callable
+from types import SimpleNamespace
+
+import pytest
+
+from image_sorting_tool import watch
+from image_sorting_tool.__main__ import parse_args
+from image_sorting_tool.image_sort import FILE_TYPES
+from image_sorting_tool.transfer import CopyOptions
+from image_sorting_tool.watch import (
+    WATCH_JOURNAL_FILENAME,
+    Debouncer,
+    FolderWatcher,
+    InotifySource,
+    PollingSource,
+    watch_directory,
+)
+
+tests_path = os.path.dirname(os.path.abspath(__file__))
+ASSETS_PATH = tests_path + "/../../assets/test_assets"
+TIMEOUT = 10.0
+
+
+@pytest.fixture(name="folders")
+def fixture_folders(tmp_path) -> tuple[str, str]:
+    """Empty input and output folders."""
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.mkdir()
+    dst.mkdir()
+    return str(src), str(dst)
+
+
+def write(folder: str, name: str, data: bytes = b"data", age: float = 0) -> str:
+    """Write a file, with a modification time `age` seconds in the past."""
+    path = os.path.join(folder, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(data)
+    if age:
+        os.utime(path, (time.time() - age, time.time() - age))
+    return path
+
+
+def sorted_files(destination_dir: str) -> list[str]:
+    """Return the paths of the files in the output folder, relative to it, without the watch journal."""
+    return sorted(
+        os.path.relpath(os.path.join(root, name), destination_dir).replace(os.sep, "/")
+        for root, _, names in os.walk(destination_dir)
+        for name in names
+        if name != WATCH_JOURNAL_FILENAME
+    )
+
+
+def sort_batch(watcher: FolderWatcher, paths: list[str]) -> int:
+    """Sort a batch of files with a single copy thread."""
+    with multiprocessing.pool.ThreadPool(processes=1) as pool:
+        watcher.journal.open(resume=True)
+        try:
+            return watcher.sort_batch(paths, pool, CopyOptions())
+        finally:
+            watcher.journal.close()
+
+
+def set_mtime(path: str, seconds: float) -> None:
+    """Set the access and modification times of a file to `seconds` since the epoch."""
+    os.utime(path, ns=(int(seconds * 1e9), int(seconds * 1e9)))
+
+
+def test_debouncer(tmp_path, monkeypatch) -> None:
+    """Test files are only ready once unchanged for the settle time, and old files are ready at once."""
+    clock = [1000.0]
+    epoch_offset = 1_600_000_000.0  # Wall clock time when the monotonic clock reads 0
+    monkeypatch.setattr(
+        watch, "time", SimpleNamespace(monotonic=lambda: clock[0], time=lambda: epoch_offset + clock[0])
+    )
+    debouncer = Debouncer(settle_seconds=2)
+    fresh, old = write(str(tmp_path), "fresh.png"), write(str(tmp_path), "old.png")
+    set_mtime(fresh, epoch_offset + clock[0])
+    set_mtime(old, epoch_offset + clock[0] - 60)
+    removed = write(str(tmp_path), "removed.png")
+    debouncer.add([fresh, old, removed])
+    os.remove(removed)
+    assert debouncer.ready() == [old]
+    assert debouncer.next_check() == 2
+
+    clock[0] += 1
+    write(str(tmp_path), "fresh.png", b"more data")  # Still being written, the wait restarts
+    set_mtime(fresh, epoch_offset + clock[0])
+    assert debouncer.ready() == []
+    clock[0] += 1.5
+    assert debouncer.ready() == []
+    clock[0] += 1
+    assert debouncer.ready() == [fresh]
+    assert debouncer.next_check() is None
+
+
+def test_sort_batch(folders) -> None:
+    """Test a batch is dated, categorised and copied, and files already sorted are not sorted again."""
+    source_dir, destination_dir = folders
+    dated = write(source_dir, "IMG_20200114_135312.png")
+    write(source_dir, "undated.png")
+    write(source_dir, "notes.txt")
+    watcher = watch_directory(source_dir, destination_dir, ext_to_sort=FILE_TYPES["png"])
+    paths = [os.path.join(source_dir, name) for name in os.listdir(source_dir)]
+    assert sort_batch(watcher, paths) == 2
+    assert sorted_files(destination_dir) == ["2020/01/20200114_135312.png", "failed_to_sort/undated.png"]
+
+    watcher.journal.load()
+    assert sort_batch(watcher, paths) == 0
+    write(source_dir, "IMG_20200114_135312.png", b"edited")
+    assert sort_batch(watcher, [dated]) == 0  # Skipped as a different file is already sorted under its name
+
+
+@pytest.mark.parametrize("rename_duplicates", [False, True])
+def test_duplicates_never_replace_sorted_files(folders, rename_duplicates) -> None:
+    """Test duplicates get the next free postfix if renamed, or are skipped, and identical files are skipped."""
+    source_dir, destination_dir = folders
+    watcher = watch_directory(
+        source_dir, destination_dir, ext_to_sort=FILE_TYPES["png"], rename_duplicates=rename_duplicates
+    )
+    assert sort_batch(watcher, [write(source_dir, "a/20200114_135312.png", b"first")]) == 1
+    batch = [
+        write(source_dir, "b/20200114_135312.png", b"second"),
+        write(source_dir, "c/20200114_135312.png", b"first"),
+        write(source_dir, "d/20200114_135312.png", b"third"),
+        write(source_dir, "e/20200114_135312.png", b"third"),
+    ]
+    assert sort_batch(watcher, batch) == (2 if rename_duplicates else 0)
+    expected = ["2020/01/20200114_135312.png"]
+    if rename_duplicates:
+        expected += ["2020/01/20200114_135312_002.png", "2020/01/20200114_135312_003.png"]
+    assert sorted_files(destination_dir) == expected
+    with open(os.path.join(destination_dir, "2020/01/20200114_135312.png"), "rb") as file:
+        assert file.read() == b"first"
+
+
+def watch_until(watcher: FolderWatcher, condition: Callable[[], bool]) -> None:
+    """Run a watcher in a thread until a condition holds, failing if it does not within `TIMEOUT` seconds."""
+    thread = threading.Thread(target=watcher.run)
+    thread.start()
+    try:
+        deadline = time.monotonic() + TIMEOUT
+        while not condition():
+            assert time.monotonic() < deadline, "Timed out waiting for the watcher"
+            time.sleep(0.02)
+    finally:
+        watcher.stop()
+        thread.join(TIMEOUT)
+    assert not thread.is_alive()
+
+
+@pytest.mark.parametrize(
+    "polling",
+    [
+        True,
+        pytest.param(False, marks=pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Needs inotify")),
+    ],
+)
+def test_watch_sorts_new_files(folders, polling) -> None:
+    """Test files already in the input folder and files arriving later, in new folders too, are sorted."""
+    source_dir, destination_dir = folders
+    write(source_dir, "IMG_20200114_135312.png", age=60)
+    settings = {
+        "ext_to_sort": FILE_TYPES["png"] + FILE_TYPES["jpeg"],
+        "settle_seconds": 0.05,
+        "poll_interval": 0.05,
+        "polling": polling,
+    }
+    watcher = watch_directory(source_dir, destination_dir, **settings)
+    source_type = PollingSource if polling else InotifySource
+    watch_until(watcher, lambda: isinstance(watcher.source, source_type) and len(sorted_files(destination_dir)) == 1)
+
+    def arrive() -> None:
+        time.sleep(0.1)
+        write(source_dir, "new/folder/IMG_20210203_040506.png")
+        shutil.copy(os.path.join(ASSETS_PATH, "mix", "pass_0.JPG"), os.path.join(source_dir, "new"))
+
+    arrival = threading.Thread(target=arrive)
+    arrival.start()
+    watcher = watch_directory(source_dir, destination_dir, **settings)  # Restarted
+    watch_until(watcher, lambda: len(sorted_files(destination_dir)) == 3)
+    arrival.join()
+    assert "2021/02/20210203_040506.png" in sorted_files(destination_dir)
+    assert watcher.sorted_count == 2  # The file sorted by the first run was not sorted again
+
+
+def test_watch_rejects_nested_output(folders) -> None:
+    """Test the output folder cannot be inside the watched folder, as the watcher would sort its own output."""
+    source_dir, _ = folders
+    with pytest.raises(ValueError, match="child of"):
+        watch_directory(source_dir, os.path.join(source_dir, "sorted"))
+
+
+def test_watch_arguments(folders) -> None:
+    """Test the watch command parses its own options and the sorting options."""
+    args = parse_args(["watch", *folders, "-t", "png", "--settle", "0.5", "--polling", "--mode", "hardlink"])
+    assert (args.command, args.types, args.settle, args.polling, args.mode) == ("watch", ["png"], 0.5, True, "hardlink")
+    with pytest.raises(SystemExit):
+        parse_args(["watch", *folders, "--resume"])
@@ -0,0 +1,457 @@
+"""Ways of transferring a file into the sorted output folder.
+
+Besides copying, files can be hardlinked, reflinked (a copy-on-write clone on filesystems such as btrfs,
+XFS and APFS), moved or symlinked. These avoid duplicating the file data when the source and output
+folders are on the same filesystem. Each mode falls back to a plain copy when the filesystem or platform
+does not support it. Copies are done by the kernel where possible, without passing the data through Python.
+
+Large files, such as videos, are preallocated so they are written contiguously, and the page cache is told
+they are read once, so copying gigabytes does not evict everything else from memory. `CopyOptions` sets
+how the copies are made durable, and whether they keep the access and modification times of the source.
+"""
+
+import ctypes
+import errno
+import logging
+import mmap
+import os
+import shutil
+import sys
+import threading
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+from multiprocessing.pool import ThreadPool
+
+logger = logging.getLogger("image-sorting-tool")
+
+TRANSFER_MODES = ("copy", "hardlink", "reflink", "move", "symlink")
+# Errors meaning the filesystem or platform does not support an operation, rather than the file being bad
+UNSUPPORTED_ERRNOS = {
+    errno.EXDEV,
+    errno.EPERM,
+    errno.EACCES,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.EMLINK,
+    getattr(errno, "ENOTSUP", errno.EOPNOTSUPP),
+}
+FICLONE = 0x40049409  # Linux ioctl that clones a file's extents, from <linux/fs.h>
+COPY_FILE_RANGE_CHUNK = 1 << 30
+LARGE_FILE_BYTES = 64 * 1024 * 1024  # Files from this size are preallocated and kept out of the page cache
+COPY_BUFFER_BYTES = 8 * 1024 * 1024  # Buffer of copies the kernel cannot do, page aligned as it is mmapped
+FSYNC_POLICIES = ("none", "file", "folder", "end")
+FSYNC_FOLDER_BATCH = 64  # Files synced together with their folder by the 'folder' policy
+AT_FDCWD = -100  # Paths relative to the working directory, from <fcntl.h>
+RENAME_NOREPLACE = 1  # renameat2 flag failing with EEXIST instead of replacing the target, from <linux/fs.h>
+# Windows only flushes files opened for writing, its fsync needs a handle with write access
+FSYNC_OPEN_FLAGS = os.O_RDWR if os.name == "nt" else os.O_RDONLY
+_RENAME_LOCK = threading.Lock()
+
+
+class CopyOptions:
+    """Durability and metadata options of the files created by `transfer_file`.
+
+    The fsync policies trade speed against how much of a sort is guaranteed to survive a power cut:
+        none: leave writing the files to the operating system, the journal then verifies them when resuming
+        file: sync the data of each copy before it is renamed into place, and its folder after
+        folder: sync the files of each folder and then the folder itself, in batches of `FSYNC_FOLDER_BATCH`
+        end: sync everything once, when `finish` is called at the end of the sort
+
+    The options are shared by all the threads transferring files.
+    """
+
+    def __init__(self, fsync: str = "none", preserve_times: bool = False) -> None:
+        """Initialize CopyOptions object.
+
+        Arguments:
+            fsync: one of `FSYNC_POLICIES`
+            preserve_times: copies keep the access and modification times of their source
+        Raises:
+            ValueError: if the fsync policy is unknown
+        """
+        if fsync not in FSYNC_POLICIES:
+            err_msg = f"Unknown fsync policy '{fsync}', expected one of: {', '.join(FSYNC_POLICIES)}"
+            raise ValueError(err_msg)
+        self.fsync = fsync
+        self.preserve_times = preserve_times
+        self._pending = defaultdict(list)  # Paths waiting to be synced, by folder
+        self._lock = threading.Lock()
+
+    def placed(self, path: str) -> None:
+        """Sync a file renamed into place, or queue it to be synced, according to the policy."""
+        folder = os.path.dirname(path)
+        if self.fsync == "file":
+            _fsync_folder(folder)
+        elif self.fsync == "folder":
+            with self._lock:
+                self._pending[folder].append(path)
+                batch = self._pending.pop(folder) if len(self._pending[folder]) >= FSYNC_FOLDER_BATCH else None
+            if batch:
+                _fsync_batch(folder, batch)
+        elif self.fsync == "end" and not hasattr(os, "sync"):
+            with self._lock:
+                self._pending[folder].append(path)
+
+    def finish(self) -> None:
+        """Sync everything still waiting to be synced, once all files have been transferred."""
+        if self.fsync == "end" and hasattr(os, "sync"):
+            os.sync()
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(list)
+        for folder, paths in pending.items():
+            _fsync_batch(folder, paths)
+
+
+def transfer_file(source: str, destination: str, mode: str = "copy", options: CopyOptions | None = None) -> str:
+    """Transfer a file to its destination, replacing any existing file.
+
+    The file is created under a temporary name and renamed into place, so the destination never holds a
+    partially transferred file, even if the run is interrupted.
+
+    Arguments:
+        source: path of the file to transfer
+        destination: path to transfer the file to, its folder must exist
+        mode: one of `TRANSFER_MODES`
+        options: durability and metadata options of the copies, the defaults of `CopyOptions` if None
+    Returns: the mode that was used, which is 'copy' if the requested mode was not supported
+    Raises:
+        ValueError: if the mode is unknown
+        FileExistsError: if moving onto an existing file, as that would destroy the existing file
+    """
+    if mode not in TRANSFER_MODES:
+        err_msg = f"Unknown transfer mode '{mode}', expected one of: {', '.join(TRANSFER_MODES)}"
+        raise ValueError(err_msg)
+    options = CopyOptions() if options is None else options
+    mode_used = "copy"
+    if mode == "move":
+        move_file(source, destination)
+        mode_used = mode
+    elif mode != "copy":
+        link = {"hardlink": hardlink_file, "reflink": reflink_file, "symlink": symlink_file}[mode]
+        try:
+            link(source, destination)
+            mode_used = mode
+        except OSError as error:
+            if error.errno not in UNSUPPORTED_ERRNOS:
+                raise
+            logger.debug("Cannot %s %s, copying instead: %s", mode, source, error)
+    if mode_used == "copy":
+        _replace_with(
+            lambda path: copy_file_data(
+                source, path, sync=options.fsync == "file", preserve_times=options.preserve_times
+            ),
+            destination,
+        )
+    options.placed(destination)
+    return mode_used
+
+
+def create_folders(root: str, relative_paths: Iterable[str], workers: int = 1) -> None:
+    """Create a tree of folders with a single `mkdir` call per folder.
+
+    Folders are created a level at a time, so every parent exists before its children and no call races
+    another, while the folders within a level are created in parallel. This matters on network drives,
+    where each call is a round trip to the server. Folders that cannot be created are logged and skipped,
+    the transfers into them then fail individually.
+
+    Arguments:
+        root: existing folder to create the tree in
+        relative_paths: folders to create, relative to the root
+        workers: number of folders to create in parallel
+    """
+    levels = {}
+    for relative_path in set(relative_paths):
+        parts = os.path.normpath(relative_path).split(os.sep)
+        for depth in range(1, len(parts) + 1):
+            levels.setdefault(depth, set()).add(os.path.join(root, *parts[:depth]))
+
+    def make_folder(path: str) -> None:
+        try:
+            os.mkdir(path)
+        except FileExistsError:
+            if not os.path.isdir(path):
+                logger.warning("Cannot create folder %s, a file with that name exists", path)
+        except OSError as error:
+            logger.warning("Cannot create folder %s: %s", path, error)
+
+    with ThreadPool(processes=max(1, workers)) as pool:
+        for depth in sorted(levels):
+            pool.map(make_folder, sorted(levels[depth]))
+    logger.debug("Created %i folders in %s", sum(len(level) for level in levels.values()), root)
+
+
+def copy_file_data(source: str, destination: str, sync: bool = False, preserve_times: bool = False) -> None:
+    """Copy the contents of a file inside the kernel where supported.
+
+    On Linux `copy_file_range` is used, which the filesystem may turn into a server side copy or a clone,
+    falling back to `sendfile` and then to reading through a large page aligned buffer. Files of at least
+    `LARGE_FILE_BYTES` are preallocated, and the source is read with sequential read-ahead and dropped from
+    the page cache once copied. Other platforms use `shutil.copyfile`, which uses their native copy.
+
+    Arguments:
+        source: path of the file to copy
+        destination: path of the copy, it is created or truncated
+        sync: flush the copy to the disk before returning, its pages are then also dropped from the cache
+        preserve_times: set the access and modification times of the copy to those of the source
+    """
+    if not sys.platform.startswith("linux"):
+        shutil.copyfile(source, destination)
+        if preserve_times:
+            shutil.copystat(source, destination)
+        if sync:
+            _fsync_batch(None, [destination])
+        return
+
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        source_stat = os.fstat(src.fileno())
+        large = source_stat.st_size >= LARGE_FILE_BYTES
+        if large:
+            _advise(src.fileno(), os.POSIX_FADV_SEQUENTIAL)
+            _preallocate(dst.fileno(), source_stat.st_size)
+        if not _copy_in_kernel(src.fileno(), dst.fileno(), source_stat.st_size):
+            buffer = mmap.mmap(-1, COPY_BUFFER_BYTES)
+            with memoryview(buffer) as view:
+                while size := src.readinto(view):
+                    dst.write(view[:size])
+            buffer.close()
+            dst.flush()
+        if large:
+            dst.truncate()  # Drops any preallocated space left over if the source shrank while being copied
+        if preserve_times:
+            os.utime(dst.fileno(), ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+        if sync:
+            os.fsync(dst.fileno())
+        if large:
+            _advise(src.fileno(), os.POSIX_FADV_DONTNEED)
+            if sync:  # Only pages that have been written back can be dropped
+                _advise(dst.fileno(), os.POSIX_FADV_DONTNEED)
+
+
+def _copy_in_kernel(source_fd: int, destination_fd: int, size: int) -> bool:
+    """Copy from the current offset of a file to another with `copy_file_range`, or `sendfile`.
+
+    Some filesystems return 0 from `copy_file_range` instead of failing when they cannot copy, so each method
+    hands over to the next when it stops before `size` bytes have been copied, as `shutil` does.
+
+    Arguments:
+        source_fd: file descriptor to copy from
+        destination_fd: file descriptor to copy to
+        size: size of the source, from the current offset
+    Returns: False if the copy stopped short, the rest must then be copied by reading the file
+    """
+    methods = (
+        lambda: os.copy_file_range(source_fd, destination_fd, COPY_FILE_RANGE_CHUNK),
+        lambda: os.sendfile(destination_fd, source_fd, None, COPY_FILE_RANGE_CHUNK),
+    )
+    copied = 0
+    for method in methods:
+        copied_by_method = 0
+        try:
+            while sent := method():
+                copied_by_method += sent
+        except OSError as error:
+            # Only fall back if nothing was copied, unsupported calls fail on their first call
+            if error.errno not in UNSUPPORTED_ERRNOS or copied_by_method:
+                raise
+        copied += copied_by_method
+        if copied >= size:
+            return True
+    return False
+
+
+def _preallocate(fd: int, size: int) -> None:
+    """Allocate the space of a file up front, so it is written contiguously, where the filesystem supports it."""
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError as error:
+        if error.errno not in UNSUPPORTED_ERRNOS:
+            raise
+        logger.debug("Cannot preallocate %i bytes: %s", size, error)
+
+
+def _advise(fd: int, advice: int) -> None:
+    """Pass a hint about how a file is accessed to the page cache, hints are allowed to fail."""
+    try:
+        os.posix_fadvise(fd, 0, 0, advice)
+    except OSError as error:
+        logger.debug("Cannot pass advice %i on file access: %s", advice, error)
+
+
+def fsync_files(paths: Iterable[str]) -> None:
+    """Sync the data of files to the disk, then the folders holding their names."""
+    by_folder = defaultdict(list)
+    for path in paths:
+        by_folder[os.path.dirname(path)].append(path)
+    for folder, folder_paths in by_folder.items():
+        _fsync_batch(folder, folder_paths)
+
+
+def _fsync_batch(folder: str | None, paths: list[str]) -> None:
+    """Sync the data of files to the disk, then the folder holding their names if given."""
+    for path in paths:
+        try:
+            fd = os.open(path, FSYNC_OPEN_FLAGS)
+        except OSError as error:
+            logger.warning("Cannot open %s to sync it: %s", path, error)
+            continue
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    if folder is not None:
+        _fsync_folder(folder)
+
+
+def _fsync_folder(folder: str) -> None:
+    """Sync a folder so the names of the files renamed into it survive a power cut, where supported."""
+    if os.name == "nt":
+        return  # Windows cannot open folders, NTFS journals renames itself
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def hardlink_file(source: str, destination: str) -> None:
+    """Hardlink a file, which only works within one filesystem."""
+    _replace_with(lambda path: os.link(source, path), destination)
+
+
+def symlink_file(source: str, destination: str) -> None:
+    """Create a symbolic link to the absolute path of a file."""
+    _replace_with(lambda path: os.symlink(os.path.abspath(source), path), destination)
+
+
+def reflink_file(source: str, destination: str) -> None:
+    """Clone a file so both share their data until either is modified.
+
+    Raises:
+        OSError: with errno EOPNOTSUPP if the platform or filesystem does not support clones
+    """
+    if sys.platform == "linux":
+        import fcntl  # noqa: PLC0415
+
+        def clone(path: str) -> None:
+            with open(source, "rb") as src, open(path, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+        _replace_with(clone, destination)
+    elif sys.platform == "darwin":
+        libc = ctypes.CDLL(None, use_errno=True)
+
+        def clone(path: str) -> None:
+            if libc.clonefile(os.fsencode(source), os.fsencode(path), 0) != 0:
+                error_number = ctypes.get_errno()
+                raise OSError(error_number, os.strerror(error_number), source)
+
+        _replace_with(clone, destination)
+    else:
+        raise OSError(errno.EOPNOTSUPP, "Cloning files is not supported on this platform", source)
+
+
+def move_file(source: str, destination: str) -> None:
+    """Move a file with an atomic rename, or copy and delete it when moving to another filesystem.
+
+    The file is never moved onto an existing file, even if another thread creates the destination at the
+    same time, see `rename_no_replace`.
+
+    Raises:
+        FileExistsError: if the destination exists, as moving a duplicate onto it would destroy a file
+    """
+    try:
+        rename_no_replace(source, destination)
+    except OSError as error:
+        if error.errno != errno.EXDEV:
+            raise
+        if os.path.lexists(destination):  # Checked up front too, so a duplicate is not copied only to be refused
+            raise FileExistsError(errno.EEXIST, "Not moving onto an existing file", destination) from error
+        _replace_with(lambda path: _copy_for_move(source, path), destination, replace=False)
+        os.unlink(source)
+
+
+def _copy_for_move(source: str, path: str) -> None:
+    """Copy a file moved to another filesystem, checking the copy is complete before the source is deleted.
+
+    Raises:
+        OSError: with errno EIO if the copy is not the size of the source
+    """
+    copy_file_data(source, path)
+    shutil.copystat(source, path)
+    source_size, copy_size = os.stat(source).st_size, os.stat(path).st_size
+    if copy_size != source_size:
+        err_msg = f"Copied {copy_size} of {source_size} bytes, keeping the source"
+        raise OSError(errno.EIO, err_msg, source)
+
+
+def rename_no_replace(source: str, destination: str) -> None:
+    """Atomically rename a file, failing if the destination exists instead of replacing it as `os.rename` does.
+
+    Linux renames with `RENAME_NOREPLACE`. Elsewhere, or on filesystems without it, the file is hardlinked into
+    place and then unlinked, as creating a link fails if its path exists. Renames on Windows never replace files.
+    On filesystems without hardlinks either, the check and the rename run under a lock, so at least the threads
+    of this process cannot race each other.
+
+    Raises:
+        FileExistsError: if the destination exists
+        OSError: with errno EXDEV if the destination is on another filesystem
+    """
+    if sys.platform == "win32":
+        os.rename(source, destination)
+        return
+    if _renameat2_no_replace(source, destination):
+        return
+    try:
+        os.link(source, destination)
+    except OSError as error:
+        if error.errno in {errno.EEXIST, errno.EXDEV} or error.errno not in UNSUPPORTED_ERRNOS:
+            raise
+        with _RENAME_LOCK:
+            if os.path.lexists(destination):
+                raise FileExistsError(errno.EEXIST, "Not renaming onto an existing file", destination) from error
+            os.rename(source, destination)
+    else:
+        os.unlink(source)
+
+
+def _renameat2_no_replace(source: str, destination: str) -> bool:
+    """Rename a file with `renameat2` and `RENAME_NOREPLACE`.
+
+    Returns: True if renamed, False if the platform, C library or filesystem does not support it
+    Raises:
+        OSError: if the rename failed, a FileExistsError if the destination exists
+    """
+    if sys.platform != "linux":
+        return False
+    renameat2 = getattr(ctypes.CDLL(None, use_errno=True), "renameat2", None)
+    if renameat2 is None:  # C libraries older than glibc 2.28
+        return False
+    if renameat2(AT_FDCWD, os.fsencode(source), AT_FDCWD, os.fsencode(destination), RENAME_NOREPLACE) == 0:
+        return True
+    error_number = ctypes.get_errno()
+    if error_number in {errno.EINVAL, errno.ENOSYS}:
+        return False
+    raise OSError(error_number, os.strerror(error_number), source, None, destination)
+
+
+def _replace_with(create: Callable[[str], object], destination: str, replace: bool = True) -> None:
+    """Create a file at a temporary path next to the destination, then atomically rename it into place.
+
+    Arguments:
+        create: function creating the file at the path it is given
+        destination: path to rename the file to
+        replace: replace an existing destination, otherwise raise FileExistsError and remove the new file
+    """
+    temporary_path = f"{destination}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        create(temporary_path)
+        if replace:
+            os.replace(temporary_path, destination)
+        else:
+            rename_no_replace(temporary_path, destination)
+    except BaseException:
+        if os.path.lexists(temporary_path):
+            os.unlink(temporary_path)
+        raise
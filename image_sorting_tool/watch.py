@@ -0,0 +1,525 @@
+"""Watch an input folder and sort the files that arrive in it into the output folder, as they arrive.
+
+New files are found by inotify on Linux, which only reports files once they are closed after writing or moved
+into the folder, so the watcher sleeps in the kernel while nothing arrives. Elsewhere, or if inotify is out of
+watches, the folder tree is polled and the stats of its files compared with the previous poll.
+
+A file is only sorted once its size and modification time have stopped changing for `SETTLE_SECONDS`, so files
+still being written are left alone. The files that settle together are sorted as one batch through the same
+steps as a full sort: `ImageSort.get_datetime`, categorisation by `FileIndex.categorize`, then
+`ImageSort.copy_file`. Batches are analysed in the watcher's thread rather than a process pool, as starting
+workers would cost more than analysing the few files of a typical batch.
+
+Unlike a full sort, a batch cannot renumber the files already in the output folder. A file whose destination is
+taken by an identical file is skipped as already sorted. Otherwise it gets the next free postfix, such as
+'20200114_135312_002.jpg', if duplicates are renamed, or it is skipped so the sorted file is not replaced.
+Every transfer is recorded in a journal in the output folder that is kept between runs, so restarting the
+watcher does not sort the files already in the input folder again.
+"""
+
+import contextlib
+import ctypes
+import errno
+import filecmp
+import logging
+import multiprocessing.pool
+import os
+import select
+import stat
+import struct
+import sys
+import threading
+import time
+
+from image_sorting_tool.devices import copy_concurrency
+from image_sorting_tool.file_index import FLAG_SORT, FileIndex, FileView
+from image_sorting_tool.image_sort import JPEG_EXTENSIONS, File, ImageSort
+from image_sorting_tool.journal import SortJournal
+from image_sorting_tool.reporting import Reporter
+from image_sorting_tool.transfer import CopyOptions, create_folders
+
+logger = logging.getLogger("image-sorting-tool")
+
+WATCH_JOURNAL_FILENAME = ".image-sorting-tool-watch-journal.jsonl"
+SETTLE_SECONDS = 2.0  # Seconds a file must stay unchanged before it is sorted
+POLL_INTERVAL = 5.0  # Seconds between polls of the folder tree when inotify is not available
+BATCH_SIZE = 256  # Most files sorted in one batch, so a large arrival is reported as it progresses
+MAX_POSTFIX = 999  # Duplicate postfixes are three digits
+
+# inotify event flags, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+INOTIFY_EVENT = struct.Struct("iIII")  # Watch descriptor, mask, cookie and length of the name that follows
+INOTIFY_READ_BYTES = 64 * 1024
+
+
+class InotifySource:
+    """Reports the files closed after writing or moved into a folder tree, using Linux inotify.
+
+    Files that are only created, such as hardlinks, are not reported until the next scan.
+    """
+
+    def __init__(self, root: str) -> None:
+        """Initialize InotifySource object.
+
+        Arguments:
+            root: the folder tree to watch
+        Raises:
+            OSError: if inotify is not available on this platform
+        """
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        self.root = root
+        self.folders = {}  # Watch descriptor -> folder path
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error_number = ctypes.get_errno()
+            raise OSError(error_number, os.strerror(error_number))
+        self._wake_read, self._wake_write = os.pipe()
+
+    def scan(self) -> list[str]:
+        """Watch every folder of the tree, returning the paths of the files already in it."""
+        return self._watch_tree(self.root)
+
+    def _watch_tree(self, top: str) -> list[str]:
+        """Watch a folder and its subfolders, returning the paths of the files in them.
+
+        Each folder is watched before it is listed, so a file arriving meanwhile is either listed or reported.
+
+        Raises:
+            OSError: if inotify runs out of watches
+        """
+        paths = []
+        folders = [top]
+        while folders:
+            folder = folders.pop()
+            watch = self._libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+            if watch < 0:
+                error_number = ctypes.get_errno()
+                if error_number == errno.ENOSPC:
+                    err_msg = "Out of inotify watches, raise the limit in /proc/sys/fs/inotify/max_user_watches"
+                    raise OSError(error_number, err_msg, folder)
+                logger.warning("Failed to watch folder %s: %s", folder, os.strerror(error_number))
+                continue
+            self.folders[watch] = folder
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        try:
+                            is_directory = entry.is_dir() and not entry.is_symlink()
+                        except OSError:
+                            is_directory = False
+                        (folders if is_directory else paths).append(entry.path)
+            except OSError as error:
+                logger.warning("Failed to search folder %s: %s", folder, error)
+        return paths
+
+    def wait(self, timeout: float | None) -> list[str]:
+        """Wait for files to arrive, or until `wake` is called.
+
+        Arguments:
+            timeout: most seconds to wait, None to wait until a file arrives
+        Returns: the paths of the files that arrived, may be empty
+        """
+        readable, _, _ = select.select([self.fd, self._wake_read], [], [], timeout)
+        if self._wake_read in readable:
+            os.read(self._wake_read, 512)
+        if self.fd not in readable:
+            return []
+        return self._read_events()
+
+    def _read_events(self) -> list[str]:
+        """Read every queued event, returning the paths of the files they report."""
+        paths = []
+        while True:
+            try:
+                data = os.read(self.fd, INOTIFY_READ_BYTES)
+            except BlockingIOError:
+                return paths
+            offset = 0
+            while offset < len(data):
+                watch, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                name = data[offset + INOTIFY_EVENT.size : offset + INOTIFY_EVENT.size + length].rstrip(b"\x00")
+                offset += INOTIFY_EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    logger.warning("The inotify queue overflowed, searching the whole input folder again")
+                    try:
+                        paths += self._watch_tree(self.root)
+                    except OSError as error:
+                        logger.warning("Files arriving in some folders will not be found: %s", error)
+                    continue
+                if mask & IN_IGNORED:
+                    self.folders.pop(watch, None)  # The folder was deleted or moved away
+                    continue
+                folder = self.folders.get(watch)
+                if folder is None:
+                    continue
+                path = os.path.join(folder, os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    try:
+                        paths += self._watch_tree(path)
+                    except OSError as error:
+                        logger.warning("Files arriving in %s will not be found: %s", path, error)
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    paths.append(path)
+
+    def wake(self) -> None:
+        """Return from `wait` early, from any thread."""
+        with contextlib.suppress(OSError):  # Closed by the watcher meanwhile, so it is not waiting
+            os.write(self._wake_write, b"\x00")
+
+    def close(self) -> None:
+        """Stop watching, releasing the inotify instance."""
+        for fd in (self.fd, self._wake_read, self._wake_write):
+            os.close(fd)
+
+
+class PollingSource:
+    """Reports the new and modified files of a folder tree, by comparing the stats of its files between polls."""
+
+    def __init__(self, root: str, interval: float = POLL_INTERVAL) -> None:
+        """Initialize PollingSource object.
+
+        Arguments:
+            root: the folder tree to watch
+            interval: seconds between polls
+        """
+        self.root = root
+        self.interval = interval
+        self.index = {}  # Path -> (size, mtime_ns) of every file found by the last poll
+        self.last_poll = time.monotonic()
+        self._wake = threading.Event()
+
+    def scan(self) -> list[str]:
+        """Index the files of the tree, returning their paths."""
+        return self._poll()
+
+    def _poll(self) -> list[str]:
+        """Stat every file of the tree, returning the paths of those that are new or changed since the last poll."""
+        index, changed = {}, []
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(folder, name)
+                try:
+                    stat_result = os.stat(path)
+                except OSError:
+                    continue  # Removed since the folder was listed
+                index[path] = (stat_result.st_size, stat_result.st_mtime_ns)
+                if self.index.get(path) != index[path]:
+                    changed.append(path)
+        self.index = index
+        self.last_poll = time.monotonic()
+        return changed
+
+    def wait(self, timeout: float | None) -> list[str]:
+        """Wait until the next poll is due and run it, or return early after `timeout` or a call to `wake`.
+
+        Arguments:
+            timeout: most seconds to wait, None to wait for the next poll
+        Returns: the paths of the new and changed files, empty if no poll was run
+        """
+        delay = self.interval - (time.monotonic() - self.last_poll)
+        if timeout is not None:
+            delay = min(delay, timeout)
+        if delay > 0 and self._wake.wait(delay):
+            self._wake.clear()
+            return []
+        if time.monotonic() - self.last_poll < self.interval:
+            return []
+        return self._poll()
+
+    def wake(self) -> None:
+        """Return from `wait` early, from any thread."""
+        self._wake.set()
+
+    def close(self) -> None:
+        """Stop watching, there is nothing to release."""
+
+
+class Debouncer:
+    """Holds back files until their size and modification time have stopped changing."""
+
+    def __init__(self, settle_seconds: float = SETTLE_SECONDS) -> None:
+        """Initialize Debouncer object.
+
+        Arguments:
+            settle_seconds: seconds a file must stay unchanged before it is ready
+        """
+        self.settle_seconds = settle_seconds
+        self.pending = {}  # Path -> (size, mtime_ns, monotonic time they were last seen to change)
+
+    def add(self, paths: list[str]) -> None:
+        """Hold back files that have arrived or changed, restarting the wait of files already held back."""
+        now = time.monotonic()
+        for path in paths:
+            self.pending[path] = (None, None, now)
+
+    def ready(self, limit: int = BATCH_SIZE) -> list[str]:
+        """Return the files that have settled, and stop holding them back.
+
+        Files with a modification time older than `settle_seconds` when they arrive are ready at once, such as
+        files moved into the input folder or found when the watcher starts. Files that have been removed are
+        forgotten.
+
+        Arguments:
+            limit: most files to return, the others stay held back until the next call
+        Returns: the paths of the settled files
+        """
+        now, wall_clock = time.monotonic(), time.time()
+        ready = []
+        for path, (size, mtime_ns, since) in list(self.pending.items()):
+            if len(ready) >= limit:
+                break
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                del self.pending[path]
+                continue
+            if not stat.S_ISREG(stat_result.st_mode):
+                del self.pending[path]
+                continue
+            if (stat_result.st_size, stat_result.st_mtime_ns) != (size, mtime_ns):
+                if size is not None or wall_clock - stat_result.st_mtime_ns / 1e9 < self.settle_seconds:
+                    self.pending[path] = (stat_result.st_size, stat_result.st_mtime_ns, now)
+                    continue
+            elif now - since < self.settle_seconds:
+                continue
+            del self.pending[path]
+            ready.append(path)
+        return ready
+
+    def next_check(self) -> float | None:
+        """Return the seconds until a held back file may have settled, None if no file is held back."""
+        if not self.pending:
+            return None
+        now = time.monotonic()
+        return max(0.0, min(since + self.settle_seconds - now for _, _, since in self.pending.values()))
+
+
+class FolderWatcher:
+    """Sorts the files arriving in the input folder of an `ImageSort`, until it is stopped.
+
+    The sorting options are those of the `ImageSort`, such as `ext_to_sort` and `transfer_mode`. Its metadata
+    cache, autotuning and instrumentation are not used, as each file is only analysed once.
+    """
+
+    def __init__(self, sorter: ImageSort) -> None:
+        """Initialize FolderWatcher object.
+
+        Arguments:
+            sorter: ImageSort object holding the folders and sorting options
+        Raises:
+            ValueError: if the output folder is inside the input folder, it would sort its own output
+        """
+        source_dir, destination_dir = os.path.abspath(sorter.source_dir), os.path.abspath(sorter.destination_dir)
+        if os.path.commonpath([source_dir, destination_dir]) == source_dir:
+            err_msg = "Output directory cannot be a child of (or same as) input directory"
+            raise ValueError(err_msg)
+        self.sorter = sorter
+        self.settle_seconds = SETTLE_SECONDS
+        self.poll_interval = POLL_INTERVAL
+        self.polling = False  # Poll the folder tree even where inotify is available
+        self.batch_size = BATCH_SIZE
+        self.sorted_count = 0  # Files transferred since the watcher started
+        self.source = None
+        self.journal = SortJournal(destination_dir, filename=WATCH_JOURNAL_FILENAME, fsync=sorter.fsync_policy)
+        self._stop = threading.Event()
+
+    def run(self) -> None:
+        """Sort the files already in the input folder, then the files that arrive, until `stop` is called."""
+        sorter = self.sorter
+        self.source, existing = self._open_source()
+        debouncer = Debouncer(self.settle_seconds)
+        debouncer.add(existing)
+        self.journal.load()
+        self.journal.open(resume=True)
+        copy_workers = sorter.copy_workers or copy_concurrency(sorter.source_dir, sorter.destination_dir)
+        copy_options = CopyOptions(sorter.fsync_policy, sorter.preserve_times)
+        sorter.reporter.write(f"Watching {sorter.source_dir} for new files, press Ctrl+C to stop.\n")
+        try:
+            with multiprocessing.pool.ThreadPool(processes=copy_workers) as pool:
+                while not self._stop.is_set():
+                    ready = debouncer.ready(self.batch_size)
+                    if ready:
+                        self.sort_batch(ready, pool, copy_options)
+                    else:
+                        debouncer.add(self.source.wait(debouncer.next_check()))
+        finally:
+            self.journal.close()
+            source, self.source = self.source, None
+            source.close()
+            logger.info("Stopped watching %s after sorting %i files", sorter.source_dir, self.sorted_count)
+
+    def _open_source(self) -> tuple[InotifySource | PollingSource, list[str]]:
+        """Start watching the input folder with inotify, or by polling if inotify is not available or not wanted.
+
+        Returns: tuple of the source of new files, and the paths of the files already in the input folder
+        """
+        if not self.polling:
+            source = None
+            try:
+                source = InotifySource(self.sorter.source_dir)
+                return source, source.scan()
+            except (OSError, AttributeError) as error:
+                logger.warning("Polling the input folder as inotify is not available: %s", error)
+                if source is not None:
+                    source.close()
+        source = PollingSource(self.sorter.source_dir, self.poll_interval)
+        return source, source.scan()
+
+    def stop(self) -> None:
+        """Stop the watcher after the batch in progress, from any thread. A stopped watcher cannot be run again."""
+        self._stop.set()
+        source = self.source
+        if source is not None:
+            source.wake()
+
+    def sort_batch(self, paths: list[str], pool: multiprocessing.pool.ThreadPool, copy_options: CopyOptions) -> int:
+        """Analyse, categorise and transfer a batch of settled files.
+
+        Arguments:
+            paths: paths of the settled files
+            pool: threads copying the files
+            copy_options: durability and metadata options of the copies
+        Returns: the number of files transferred
+        """
+        start = time.perf_counter()
+        sorter = self.sorter
+        files_list = FileIndex()
+        for path in sorted(set(paths)):
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                continue  # Removed since it settled
+            entry = self.journal.completed.get(os.path.abspath(path))
+            if entry is not None and (entry["size"], entry["mtime_ns"]) == (
+                stat_result.st_size,
+                stat_result.st_mtime_ns,
+            ):
+                continue  # Sorted by an earlier batch or run
+            input_file = files_list[files_list.append(path)]
+            files_list.sizes[input_file.row] = stat_result.st_size
+            files_list.mtimes[input_file.row] = stat_result.st_mtime_ns
+            files_list.inodes[input_file.row] = stat_result.st_ino
+            ImageSort.get_datetime(input_file)
+        files_list.categorize(sorter.ext_to_sort, sorter.copy_unsorted)
+
+        to_transfer, messages, claimed = [], [], {}
+        for row in files_list.rows(flag=FLAG_SORT):
+            input_file = self._claim_destination(files_list[row], claimed, messages)
+            if input_file is not None:
+                to_transfer.append(input_file)
+        create_folders(sorter.destination_dir, {input_file.destination_relative_path for input_file in to_transfer})
+
+        def copy(input_file: File) -> tuple[File, int | None, str]:
+            return input_file, *ImageSort.copy_file(
+                sorter.destination_dir, input_file, sorter.transfer_mode, copy_options
+            )
+
+        transferred = 0
+        for input_file, bytes_copied, message in pool.imap_unordered(copy, to_transfer):
+            if bytes_copied is not None:
+                self.journal.record(input_file, bytes_copied)
+                transferred += 1
+            messages.append(message)
+        copy_options.finish()
+        self.journal.checkpoint()
+        self.sorted_count += transferred
+        sorter.reporter.write("".join(messages))
+        if len(files_list):
+            logger.info(
+                "Sorted %i of %i new files in %.3f seconds", transferred, len(files_list), time.perf_counter() - start
+            )
+        return transferred
+
+    def _claim_destination(self, input_file: FileView, claimed: dict[str, str], messages: list[str]) -> File | None:
+        """Choose the output filename of a file, so it never replaces a file already in the output folder.
+
+        Arguments:
+            input_file: categorised file of the batch
+            claimed: destination paths already chosen by the batch -> their source paths, the destination is added
+            messages: messages for the user, a message is added if the file is skipped
+        Returns: File object ready to transfer, or None if the file is skipped
+        """
+        sorter = self.sorter
+        folder = os.path.join(sorter.destination_dir, input_file.destination_relative_path)
+        stem, extension = os.path.splitext(input_file.sorted_filename)
+        sorted_filename = input_file.sorted_filename
+        for postfix in range(2, MAX_POSTFIX + 2):
+            destination = os.path.join(folder, sorted_filename)
+            existing = claimed.get(destination, destination if os.path.lexists(destination) else None)
+            if existing is None:
+                break
+            if os.path.isfile(existing) and filecmp.cmp(input_file.fullpath, existing, shallow=False):
+                messages.append(f"Skipped : {input_file.fullpath} is already sorted as {destination}\n")
+                return None
+            if not (sorter.rename_duplicates or sorter.skip_identical) or postfix > MAX_POSTFIX:
+                messages.append(f"Skipped : {input_file.fullpath}, a different file is sorted as {destination}\n")
+                return None
+            sorted_filename = f"{stem}_{postfix:0>3}{extension}"
+        claimed[destination] = input_file.fullpath
+        to_transfer = File.from_view(input_file)
+        to_transfer.sorted_filename = sorted_filename
+        return to_transfer
+
+
+def watch_directory(  # noqa: PLR0913
+    source_dir: str,
+    destination_dir: str,
+    *,
+    ext_to_sort: list[str] | None = None,
+    rename_duplicates: bool = False,
+    copy_unsorted: bool = False,
+    skip_identical: bool = False,
+    transfer_mode: str = "copy",
+    fsync_policy: str = "none",
+    preserve_times: bool = False,
+    copy_workers: int | None = None,
+    settle_seconds: float = SETTLE_SECONDS,
+    poll_interval: float = POLL_INTERVAL,
+    polling: bool = False,
+    reporter: Reporter | None = None,
+) -> FolderWatcher:
+    """Create a watcher that sorts the files arriving in a directory, `FolderWatcher.run` starts it.
+
+    Arguments:
+        source_dir: the folder to watch for files to sort
+        destination_dir: the output folder to copy the sorted files into
+        ext_to_sort: extensions of the files to sort, defaults to `JPEG_EXTENSIONS`
+        rename_duplicates: keep files with duplicate datetimes by appending the next free postfix to their name
+        copy_unsorted: copy all files not matching `ext_to_sort` into an 'other_files' folder
+        skip_identical: skip files identical to the file already sorted under their name, and rename the rest.
+            Identical files are always skipped, so this only implies `rename_duplicates`
+        transfer_mode: how to transfer the files into the output folder, one of `transfer.TRANSFER_MODES`
+        fsync_policy: when copies are synced to the disk, one of `transfer.FSYNC_POLICIES`
+        preserve_times: copies keep the access and modification times of their source
+        copy_workers: number of files to copy in parallel, chosen from the kind of storage devices if None
+        settle_seconds: seconds a file must stay unchanged before it is sorted
+        poll_interval: seconds between polls of the input folder, when inotify is not used
+        polling: poll the input folder even where inotify is available, such as for network filesystems
+        reporter: receives the user facing progress messages, they are discarded if not provided
+    Returns: the FolderWatcher, ready to run
+    Raises:
+        ValueError: if the output folder is inside the input folder
+    """
+    sorter = ImageSort(os.path.abspath(source_dir), os.path.abspath(destination_dir), reporter)
+    sorter.ext_to_sort = list(JPEG_EXTENSIONS if ext_to_sort is None else ext_to_sort)
+    sorter.rename_duplicates = rename_duplicates
+    sorter.copy_unsorted = copy_unsorted
+    sorter.skip_identical = skip_identical
+    sorter.transfer_mode = transfer_mode
+    sorter.fsync_policy = fsync_policy
+    sorter.preserve_times = preserve_times
+    sorter.copy_workers = copy_workers
+    watcher = FolderWatcher(sorter)
+    watcher.settle_seconds = settle_seconds
+    watcher.poll_interval = poll_interval
+    watcher.polling = polling
+    return watcher